@@ -0,0 +1,231 @@
+import math
+import os
+import threading
+import time
+
+import redis
+from celery.signals import task_prerun, task_postrun, task_received, task_revoked
+
+from .redis_client import get_redis
+from .routing import HEAVY_QUEUE, LIGHT_QUEUE, entry_queue, predict_tool, tool_queue
+from .preload import readiness_snapshot, publishes_readiness, update_readiness
+
+# 큐 길이 x 서비스 시간 / 처리 슬롯으로 대기 시간을 예측하고, SLO를 넘으면 429로 돌려보냅니다.
+ADMISSION_ENABLED = os.environ.get("ADMISSION_ENABLED", "1") == "1"
+ADMISSION_SLO_SEC = float(os.environ.get("ADMISSION_SLO_SEC", "120"))
+ADMISSION_EWMA_ALPHA = float(os.environ.get("ADMISSION_EWMA_ALPHA", "0.2"))
+ADMISSION_REFRESH_SEC = float(os.environ.get("ADMISSION_REFRESH_SEC", "1.0"))
+# 워커는 있지만 ready인 워커가 하나도 없을 때(모델 로딩 중) 더하는 대기 시간
+# (WORKER_PRELOAD=0이라 준비 상태를 발행하는 워커가 없으면 워커 1대로 가정)
+ADMISSION_COLD_START_SEC = float(os.environ.get("ADMISSION_COLD_START_SEC", "60"))
+# heavy 작업 하나가 차지하는 VRAM(MB). 워커의 (전체 VRAM - 상주 모델)로 동시 처리 슬롯을 제한합니다.
+# 0이면 워커가 준비 상태에 공개한 추정치(warm-up과 실제 작업의 peak - 상주 모델)를 사용
+ADMISSION_HEAVY_JOB_VRAM_MB = float(os.environ.get("ADMISSION_HEAVY_JOB_VRAM_MB", "0"))
+
+# 완료된 태스크가 아직 없을 때 쓰는 서비스 시간 초기값
+DEFAULT_SERVICE_SEC = {
+    HEAVY_QUEUE: float(os.environ.get("ADMISSION_HEAVY_SERVICE_SEC", "30")),
+    LIGHT_QUEUE: float(os.environ.get("ADMISSION_LIGHT_SERVICE_SEC", "5")),
+}
+
+SERVICE_TIME_KEY = "admission:service_sec"
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, decision: dict):
+        super().__init__(f"예상 대기 시간 {decision['estimated_wait_sec']:.1f}s > SLO {decision['slo_sec']:.0f}s")
+        self.decision = decision
+
+
+# ----------------------------------------------------
+# 워커 쪽: 큐별 서비스 시간(EWMA) 갱신
+# ----------------------------------------------------
+
+_task_started = {}
+# 큐별로 이 워커가 가져간(prefetch 포함) 아직 끝나지 않은 태스크 id
+# 브로커 큐 길이(llen)에는 빠져 있으므로 준비 상태에 공개해서 API가 대기열 깊이에 더함
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def _routing_key(request) -> str:
+    return (getattr(request, "delivery_info", None) or {}).get("routing_key")
+
+
+def _track_inflight(queue: str, task_id: str, running: bool):
+    # 준비 상태를 공개하지 않는 프로세스(prefork 부모)는 postrun을 받지 못하므로 세지 않음
+    if queue not in DEFAULT_SERVICE_SEC or not publishes_readiness():
+        return
+    with _inflight_lock:
+        ids = _inflight.setdefault(queue, set())
+        before = len(ids)
+        if running:
+            ids.add(task_id)
+        else:
+            ids.discard(task_id)
+        if len(ids) == before:
+            return
+        counts = {q: len(s) for q, s in _inflight.items()}
+    update_readiness(inflight=counts)
+
+
+@task_received.connect
+def record_task_received(request=None, **kwargs):
+    if request is not None:
+        _track_inflight(_routing_key(request), request.id, True)
+
+
+@task_revoked.connect
+def record_task_revoked(request=None, **kwargs):
+    if request is not None:
+        _track_inflight(_routing_key(request), request.id, False)
+
+
+@task_prerun.connect
+def record_task_start(task_id=None, task=None, **kwargs):
+    _task_started[task_id] = time.time()
+    if task is not None:
+        _track_inflight(_routing_key(task.request), task_id, True)
+
+
+@task_postrun.connect
+def update_service_time(task_id=None, task=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    queue = _routing_key(task.request) if task is not None else None
+    _track_inflight(queue, task_id, False)
+    if started is None or queue not in DEFAULT_SERVICE_SEC:
+        return
+
+    duration = time.time() - started
+    client = get_redis()
+    try:
+        previous = client.hget(SERVICE_TIME_KEY, queue)
+        if previous is None:
+            value = duration
+        else:
+            value = ADMISSION_EWMA_ALPHA * duration + (1 - ADMISSION_EWMA_ALPHA) * float(previous)
+        client.hset(SERVICE_TIME_KEY, queue, value)
+    except redis.RedisError as e:
+        print(f"서비스 시간 갱신 실패: {e}")
+
+
+# ----------------------------------------------------
+# API 쪽: 대기 시간 예측과 입장 판단
+# ----------------------------------------------------
+
+def _worker_slots(worker: dict, queue: str) -> int:
+    slots = int(worker.get("concurrency", 1))
+    job_vram_mb = ADMISSION_HEAVY_JOB_VRAM_MB or worker.get("job_vram_mb", 0)
+    if queue == HEAVY_QUEUE and job_vram_mb > 0 and worker.get("gpu_total_mb"):
+        usable_mb = worker["gpu_total_mb"] - worker.get("model_vram_mb", 0)
+        slots = min(slots, max(1, int(usable_mb // job_vram_mb)))
+    return slots
+
+
+class AdmissionController:
+    def __init__(self, slo_sec: float = ADMISSION_SLO_SEC, refresh_sec: float = ADMISSION_REFRESH_SEC):
+        self.slo_sec = slo_sec
+        self.refresh_sec = refresh_sec
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._refreshed_at = 0.0
+        # 마지막 갱신 이후 이 API 프로세스가 받아들인 요청 (갱신 주기 사이의 버스트 반영)
+        self._admitted = {}
+        self.rejected = 0
+
+    def _refresh(self):
+        client = get_redis()
+        pipe = client.pipeline()
+        for queue in DEFAULT_SERVICE_SEC:
+            pipe.llen(queue)
+        pipe.hgetall(SERVICE_TIME_KEY)
+        *depths, service = pipe.execute()
+        service = {k.decode("utf-8"): float(v) for k, v in service.items()}
+        workers = readiness_snapshot()["workers"]
+
+        queues = {}
+        for queue, depth in zip(DEFAULT_SERVICE_SEC, depths):
+            registered = [w for w in workers if queue in w.get("queues", [])]
+            ready = [w for w in registered if w.get("state") == "ready"]
+            # 브로커에 남은 메시지 + 워커가 이미 가져간(prefetch/실행 중) 태스크
+            inflight = sum(w.get("inflight", {}).get(queue, 0) for w in registered)
+            queues[queue] = {
+                "depth": depth + inflight,
+                "queued": depth,
+                "inflight": inflight,
+                "registered_workers": len(registered),
+                "ready_workers": len(ready),
+                "slots": sum(_worker_slots(w, queue) for w in ready),
+                "service_sec": service.get(queue, DEFAULT_SERVICE_SEC[queue]),
+                "gpu_free_mb": [w["gpu_free_mb"] for w in ready if "gpu_free_mb" in w],
+            }
+        self._snapshot = queues
+        self._refreshed_at = time.time()
+        self._admitted = {}
+
+    def estimate(self, queue: str) -> dict:
+        """큐의 현재 상태와 새 요청이 시작되기까지의 예상 대기 시간"""
+        with self._lock:
+            if self._snapshot is None or time.time() - self._refreshed_at > self.refresh_sec:
+                self._refresh()
+            state = dict(self._snapshot[queue])
+            state["depth"] += self._admitted.get(queue, 0)
+
+        wait = state["depth"] * state["service_sec"] / max(state["slots"], 1)
+        if state["registered_workers"] and not state["ready_workers"]:
+            wait += ADMISSION_COLD_START_SEC
+        state["estimated_wait_sec"] = wait
+        return state
+
+    def _queues(self, prompt: str) -> set:
+        # 요청이 거치는 큐: 진입 큐 + 추정 도구의 큐
+        return {entry_queue(prompt), tool_queue(predict_tool(prompt))}
+
+    def pressure(self, prompt: str) -> float:
+        """입장 처리 없이 예상 대기 시간 / SLO 비율만 봅니다. (adaptive 서비스 등급 선택용)"""
+        wait = max(self.estimate(queue)["estimated_wait_sec"] for queue in self._queues(prompt))
+        return wait / self.slo_sec if self.slo_sec > 0 else 0.0
+
+    def check(self, prompt: str) -> dict:
+        """
+        요청이 거치는 큐(진입 큐 + 추정 도구의 큐) 중 가장 긴 예상 대기 시간으로 판단합니다.
+        SLO를 넘으면 AdmissionRejected를 발생시킵니다.
+        """
+        queues = self._queues(prompt)
+        estimates = {queue: self.estimate(queue) for queue in queues}
+        wait = max(e["estimated_wait_sec"] for e in estimates.values())
+        decision = {
+            "slo_sec": self.slo_sec,
+            "estimated_wait_sec": round(wait, 2),
+            "estimated_start": time.time() + wait,
+            "queues": {q: round(e["estimated_wait_sec"], 2) for q, e in estimates.items()},
+        }
+
+        if ADMISSION_ENABLED and wait > self.slo_sec:
+            self.rejected += 1
+            # 밀린 작업이 SLO 이내로 줄어들 때까지 기다렸다가 재시도하도록 안내
+            decision["retry_after_sec"] = max(1, math.ceil(wait - self.slo_sec))
+            raise AdmissionRejected(decision)
+
+        with self._lock:
+            for queue in queues:
+                self._admitted[queue] = self._admitted.get(queue, 0) + 1
+        return decision
+
+    def status(self) -> dict:
+        return {
+            "enabled": ADMISSION_ENABLED,
+            "slo_sec": self.slo_sec,
+            "rejected": self.rejected,
+            "queues": {queue: self.estimate(queue) for queue in DEFAULT_SERVICE_SEC},
+        }
+
+
+_CONTROLLER = None
+
+
+def get_admission_controller() -> AdmissionController:
+    global _CONTROLLER
+    if _CONTROLLER is None:
+        _CONTROLLER = AdmissionController()
+    return _CONTROLLER
@@ -0,0 +1,227 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import time
+
+from .redis_client import get_redis
+
+# 이미지 원본 바이트를 브로커/결과 백엔드 대신 보관하는 저장소.
+# Celery 메시지에는 "sha256:<digest>" 형태의 참조만 실립니다.
+BLOB_BACKEND = os.environ.get("BLOB_BACKEND", "fs")  # fs | redis
+BLOB_DIR = os.environ.get("BLOB_DIR", "/tmp/agent_blobs")  # API/워커가 공유하는 볼륨 경로
+# redis: 키 TTL, fs: 마지막 기록(put) 이후 이 시간이 지난 파일을 주기적으로 삭제 (0이면 삭제 안 함)
+BLOB_TTL_SEC = int(os.environ.get("BLOB_TTL_SEC", str(60 * 60 * 24)))
+BLOB_GC_INTERVAL_SEC = float(os.environ.get("BLOB_GC_INTERVAL_SEC", "3600"))
+BLOB_CHUNK_SIZE = 1024 * 256
+
+REF_PREFIX = "sha256:"
+
+
+def make_ref(digest: str) -> str:
+    return f"{REF_PREFIX}{digest}"
+
+
+def sniff_content_type(head: bytes) -> str:
+    """저장된 바이트의 앞부분으로 이미지 형식을 판별합니다. (업로드 원본/중간 결과는 PNG일 수 있음)"""
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+
+def parse_ref(ref: str) -> str:
+    """참조 문자열에서 digest만 꺼냅니다. 경로 조작을 막기 위해 hex만 허용합니다."""
+    digest = ref[len(REF_PREFIX):] if ref.startswith(REF_PREFIX) else ref
+    if len(digest) != 64 or any(c not in "0123456789abcdef" for c in digest):
+        raise ValueError(f"잘못된 blob 참조: {ref}")
+    return digest
+
+
+class FileBlobStore:
+    """
+    공유 볼륨(또는 같은 호스트의 디렉터리)에 content-addressed 파일로 저장합니다.
+    Redis 백엔드의 TTL과 같은 의미로, put 때마다 mtime을 갱신하고 BLOB_TTL_SEC 동안
+    다시 기록되지 않은 파일은 BLOB_GC_INTERVAL_SEC마다 백그라운드에서 삭제합니다.
+    """
+
+    def __init__(self, root: str = BLOB_DIR, ttl: int = BLOB_TTL_SEC):
+        self.root = root
+        self.ttl = ttl
+        self._last_gc = 0.0
+        self._gc_lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    def _maybe_collect(self):
+        if self.ttl <= 0:
+            return
+        with self._gc_lock:
+            now = time.time()
+            if now - self._last_gc < BLOB_GC_INTERVAL_SEC:
+                return
+            self._last_gc = now
+        threading.Thread(target=self.collect_garbage, name="blob-gc", daemon=True).start()
+
+    def collect_garbage(self) -> int:
+        """TTL이 지난 blob과 중단된 업로드의 임시 파일을 삭제하고 삭제한 개수를 반환합니다."""
+        cutoff = time.time() - self.ttl
+        removed = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except FileNotFoundError:
+                    pass  # 다른 프로세스의 GC가 먼저 삭제
+        if removed:
+            print(f"[Blob GC] 만료된 blob {removed}개 삭제")
+        return removed
+
+    def put(self, data) -> str:
+        self._maybe_collect()
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        try:
+            # 이미 있는 blob이면 만료 시각만 갱신
+            os.utime(path)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.root)
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return make_ref(digest)
+
+    def put_stream(self, stream) -> str:
+        """업로드 스트림을 메모리에 모으지 않고 해시와 동시에 디스크로 기록합니다."""
+        self._maybe_collect()
+        hasher = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=self.root)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while True:
+                    chunk = stream.read(BLOB_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    hasher.update(chunk)
+                    f.write(chunk)
+            digest = hasher.hexdigest()
+            path = self._path(digest)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return make_ref(digest)
+
+    def exists(self, ref: str) -> bool:
+        return os.path.exists(self._path(parse_ref(ref)))
+
+    def get(self, ref: str) -> bytes:
+        with open(self._path(parse_ref(ref)), "rb") as f:
+            return f.read()
+
+    def local_path(self, ref: str):
+        """같은 호스트라면 파일 경로를 그대로 넘겨 복사 없이 읽을 수 있습니다 (zero-copy 경로)."""
+        return self._path(parse_ref(ref))
+
+    def iter_chunks(self, ref: str):
+        with open(self._path(parse_ref(ref)), "rb") as f:
+            while True:
+                chunk = f.read(BLOB_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+
+    def size(self, ref: str) -> int:
+        return os.path.getsize(self._path(parse_ref(ref)))
+
+    def head(self, ref: str, size: int = 16) -> bytes:
+        with open(self._path(parse_ref(ref)), "rb") as f:
+            return f.read(size)
+
+
+class RedisBlobStore:
+    """API와 워커가 파일시스템을 공유하지 않을 때 Redis에 raw bytes로 저장합니다."""
+
+    def __init__(self, ttl: int = BLOB_TTL_SEC):
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(digest: str) -> str:
+        return f"blob:{digest}"
+
+    def put(self, data) -> str:
+        data = bytes(data)
+        digest = hashlib.sha256(data).hexdigest()
+        client = get_redis()
+        # 이미 있는 blob이면 TTL만 갱신
+        if not client.set(self._key(digest), data, ex=self.ttl, nx=True):
+            client.expire(self._key(digest), self.ttl)
+        return make_ref(digest)
+
+    def put_stream(self, stream) -> str:
+        return self.put(stream.read())
+
+    def exists(self, ref: str) -> bool:
+        return bool(get_redis().exists(self._key(parse_ref(ref))))
+
+    def get(self, ref: str) -> bytes:
+        data = get_redis().get(self._key(parse_ref(ref)))
+        if data is None:
+            raise FileNotFoundError(ref)
+        return data
+
+    def local_path(self, ref: str):
+        return None
+
+    def iter_chunks(self, ref: str):
+        key = self._key(parse_ref(ref))
+        client = get_redis()
+        offset = 0
+        while True:
+            chunk = client.getrange(key, offset, offset + BLOB_CHUNK_SIZE - 1)
+            if not chunk:
+                break
+            yield chunk
+            offset += len(chunk)
+
+    def size(self, ref: str) -> int:
+        return get_redis().strlen(self._key(parse_ref(ref)))
+
+    def head(self, ref: str, size: int = 16) -> bytes:
+        return get_redis().getrange(self._key(parse_ref(ref)), 0, size - 1)
+
+
+_STORE = None
+
+
+def get_blob_store():
+    global _STORE
+    if _STORE is None:
+        _STORE = RedisBlobStore() if BLOB_BACKEND == "redis" else FileBlobStore()
+    return _STORE
+
+
+def open_blob(ref: str):
+    """
+    PIL 등에 넘길 수 있는 입력을 돌려줍니다.
+    파일 백엔드면 경로를 그대로, 아니면 BytesIO를 반환합니다.
+    """
+    store = get_blob_store()
+    path = store.local_path(ref)
+    if path is not None:
+        return path
+    return io.BytesIO(store.get(ref))
@@ -0,0 +1,294 @@
+import datetime
+import json
+import os
+import threading
+import time
+
+import redis
+from celery import current_app
+from celery.signals import before_task_publish, task_prerun, task_postrun, task_revoked
+
+from .redis_client import get_redis
+from .routing import HEAVY_QUEUE, tool_queue, predict_tool
+from .admission import SERVICE_TIME_KEY, DEFAULT_SERVICE_SEC
+from .progress import publish_progress, FINISHED_EVENT
+
+# job 단위 마감 시간(deadline)과 취소
+# - deadline: 제출 시 정해져 task 헤더로 모든 하위 태스크에 전달, 지나면 실행하지 않음
+# - 취소: Redis 플래그(cancel:{job_id})를 단계 사이와 diffusion step 콜백에서 확인
+JOB_DEADLINE_SEC = float(os.environ.get("JOB_DEADLINE_SEC", "600"))  # 0이면 마감 없음
+# 마지막 WebSocket이 끊긴 뒤 이 시간 안에 아무도 다시 붙지 않으면 job을 취소 (음수면 사용 안 함)
+CANCEL_GRACE_SEC = float(os.environ.get("CANCEL_GRACE_SEC", "10"))
+CANCEL_TTL_SEC = int(os.environ.get("CANCEL_TTL_SEC", "3600"))
+# job별 WebSocket 구독자 수 (API 복제본 전체 기준). 열린 소켓이 TTL/3마다 갱신하므로
+# API 프로세스가 죽어 감소하지 못한 카운터도 TTL 뒤에는 사라짐
+WATCHER_TTL_SEC = int(os.environ.get("WATCHER_TTL_SEC", "120"))
+
+DEADLINE_HEADER = "deadline"
+CANCEL_KEY_PREFIX = "cancel:"
+CANCEL_STATS_KEY = "cancel:stats"
+WATCHER_KEY_PREFIX = "watchers:"
+# 결과 캐시로 이 job에 합류한 다른 제출자가 있음 (소켓을 열지 않았을 수 있으므로 자동 취소하지 않음)
+JOINED_KEY_PREFIX = "cancel:joined:"
+# DAG job의 단계 태스크 id와 finalize 서명 (취소 시 단계만 revoke하고 finalize는 대신 보냄)
+WORKFLOW_KEY_PREFIX = "cancel:workflow:"
+FINALIZED_KEY_PREFIX = "cancel:finalized:"
+
+EXPIRED = "expired"
+
+
+class JobCancelled(Exception):
+    def __init__(self, reason: str, progress: float = 0.0):
+        super().__init__(f"job cancelled: {reason}")
+        self.reason = reason
+        # diffusion 도중 취소된 경우 이미 끝난 step 비율 (절약량 계산에서 제외)
+        self.progress = progress
+
+
+def deadline_for(deadline_sec: float = None):
+    """제출 시점 기준 절대 마감 시각 (epoch초). 마감이 없으면 None"""
+    seconds = JOB_DEADLINE_SEC if deadline_sec is None else deadline_sec
+    return time.time() + seconds if seconds and seconds > 0 else None
+
+
+def cancel_job(job_id: str, celery_app, reason: str = "cancelled"):
+    """
+    취소 플래그를 세우고, DAG job이면 아직 큐에 있는 단계 태스크를 워커가 받자마자 버리도록 revoke합니다.
+    job id 자체는 revoke하지 않음: 계획 전이면 진입 태스크가 플래그를 보고 바로 취소 결과를 남기고,
+    DAG 모드에서는 job id가 finalize(self.replace)라서 revoke하면 취소 결과가 기록되지 않음
+    """
+    client = get_redis()
+    client.set(f"{CANCEL_KEY_PREFIX}{job_id}", reason, ex=CANCEL_TTL_SEC)
+    workflow = _load_workflow(job_id)
+    if workflow and workflow["steps"]:
+        celery_app.control.revoke(list(workflow["steps"]))
+
+
+def register_workflow(job_id: str, steps: dict, tools: list, finalize):
+    """
+    DAG job을 실행하기 전에 기록: steps는 revoke할 단계 태스크 {task_id: 단계 번호},
+    tools는 계획의 도구 목록, finalize는 단계가 버려졌을 때 대신 보낼 finalize 서명
+    """
+    record = {"steps": steps, "tools": tools, "finalize": dict(finalize)}
+    try:
+        get_redis().set(f"{WORKFLOW_KEY_PREFIX}{job_id}", json.dumps(record), ex=CANCEL_TTL_SEC)
+    except redis.RedisError as e:
+        print(f"워크플로 기록 실패 (단계 revoke 없이 플래그로만 취소): {e}")
+
+
+def _load_workflow(job_id: str):
+    try:
+        raw = get_redis().get(f"{WORKFLOW_KEY_PREFIX}{job_id}")
+    except redis.RedisError:
+        return None
+    return json.loads(raw) if raw else None
+
+
+def _flatten_steps(previous) -> list:
+    results = []
+    stack = [previous]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            results.append(item)
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
+    return results
+
+
+def finish_revoked_step(job_id: str, workflow: dict, request, reason: str):
+    """
+    revoke된 단계 태스크는 실행되지 않아 chain이 멈추므로, 남은 단계의 절약 시간을 기록하고
+    finalize를 직접 보내서 job 결과(취소 결과와 지표)가 남도록 합니다.
+    """
+    idx = workflow["steps"][request.id]
+    tools = workflow["tools"]
+    done = _flatten_steps((request.args or [[]])[0])
+    finished = {r["step"] for r in done}
+    saved = record_saved(reason, [tool for i, tool in enumerate(tools) if i not in finished])
+    step_result = {"step": idx, "tool": tools[idx], "status": "cancelled", "reason": reason,
+                   "metrics": {f"cancel/gpu_sec_saved_step_{idx}": saved}}
+    try:
+        first = get_redis().set(f"{FINALIZED_KEY_PREFIX}{job_id}", 1, nx=True, ex=CANCEL_TTL_SEC)
+    except redis.RedisError as e:
+        print(f"finalize 중복 확인 실패 (취소 결과를 보내지 않음): {e}")
+        return
+    if first:
+        current_app.signature(workflow["finalize"]).apply_async((done + [step_result],), task_id=job_id)
+
+
+def add_watcher(job_id: str):
+    try:
+        pipe = get_redis().pipeline()
+        pipe.incr(f"{WATCHER_KEY_PREFIX}{job_id}")
+        pipe.expire(f"{WATCHER_KEY_PREFIX}{job_id}", WATCHER_TTL_SEC)
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"구독자 수 기록 실패: {e}")
+
+
+def refresh_watcher(job_id: str):
+    try:
+        get_redis().expire(f"{WATCHER_KEY_PREFIX}{job_id}", WATCHER_TTL_SEC)
+    except redis.RedisError as e:
+        print(f"구독자 수 갱신 실패: {e}")
+
+
+def remove_watcher(job_id: str):
+    """구독자 하나를 빼고 남은 구독자 수를 반환합니다. (Redis 오류면 None)"""
+    try:
+        pipe = get_redis().pipeline()
+        pipe.decr(f"{WATCHER_KEY_PREFIX}{job_id}")
+        pipe.expire(f"{WATCHER_KEY_PREFIX}{job_id}", WATCHER_TTL_SEC)
+        remaining, _ = pipe.execute()
+        return remaining
+    except redis.RedisError as e:
+        print(f"구독자 수 기록 실패: {e}")
+        return None
+
+
+def mark_joined(job_id: str):
+    try:
+        get_redis().set(f"{JOINED_KEY_PREFIX}{job_id}", 1, ex=CANCEL_TTL_SEC)
+    except redis.RedisError as e:
+        print(f"합류 기록 실패: {e}")
+
+
+def is_abandoned(job_id: str, celery_app) -> bool:
+    """모든 API 복제본에서 구독자가 없고, 합류한 제출자도 없고, 아직 끝나지 않은 job"""
+    try:
+        client = get_redis()
+        watchers = int(client.get(f"{WATCHER_KEY_PREFIX}{job_id}") or 0)
+        joined = client.exists(f"{JOINED_KEY_PREFIX}{job_id}")
+    except redis.RedisError as e:
+        print(f"구독자 수 조회 실패 (취소하지 않음): {e}")
+        return False
+    return watchers <= 0 and not joined and not celery_app.AsyncResult(job_id).ready()
+
+
+def cancel_stats() -> dict:
+    raw = get_redis().hgetall(CANCEL_STATS_KEY)
+    return {k.decode(): float(v) for k, v in raw.items()}
+
+
+# ----------------------------------------------------
+# 워커 쪽: 현재 job 컨텍스트와 협조적 취소 확인
+# ----------------------------------------------------
+
+_job = threading.local()
+
+
+def current_job() -> tuple:
+    return getattr(_job, "id", None), getattr(_job, "deadline", None)
+
+
+def cancel_reason(job_id: str = None):
+    current_id, deadline = current_job()
+    return job_cancel_reason(job_id or current_id, deadline)
+
+
+def job_cancel_reason(job_id: str, deadline: float = None):
+    """태스크 스레드 밖(FLUX 배치 스케줄러 등)에서 특정 job의 취소/마감 여부를 확인합니다."""
+    if deadline is not None and time.time() > deadline:
+        return EXPIRED
+    if job_id is None:
+        return None
+    try:
+        raw = get_redis().get(f"{CANCEL_KEY_PREFIX}{job_id}")
+    except redis.RedisError:
+        return None
+    return raw.decode("utf-8") if raw else None
+
+
+def check_cancelled(job_id: str = None):
+    reason = cancel_reason(job_id)
+    if reason is not None:
+        raise JobCancelled(reason)
+
+
+def diffusion_callback(pipe, step: int, timestep, callback_kwargs: dict) -> dict:
+    """Diffusers callback_on_step_end: step마다 취소/마감을 확인해서 남은 step을 건너뜀"""
+    reason = cancel_reason()
+    if reason is not None:
+        total = getattr(pipe, "num_timesteps", None) or 0
+        raise JobCancelled(reason, progress=(step + 1) / total if total else 0.0)
+    return callback_kwargs
+
+
+def _service_sec(queue: str) -> float:
+    try:
+        value = get_redis().hget(SERVICE_TIME_KEY, queue)
+    except redis.RedisError:
+        value = None
+    return float(value) if value is not None else DEFAULT_SERVICE_SEC[queue]
+
+
+def record_saved(reason: str, tools: list, progress: float = 0.0) -> float:
+    """
+    실행하지 않은 도구들의 GPU 시간을 heavy 큐 서비스 시간(EWMA)으로 추정해서 누적합니다.
+    (light 큐 도구는 GPU 절약으로 세지 않음)
+    """
+    heavy = sum(1 for tool in tools if tool_queue(tool) == HEAVY_QUEUE)
+    gpu_sec = max(0.0, heavy - progress) * _service_sec(HEAVY_QUEUE) if heavy else 0.0
+    try:
+        pipe = get_redis().pipeline()
+        pipe.hincrby(CANCEL_STATS_KEY, f"{reason}_units", 1)
+        pipe.hincrbyfloat(CANCEL_STATS_KEY, f"{reason}_gpu_sec_saved", gpu_sec)
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"취소 통계 기록 실패: {e}")
+    print(f"[Cancel] {reason}: 건너뛴 도구 {tools}, GPU {gpu_sec:.1f}s 절약 (추정)")
+    return gpu_sec
+
+
+def cancelled_result(reason: str, gpu_sec_saved: float, metrics: dict = None) -> dict:
+    metrics = dict(metrics or {})
+    metrics["cancel/reason"] = reason
+    metrics["cancel/gpu_sec_saved"] = metrics.get("cancel/gpu_sec_saved", 0) + gpu_sec_saved
+    return {"status": "cancelled", "reason": reason, "metrics": metrics}
+
+
+@before_task_publish.connect
+def propagate_deadline(headers=None, **kwargs):
+    # 워커 안에서 발행하는 하위 태스크(DAG 단계, finalize)에 같은 마감을 물려줌
+    if headers is None or headers.get(DEADLINE_HEADER) is not None:
+        return
+    _, deadline = current_job()
+    if deadline is not None:
+        headers[DEADLINE_HEADER] = deadline
+
+
+@task_prerun.connect
+def enter_job(task_id=None, task=None, **kwargs):
+    request = task.request
+    _job.id = request.root_id or task_id
+    deadline = getattr(request, DEADLINE_HEADER, None)
+    _job.deadline = float(deadline) if deadline is not None else None
+
+
+@task_postrun.connect
+def leave_job(**kwargs):
+    _job.id = None
+    _job.deadline = None
+
+
+@task_revoked.connect
+def account_revoked(request=None, terminated=None, expired=None, **kwargs):
+    # 큐에서 기다리다 마감(expires)이 지났거나 revoke된 태스크: 실행 전에 버려짐
+    if request is None or terminated:
+        return
+    job_id = request.root_id or request.id
+    reason = EXPIRED if expired else (cancel_reason(job_id) or "revoked")
+    workflow = _load_workflow(job_id) if job_id != request.id else None
+    if workflow and request.id in workflow["steps"]:
+        finish_revoked_step(job_id, workflow, request, reason)
+        return
+    # API가 넣은 run_agent_task(kwargs에 prompt)는 계획 전이므로 첫 도구를 추정해서 계산
+    prompt = (request.kwargs or {}).get("prompt")
+    record_saved(reason, [predict_tool(prompt)] if prompt else [])
+    # 실행되지 않았으므로 postrun이 없음 -> 기다리는 WebSocket에 직접 종료를 알림
+    publish_progress(request.id, FINISHED_EVENT, state="REVOKED")
+
+
+def expires_at(deadline: float):
+    return datetime.datetime.fromtimestamp(deadline, tz=datetime.timezone.utc) if deadline else None
@@ -0,0 +1,69 @@
+import json
+import os
+
+import redis
+
+from .redis_client import get_redis
+from .progress import publish_progress
+
+# 생성 결과 평가(CLIP + VQA self-feedback)의 실행 방식
+# - async: 결과 이미지를 먼저 돌려주고, 평가는 eval 큐의 낮은 우선순위 태스크로 실행
+#          (결과는 job 평가 기록에 붙이고 WebSocket에 evaluation 이벤트로 전달)
+# - sync: 예전처럼 결과를 돌려주기 전에 같은 워커에서 평가 (벤치마크에서 지표를 바로 받을 때)
+SYNC = "sync"
+ASYNC = "async"
+EVALUATION_MODE = os.environ.get("EVALUATION_MODE", ASYNC)
+EVALUATION_TTL_SEC = int(os.environ.get("EVALUATION_TTL_SEC", str(24 * 3600)))
+# 결과를 보낸 뒤 WebSocket이 평가 이벤트를 기다리는 최대 시간
+EVALUATION_WAIT_SEC = float(os.environ.get("EVALUATION_WAIT_SEC", "60"))
+
+EVALUATION_KEY_PREFIX = "evaluation:"
+EVALUATION_STATS_KEY = "evaluation:stats"
+EVALUATION_EVENT = "evaluation"
+
+PENDING = "pending"
+
+
+def evaluation_mode(requested: str = None) -> str:
+    return requested if requested in (SYNC, ASYNC) else EVALUATION_MODE
+
+
+def is_pending(result) -> bool:
+    return isinstance(result, dict) and result.get("metrics", {}).get("evaluation/status") == PENDING
+
+
+def attach_evaluation(job_id: str, metrics: dict, heavy_sec_freed: float):
+    """
+    평가 지표를 job 평가 기록(evaluation:{job_id})에 붙이고, 기다리는 WebSocket에 알립니다.
+    heavy_sec_freed: 동기 모드였다면 heavy 워커가 결과 반환 전에 썼을 평가 시간
+    """
+    try:
+        client = get_redis()
+        pipe = client.pipeline()
+        pipe.set(f"{EVALUATION_KEY_PREFIX}{job_id}", json.dumps(metrics, default=str), ex=EVALUATION_TTL_SEC)
+        pipe.hincrby(EVALUATION_STATS_KEY, "jobs", 1)
+        pipe.hincrbyfloat(EVALUATION_STATS_KEY, "heavy_sec_freed", heavy_sec_freed)
+        if metrics.get("evaluation/status") != "done":
+            pipe.hincrby(EVALUATION_STATS_KEY, "errors", 1)
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"평가 기록 저장 실패: {e}")
+    publish_progress(job_id, EVALUATION_EVENT, metrics=metrics)
+
+
+def get_evaluation(job_id: str):
+    raw = get_redis().get(f"{EVALUATION_KEY_PREFIX}{job_id}")
+    return json.loads(raw) if raw else None
+
+
+def with_evaluation(result: dict, evaluation: dict) -> dict:
+    """job 결과의 metrics에 나중에 끝난 평가 지표를 합친 사본"""
+    return {**result, "metrics": {**result.get("metrics", {}), **evaluation}}
+
+
+def evaluation_stats() -> dict:
+    raw = get_redis().hgetall(EVALUATION_STATS_KEY)
+    stats = {k.decode(): float(v) for k, v in raw.items()}
+    if stats.get("jobs"):
+        stats["heavy_sec_freed_per_job"] = stats.get("heavy_sec_freed", 0) / stats["jobs"]
+    return stats
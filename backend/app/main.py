@@ -1,11 +1,32 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, UploadFile, File, Form
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, UploadFile, File, Form, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
+from typing import Optional
 from .tasks import run_agent_task, celery_app
+from .progress import progress_hub, PROGRESS_FALLBACK_POLL_SEC, FINISHED_EVENT
+from .blob_store import get_blob_store, make_ref, parse_ref, sniff_content_type
+from .routing import entry_queue
+from .preload import readiness_snapshot
+from .resource_sampler import resource_snapshot, resource_samples_snapshot
+from .profiling import PROFILE_HEADER
+from .cancellation import (
+    deadline_for, expires_at, cancel_job, cancel_stats, CANCEL_GRACE_SEC, DEADLINE_HEADER, WATCHER_TTL_SEC,
+    add_watcher, refresh_watcher, remove_watcher, mark_joined, is_abandoned
+)
+from .result_cache import result_cache_key, lookup_or_reserve, invalidate, RESULT_CACHE_ENABLED
+from .admission import get_admission_controller, AdmissionRejected
+from .evaluation import (
+    EVALUATION_EVENT, EVALUATION_WAIT_SEC, is_pending, get_evaluation, with_evaluation, evaluation_stats
+)
+from .tiers import ADAPTIVE, DEFAULT_TIER, tier_names, choose_tier, tier_config
+from .tracing import start_trace, span, remember_trace, lookup_trace
 from celery import states
 from celery.result import AsyncResult
+from celery.utils import uuid
 import asyncio
 import base64
+import binascii
 import json
 
 app = FastAPI()
@@ -13,7 +34,13 @@ app = FastAPI()
 # --- 데이터 모델 정의 ---
 class TaskRequest(BaseModel):
     prompt: str
-    image_data: str # base64 string
+    image_data: Optional[str] = None # base64 string
+    image_ref: Optional[str] = None # 이미 업로드된 blob 참조 (sha256:...)
+    fresh: bool = False # True면 결과 캐시/중복 요청 합치기를 건너뛰고 새로 실행
+    profile: bool = False # True면 도구 호출 구간을 torch.profiler로 캡처 (X-Profile 헤더와 동일)
+    deadline_sec: Optional[float] = None # 제출 후 이 시간이 지나면 실행하지 않음 (기본 JOB_DEADLINE_SEC)
+    preview: bool = False # True면 이미지 생성 중 근사 미리보기를 /ws/{job_id}로 전송
+    tier: Optional[str] = None # 서비스 등급: draft | standard | high | adaptive (기본 SERVICE_TIER_DEFAULT)
 
 # --- CORS 설정 ---
 origins = ["*"]
@@ -25,72 +52,313 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# --- 유틸리티: 큐 결정 로직 ---
-def get_target_queue(prompt: str) -> str:
-    # 생성/변환 등 GPU 부하가 큰 키워드 체크
-    heavy_keywords = ["draw", "transform", "make", "generate", "change", "create", "spaceship"]
-    if any(k in prompt.lower() for k in heavy_keywords):
-        return "heavy_tasks"
-    return "light_tasks"
+@app.on_event("startup")
+async def start_progress_hub():
+    await progress_hub.start()
+
+@app.on_event("shutdown")
+async def stop_progress_hub():
+    await progress_hub.stop()
 
 @app.get("/")
 def read_root():
     return {"Hello": "Backend"}
 
+# 워커별 모델 로딩/warm-up 상태 (로드 중인 워커는 아직 큐를 소비하지 않음)
+@app.get("/workers/readiness")
+def workers_readiness():
+    return readiness_snapshot()
+
+# 워커 내 자원 샘플러의 최근 집계 (samples=true면 워커 프로세스별 Redis 링의 원본 샘플까지 조회)
+@app.get("/metrics/resources")
+def resource_metrics(samples: bool = False, task_id: Optional[str] = None, last_sec: float = 60):
+    if not samples:
+        return resource_snapshot()
+    return resource_samples_snapshot(task_id, last_sec)
+
+def select_tier(prompt: str, requested: str = None) -> dict:
+    """요청한 서비스 등급을 확정합니다. adaptive면 현재 큐 압력(예상 대기 / SLO)으로 고름"""
+    requested = requested or DEFAULT_TIER
+    if requested not in tier_names():
+        raise HTTPException(status_code=422, detail=f"unknown tier '{requested}' (choose from {tier_names()})")
+    if requested != ADAPTIVE:
+        return {"name": requested, "requested": requested}
+    with span("tier.select") as tier_span:
+        pressure = get_admission_controller().pressure(prompt)
+        name = choose_tier(pressure)
+        tier_span.set(pressure=pressure, tier=name)
+    return {"name": name, "requested": requested, "pressure": round(pressure, 3)}
+
+def submit_agent_task(prompt: str, image_ref: str, fresh: bool = False, profile: bool = False,
+                      deadline_sec: float = None, preview: bool = False, tier: str = None):
+    """
+    같은 (이미지, 프롬프트, 서비스 등급) 요청이 실행 중이거나 이미 끝났다면 그 job_id를 그대로 돌려주고,
+    아니면 예상 대기 시간을 확인한 뒤 새 태스크를 큐에 넣습니다.
+    반환값: {"job_id", "queue", "cached", "tier", "estimated_wait_sec", "estimated_start"}
+    SLO를 넘으면 HTTP 429 (Retry-After)
+    """
+    target_queue = entry_queue(prompt)
+    job_id = uuid()
+    tier_info = select_tier(prompt, tier)
+    kwargs = {"prompt": prompt, "image_ref": image_ref, "tier": tier_info}
+    if profile:
+        kwargs["profile"] = True
+    if preview:
+        kwargs["preview"] = True
+
+    # 프로파일링 요청은 실제 실행이 필요하므로 캐시된 결과에 합류하지 않음
+    if RESULT_CACHE_ENABLED and not fresh and not profile:
+        cache_key = result_cache_key(image_ref, prompt, tier_config(tier_info["name"]))
+        with span("result_cache.lookup") as lookup_span:
+            existing = lookup_or_reserve(cache_key, job_id, celery_app)
+            lookup_span.set(hit=existing is not None)
+        if existing is not None:
+            # 이미 실행 중/완료된 job에 합류하므로 새 부하가 없음 -> admission 검사 생략
+            # (합류한 제출자가 있는 job은 원래 제출자의 소켓이 끊겨도 자동 취소하지 않음)
+            mark_joined(existing)
+            return {"job_id": existing, "queue": target_queue, "cached": True, "tier": tier_info["name"]}
+        kwargs["cache_key"] = cache_key
+
+    try:
+        with span("admission.check"):
+            decision = get_admission_controller().check(prompt)
+    except AdmissionRejected as e:
+        if "cache_key" in kwargs:
+            invalidate(kwargs["cache_key"], job_id)
+        raise HTTPException(
+            status_code=429,
+            detail={"error": str(e), **e.decision},
+            headers={"Retry-After": str(e.decision["retry_after_sec"])},
+        )
+
+    # 마감은 헤더로 하위 태스크까지 전달되고, 큐에서 마감을 넘긴 메시지는 워커가 받자마자 버림(expires)
+    deadline = deadline_for(deadline_sec)
+    headers = {DEADLINE_HEADER: deadline} if deadline else None
+
+    # 발행 시 현재 span이 traceparent 헤더로 실려 워커의 task span과 이어집니다.
+    with span("celery.publish", queue=target_queue, job_id=job_id):
+        run_agent_task.apply_async(kwargs=kwargs, queue=target_queue, task_id=job_id,
+                                   headers=headers, expires=expires_at(deadline))
+    remember_trace(job_id)
+    return {
+        "job_id": job_id, "queue": target_queue, "cached": False, "deadline": deadline, "tier": tier_info["name"],
+        "estimated_wait_sec": decision["estimated_wait_sec"],
+        "estimated_start": decision["estimated_start"],
+    }
+
+# 큐 길이/서비스 시간/준비된 워커 수 기반의 예상 대기 시간 (로드밸런서의 조기 부하 차단용)
+@app.get("/admission/status")
+def admission_status():
+    return get_admission_controller().status()
+
 # 1. 기존 Form 데이터 전송 방식 (이미지 파일 업로드)
 @app.post("/agent/invoke")
-async def invoke_task(prompt: str = Form(...), image: UploadFile = File(...)):
-    file_content = await image.read()
-    image_data = base64.b64encode(file_content).decode("utf-8")
+async def invoke_task(prompt: str = Form(...), image: UploadFile = File(...), fresh: bool = Form(False),
+                      profile: bool = Form(False), deadline_sec: Optional[float] = Form(None),
+                      preview: bool = Form(False), tier: Optional[str] = Form(None),
+                      x_profile: Optional[str] = Header(None, alias=PROFILE_HEADER)):
+    with start_trace("POST /agent/invoke"):
+        # 업로드 원본은 blob 저장소에 한 번만 기록하고, 메시지에는 참조만 싣습니다.
+        with span("blob.put"):
+            image_ref = await asyncio.to_thread(get_blob_store().put_stream, image.file)
 
-    # 큐 분리 적용
-    target_queue = get_target_queue(prompt)
-    
-    task = run_agent_task.apply_async(
-        kwargs={"prompt": prompt, "image_data": image_data},
-        queue=target_queue
-    )
+        # 큐 분리 적용 (+ 결과 캐시 조회)
+        submission = await asyncio.to_thread(
+            submit_agent_task, prompt, image_ref, fresh, profile or x_profile == "1", deadline_sec, preview, tier
+        )
 
-    return {"status": "processing", "job_id": task.id, "queue": target_queue}
+    return {"status": "processing", **submission}
 
 # 2. JSON 데이터 전송 방식 (Base64 이미지 데이터)
 @app.post("/run")
-async def run_task(request: TaskRequest):
-    target_queue = get_target_queue(request.prompt)
-    
-    task = run_agent_task.apply_async(
-        args=[request.prompt, request.image_data],
-        queue=target_queue
-    )
-    return {"task_id": task.id, "queue": target_queue}
+async def run_task(request: TaskRequest, x_profile: Optional[str] = Header(None, alias=PROFILE_HEADER)):
+    with start_trace("POST /run"):
+        # blob 저장, 캐시 예약, admission 조회, 발행은 모두 블로킹 I/O라 이벤트 루프(WebSocket) 밖에서 실행
+        if request.image_ref:
+            image_ref = request.image_ref
+            try:
+                found = await asyncio.to_thread(get_blob_store().exists, image_ref)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="invalid image_ref")
+            if not found:
+                raise HTTPException(status_code=404, detail="image_ref not found")
+        elif request.image_data:
+            try:
+                image_bytes = base64.b64decode(request.image_data, validate=True)
+            except (ValueError, binascii.Error):
+                raise HTTPException(status_code=400, detail="image_data is not valid base64")
+            with span("blob.put", encoding="base64"):
+                image_ref = await asyncio.to_thread(get_blob_store().put, image_bytes)
+        else:
+            raise HTTPException(status_code=422, detail="image_data or image_ref is required")
+
+        submission = await asyncio.to_thread(
+            submit_agent_task, request.prompt, image_ref, request.fresh, request.profile or x_profile == "1",
+            request.deadline_sec, request.preview, request.tier
+        )
+    return {"task_id": submission.pop("job_id"), **submission}
+
+# 명시적 취소: 큐에 있으면 버리고, 실행 중이면 다음 단계/diffusion step에서 멈춤
+@app.post("/jobs/{job_id}/cancel")
+def cancel_task(job_id: str):
+    cancel_job(job_id, celery_app, reason="client")
+    return {"job_id": job_id, "status": "cancelling"}
+
+# 취소/마감으로 실행하지 않은 작업 수와 절약한 GPU 시간 (heavy 서비스 시간 기준 추정)
+@app.get("/cancellation/stats")
+def cancellation_stats():
+    return cancel_stats()
+
+# 결과 반환 뒤 eval 큐에서 끝난 평가 지표 (WebSocket을 놓친 클라이언트용)
+@app.get("/jobs/{job_id}/evaluation")
+def job_evaluation(job_id: str):
+    evaluation = get_evaluation(job_id)
+    if evaluation is None:
+        raise HTTPException(status_code=404, detail="evaluation not ready")
+    return evaluation
+
+# 비동기 평가로 heavy 워커에서 덜어낸 시간 (누적 / job당 평균)
+@app.get("/evaluation/stats")
+def evaluation_statistics():
+    return evaluation_stats()
+
+# 3. 결과 이미지 다운로드 (blob 참조를 스트리밍으로 전송)
+@app.get("/blobs/{digest}")
+def download_blob(digest: str):
+    try:
+        ref = make_ref(parse_ref(digest))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid blob reference")
+
+    store = get_blob_store()
+    if not store.exists(ref):
+        raise HTTPException(status_code=404, detail="blob not found")
+
+    # 결과는 JPEG, 업로드 원본/중간 결과는 PNG 등일 수 있으므로 내용으로 판별
+    media_type = sniff_content_type(store.head(ref))
+    # 파일 백엔드는 sendfile로 바로 전송, Redis 백엔드는 청크 단위 스트리밍
+    path = store.local_path(ref)
+    if path is not None:
+        return FileResponse(path, media_type=media_type)
+    return StreamingResponse(store.iter_chunks(ref), media_type=media_type)
+
+_pending_cancels = set()
+
+async def wait_for_disconnect(websocket: WebSocket):
+    # 진행 이벤트가 없는 동안(큐 대기 중)에도 연결 종료를 바로 알아차리기 위한 수신 루프
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+
+async def wait_for_evaluation(queue, disconnected, timeout: float = EVALUATION_WAIT_SEC):
+    """결과를 보낸 뒤 eval 큐의 평가가 끝날 때까지 이벤트를 계속 전달합니다. 평가 지표 또는 None"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while loop.time() < deadline:
+        getter = asyncio.ensure_future(queue.get())
+        done, _ = await asyncio.wait(
+            {getter, disconnected}, timeout=deadline - loop.time(), return_when=asyncio.FIRST_COMPLETED
+        )
+        if getter not in done:
+            getter.cancel()
+            if disconnected in done:
+                raise WebSocketDisconnect()
+            return None
+        message = getter.result()
+        if message.get("event") == EVALUATION_EVENT:
+            return message
+    return None
+
+async def cancel_if_abandoned(job_id: str):
+    """마지막 구독자가 끊긴 뒤 유예 시간 안에 아무도 다시 붙지 않으면 job을 취소합니다."""
+    await asyncio.sleep(CANCEL_GRACE_SEC)
+    # 구독자 수는 Redis 기준이라 다른 API 복제본에 붙은 소켓도 포함
+    if not await asyncio.to_thread(is_abandoned, job_id, celery_app):
+        return
+    print(f"Job {job_id}: 구독자 없음, 취소")
+    await asyncio.to_thread(cancel_job, job_id, celery_app, "disconnected")
 
 @app.websocket("/ws/{job_id}")
 async def websocket_endpoint(websocket: WebSocket, job_id: str):
     await websocket.accept()
+    # 상태 조회 전에 먼저 구독해야 그 사이에 끝난 작업의 이벤트를 놓치지 않습니다.
+    queue = progress_hub.subscribe(job_id)
+    await asyncio.to_thread(add_watcher, job_id)
+    watcher_refreshed = asyncio.get_running_loop().time()
+    finished = False
     task = AsyncResult(job_id, app=celery_app)
-    
-    last_message = None
+    # 제출 요청과 같은 trace에 WebSocket 구간(이벤트 전달, 보조 폴링, 결과 전송)을 이어 붙임
+    trace = start_trace("WS /ws", traceparent=lookup_trace(job_id), job_id=job_id)
+    ws_span = trace.__enter__()
+    events_sent = 0
+    fallback_polls = 0
+    disconnected = asyncio.create_task(wait_for_disconnect(websocket))
+
     try:
-        while task.state not in [states.SUCCESS, states.FAILURE]:
-            if task.state == 'PROGRESS':
-                current_message = task.info
-                if current_message != last_message:
-                    await websocket.send_json(current_message)
-                    last_message = current_message
-            await asyncio.sleep(0.5)
-
-        if task.state == states.SUCCESS:
-            await websocket.send_json(task.result)
-        elif task.state == states.FAILURE:
-            await websocket.send_json({
-                "status": "FAILED", 
-                "error": str(task.info)
-            })
+        # 진행 상황은 워커가 발행한 이벤트로 받고, 종료는 FINISHED_EVENT로 판단합니다.
+        # 결과 백엔드 조회는 구독 직후 한 번(이미 끝난 작업)과, 이벤트 유실에 대비해
+        # 이벤트 없이 PROGRESS_FALLBACK_POLL_SEC가 지났을 때만 (블로킹이므로 이벤트 루프 밖에서)
+        done = await asyncio.to_thread(task.ready)
+        while not done:
+            if asyncio.get_running_loop().time() - watcher_refreshed > WATCHER_TTL_SEC / 3:
+                await asyncio.to_thread(refresh_watcher, job_id)
+                watcher_refreshed = asyncio.get_running_loop().time()
+            getter = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait(
+                {getter, disconnected}, timeout=PROGRESS_FALLBACK_POLL_SEC,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if getter not in done:
+                getter.cancel()
+                if disconnected in done:
+                    raise WebSocketDisconnect()
+                fallback_polls += 1
+                done = await asyncio.to_thread(task.ready)
+                continue
+            message = getter.result()
+
+            if message.get("event") == FINISHED_EVENT:
+                break
+            await websocket.send_json(message)
+            events_sent += 1
+
+        state = await asyncio.to_thread(lambda: task.state)
+        finished = state in states.READY_STATES
+        with span("ws.send_result", state=state):
+            if state == states.SUCCESS:
+                result = task.result
+                # 평가가 이미 끝났으면(늦게 접속한 경우) 결과에 붙여서 한 번에 보냄
+                evaluation = await asyncio.to_thread(get_evaluation, job_id) if is_pending(result) else None
+                if evaluation is not None:
+                    result = with_evaluation(result, evaluation)
+                await websocket.send_json(result)
+                if is_pending(result):
+                    # 이미지는 먼저 보냈고, 평가 지표는 끝나는 대로 후속 이벤트로 전달
+                    message = await wait_for_evaluation(queue, disconnected)
+                    if message is not None:
+                        await websocket.send_json(message)
+            elif state == states.FAILURE:
+                await websocket.send_json({
+                    "status": "FAILED", 
+                    "error": str(task.info)
+                })
+            else:
+                await websocket.send_json({"status": state})
 
     except WebSocketDisconnect:
         print(f"Client {job_id} disconnected")
     finally:
+        disconnected.cancel()
+        progress_hub.unsubscribe(job_id, queue)
+        remaining = await asyncio.to_thread(remove_watcher, job_id)
+        if CANCEL_GRACE_SEC >= 0 and not finished and remaining is not None and remaining <= 0:
+            pending = asyncio.create_task(cancel_if_abandoned(job_id))
+            _pending_cancels.add(pending)
+            pending.add_done_callback(_pending_cancels.discard)
+        ws_span.set(events_sent=events_sent, fallback_polls=fallback_polls)
+        trace.__exit__(None, None, None)
         try:
             await websocket.close()
         except:
-            pass
\ No newline at end of file
+            pass
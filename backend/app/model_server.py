@@ -0,0 +1,120 @@
+import argparse
+import os
+import socketserver
+import threading
+import time
+from collections import Counter
+
+import psutil
+
+from .tools.model_client import MODEL_SERVER_SOCKET, send_frame, recv_frame
+from .tools.vqa_tool import VQABatcher, load_vqa_pipeline, run_vqa_batch, VQA_MAX_BATCH
+from .tools import evaluation_tool
+
+# 호스트당 한 벌의 경량 모델(ViLT VQA, CLIP)을 들고, 워커들의 요청을 Unix 소켓으로 받아
+# 배치로 실행하는 모델 서버. 워커가 늘어나도 모델 메모리/로딩 시간은 늘어나지 않습니다.
+#   MODEL_SERVER_SOCKET=/tmp/agent-model-server.sock python -m app.model_server
+# 다른 연결에서 온 요청끼리 모일 수 있도록 워커 내부보다 배치 창을 조금 길게 둠
+MODEL_SERVER_BATCH_WINDOW_MS = float(os.environ.get("MODEL_SERVER_BATCH_WINDOW_MS", "15"))
+
+
+def clip_pair_scores(images, texts) -> list:
+    """(이미지, 텍스트) 쌍별 점수. 배치 전체를 한 번에 인코딩하고 대각 성분만 사용"""
+    matrix = evaluation_tool.calculate_clip_scores(images, texts)
+    return [matrix[i][i] for i in range(len(images))]
+
+
+class ModelServer:
+    def __init__(self, window_ms: float = MODEL_SERVER_BATCH_WINDOW_MS, max_batch: int = VQA_MAX_BATCH):
+        # VQABatcher는 (입력, 질의) 쌍을 모아 배치 함수에 넘기는 범용 배처라 CLIP에도 그대로 사용
+        self.vqa = VQABatcher(window_ms, max_batch, infer_batch=run_vqa_batch)
+        self.clip = VQABatcher(window_ms, max_batch, infer_batch=clip_pair_scores)
+        self.requests = Counter()
+        self.errors = Counter()
+        self.started = time.time()
+        self.connections = 0
+        self._lock = threading.Lock()
+
+    def load(self):
+        start = time.time()
+        load_vqa_pipeline()
+        evaluation_tool.load_clip_model()
+        print(f"[ModelServer] 모델 로드 완료 ({time.time() - start:.2f}s)")
+
+    def handle(self, header: dict, images: list) -> dict:
+        op = header.get("op")
+        with self._lock:
+            self.requests[op] += 1
+        if op == "vqa":
+            return {"answer": self.vqa.submit(images[0], header["question"]).result()}
+        if op == "clip":
+            return {"score": self.clip.submit(images[0], header["text"]).result()}
+        if op == "stats":
+            return {"stats": self.stats()}
+        raise ValueError(f"unknown op: {op}")
+
+    def stats(self) -> dict:
+        def mean(sizes):
+            return sum(sizes) / len(sizes) if sizes else 0
+
+        return {
+            "uptime_sec": time.time() - self.started,
+            "rss_mb": psutil.Process().memory_info().rss / 1024 ** 2,
+            "connections": self.connections,
+            "requests": dict(self.requests),
+            "errors": dict(self.errors),
+            "vqa_batch_mean": mean(list(self.vqa.batch_sizes)),
+            "clip_batch_mean": mean(list(self.clip.batch_sizes)),
+        }
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        server = self.server.model_server
+        server.connections += 1
+        try:
+            while True:
+                try:
+                    header, images = recv_frame(self.request)
+                except ConnectionError:
+                    return
+                try:
+                    reply = {"ok": True, **server.handle(header, images)}
+                except Exception as e:
+                    server.errors[header.get("op")] += 1
+                    reply = {"ok": False, "error": str(e)}
+                send_frame(self.request, reply)
+        finally:
+            server.connections -= 1
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(path: str = MODEL_SERVER_SOCKET, load: bool = True):
+    if not path:
+        raise ValueError("MODEL_SERVER_SOCKET이 설정되지 않았습니다.")
+    if os.path.exists(path):
+        os.unlink(path)  # 이전 실행에서 남은 소켓 파일
+
+    model_server = ModelServer()
+    if load:
+        model_server.load()
+
+    with _UnixServer(path, _Handler) as server:
+        server.model_server = model_server
+        os.chmod(path, 0o660)
+        print(f"[ModelServer] {path} 에서 대기 중")
+        try:
+            server.serve_forever()
+        finally:
+            os.unlink(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--socket", default=MODEL_SERVER_SOCKET or "/tmp/agent-model-server.sock")
+    args = parser.parse_args()
+
+    serve(args.socket)
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import redis
+
+from .redis_client import get_redis
+
+PLAN_CACHE_ENABLED = os.environ.get("PLAN_CACHE_ENABLED", "1") == "1"
+PLAN_CACHE_TTL_SEC = int(os.environ.get("PLAN_CACHE_TTL_SEC", str(60 * 60 * 6)))
+PLAN_CACHE_MAX_ENTRIES = int(os.environ.get("PLAN_CACHE_MAX_ENTRIES", "1024"))
+PLAN_CACHE_REDIS = os.environ.get("PLAN_CACHE_REDIS", "1") == "1"
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """대소문자/공백 차이만 있는 프롬프트는 같은 계획을 공유하도록 정규화합니다."""
+    return _WHITESPACE.sub(" ", prompt.strip().lower())
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class PlanCache:
+    """
+    LLM 계획 캐시 (프로세스 내 LRU + Redis 공유 계층).
+    키는 정규화된 프롬프트와 시스템 프롬프트(AGENT_PROMPT) 해시를 함께 사용하므로
+    프롬프트 템플릿이 바뀌면 이전 계획은 자연스럽게 무효화됩니다.
+    """
+
+    def __init__(self, system_prompt: str, model: str,
+                 ttl: int = PLAN_CACHE_TTL_SEC, max_entries: int = PLAN_CACHE_MAX_ENTRIES,
+                 use_redis: bool = PLAN_CACHE_REDIS):
+        self.namespace = _digest(f"{model}\n{system_prompt}")[:16]
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.use_redis = use_redis
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits_memory = 0
+        self.hits_redis = 0
+        self.misses = 0
+
+    def key(self, prompt: str) -> str:
+        return f"plan:{self.namespace}:{_digest(normalize_prompt(prompt))}"
+
+    # 실행 중에 계획의 파라미터가 이미지 등으로 치환되므로, 캐시에는 JSON 문자열로
+    # 보관하고 조회할 때마다 새 객체를 만들어 돌려줍니다.
+    def _get_memory(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, raw = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return raw
+
+    def _set_memory(self, key: str, raw: str):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, raw)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, prompt: str):
+        key = self.key(prompt)
+        raw = self._get_memory(key)
+        if raw is not None:
+            self.hits_memory += 1
+            return json.loads(raw)
+
+        if self.use_redis:
+            try:
+                raw = get_redis().get(key)
+            except redis.RedisError as e:
+                print(f"계획 캐시(Redis) 조회 실패: {e}")
+                raw = None
+            if raw is not None:
+                raw = raw.decode("utf-8")
+                self._set_memory(key, raw)
+                self.hits_redis += 1
+                return json.loads(raw)
+
+        self.misses += 1
+        return None
+
+    def set(self, prompt: str, plan: list):
+        # 빈 계획(LLM 오류 등)은 캐시하지 않습니다.
+        if not plan:
+            return
+        key = self.key(prompt)
+        raw = json.dumps(plan)
+        self._set_memory(key, raw)
+        if self.use_redis:
+            try:
+                get_redis().set(key, raw, ex=self.ttl)
+            except redis.RedisError as e:
+                print(f"계획 캐시(Redis) 저장 실패: {e}")
+
+    def get_or_plan(self, prompt: str, planner):
+        """
+        캐시에 계획이 있으면 바로 반환하고, 없으면 planner(prompt)를 호출해 저장합니다.
+        반환값: (plan, cache_hit)
+        """
+        if not PLAN_CACHE_ENABLED:
+            return planner(prompt), False
+
+        plan = self.get(prompt)
+        if plan is not None:
+            return plan, True
+
+        plan = planner(prompt)
+        self.set(prompt, plan)
+        return plan, False
+
+    def stats(self) -> dict:
+        lookups = self.hits_memory + self.hits_redis + self.misses
+        return {
+            "plan_cache/hits_memory": self.hits_memory,
+            "plan_cache/hits_redis": self.hits_redis,
+            "plan_cache/misses": self.misses,
+            "plan_cache/hit_rate": (self.hits_memory + self.hits_redis) / lookups if lookups else 0.0,
+            "plan_cache/entries": len(self._entries),
+        }
@@ -0,0 +1,181 @@
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# 로컬 mock 서버로 대체할 수 있도록 엔드포인트/모델을 환경 변수로 설정
+PLANNER_API_URL = os.environ.get("PLANNER_API_URL", "https://api.openai.com/v1/chat/completions")
+PLANNER_MODEL = os.environ.get("PLANNER_MODEL", "gpt-4o")
+PLANNER_API_KEY = os.environ.get("PLANNER_API_KEY", os.environ.get("OPENAI_API_KEY"))
+
+PLANNER_CONNECT_TIMEOUT = float(os.environ.get("PLANNER_CONNECT_TIMEOUT", "3.05"))
+PLANNER_READ_TIMEOUT = float(os.environ.get("PLANNER_READ_TIMEOUT", "30"))
+PLANNER_MAX_RETRIES = int(os.environ.get("PLANNER_MAX_RETRIES", "3"))
+PLANNER_BACKOFF_BASE = float(os.environ.get("PLANNER_BACKOFF_BASE", "0.5"))
+PLANNER_BACKOFF_MAX = float(os.environ.get("PLANNER_BACKOFF_MAX", "8"))
+# 429의 Retry-After를 따르되, 워커 슬롯이 너무 오래 묶이지 않도록 상한을 둠
+PLANNER_RETRY_AFTER_MAX = float(os.environ.get("PLANNER_RETRY_AFTER_MAX", "30"))
+PLANNER_POOL_SIZE = int(os.environ.get("PLANNER_POOL_SIZE", "8"))
+PLANNER_LATENCY_WINDOW = int(os.environ.get("PLANNER_LATENCY_WINDOW", "512"))
+
+# 재시도 대상 HTTP 상태 코드 (rate limit, 일시적 서버 오류)
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class PlannerError(Exception):
+    """재시도 후에도 계획을 받지 못한 경우"""
+
+
+def percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(q / 100 * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+class PlannerClient:
+    """
+    LLM 플래너 HTTP 클라이언트.
+    세션을 재사용해 TLS 핸드셰이크를 한 번만 하고, 연결/읽기 타임아웃과
+    지터가 포함된 지수 백오프 재시도로 워커 슬롯이 무한정 묶이지 않게 합니다.
+    """
+
+    def __init__(self, url: str = PLANNER_API_URL, model: str = PLANNER_MODEL,
+                 api_key: str = PLANNER_API_KEY,
+                 timeout=(PLANNER_CONNECT_TIMEOUT, PLANNER_READ_TIMEOUT),
+                 max_retries: int = PLANNER_MAX_RETRIES, pool_size: int = PLANNER_POOL_SIZE):
+        self.url = url
+        self.model = model
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_retries = max_retries
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        # gevent 워커에서는 monkey patch로 스레드가 greenlet이 되므로 그대로 협력적으로 동작합니다.
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="planner")
+
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=PLANNER_LATENCY_WINDOW)
+        self.calls = 0
+        self.retries = 0
+        self.errors = 0
+
+    def _payload(self, system_prompt: str, prompt: str) -> dict:
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            "response_format": {"type": "json_object"}
+        }
+
+    def _backoff(self, attempt: int) -> float:
+        # full jitter: 0 ~ base * 2^attempt
+        return random.uniform(0, min(PLANNER_BACKOFF_MAX, PLANNER_BACKOFF_BASE * (2 ** attempt)))
+
+    @staticmethod
+    def _retry_after(response):
+        """Retry-After 헤더(초)를 읽습니다. 없거나 HTTP 날짜 형식이면 None (지수 백오프 사용)"""
+        try:
+            return min(PLANNER_RETRY_AFTER_MAX, max(0.0, float(response.headers.get("Retry-After"))))
+        except (TypeError, ValueError):
+            return None
+
+    def _record(self, start: float, ok: bool):
+        # 실패한 호출도 지연 시간 분포에 포함 (재시도/타임아웃으로 묶인 시간이 보이도록)
+        with self._lock:
+            self._latencies.append(time.time() - start)
+            if ok:
+                self.calls += 1
+            else:
+                self.errors += 1
+
+    def plan(self, system_prompt: str, prompt: str) -> list:
+        """블로킹 호출. 계획(step 리스트)을 반환합니다."""
+        headers = {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
+        payload = self._payload(system_prompt, prompt)
+        start = time.time()
+        last_error = None
+        retry_after = None
+
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                with self._lock:
+                    self.retries += 1
+                time.sleep(retry_after if retry_after is not None else self._backoff(attempt - 1))
+                retry_after = None
+
+            try:
+                response = self.session.post(self.url, headers=headers, json=payload, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error = e
+                print(f"플래너 호출 실패 (시도 {attempt + 1}/{self.max_retries + 1}): {e}")
+                continue
+
+            if response.status_code in RETRY_STATUS:
+                last_error = PlannerError(f"HTTP {response.status_code}: {response.text[:200]}")
+                print(f"플래너 응답 오류 (시도 {attempt + 1}/{self.max_retries + 1}): {response.status_code}")
+                if response.status_code == 429:
+                    retry_after = self._retry_after(response)
+                continue
+
+            if response.status_code != 200:
+                last_error = PlannerError(f"HTTP {response.status_code}: {response.text[:200]}")
+                break
+
+            try:
+                content = response.json()['choices'][0]['message']['content']
+                plan = json.loads(content).get('plan', [])
+            except (ValueError, KeyError, IndexError, TypeError, AttributeError) as e:
+                # 200이지만 본문이 깨진 경우: 같은 요청을 다시 보내도 나아지지 않으므로 재시도하지 않음
+                last_error = PlannerError(f"잘못된 응답 본문: {e!r}")
+                break
+            self._record(start, ok=True)
+            return plan
+
+        self._record(start, ok=False)
+        raise PlannerError(f"계획 수립 실패: {last_error}")
+
+    def submit(self, system_prompt: str, prompt: str):
+        """논블로킹 호출. concurrent.futures.Future를 반환합니다."""
+        return self._executor.submit(self.plan, system_prompt, prompt)
+
+    async def plan_async(self, system_prompt: str, prompt: str) -> list:
+        """asyncio 환경에서 이벤트 루프를 막지 않고 계획을 받습니다."""
+        return await asyncio.wrap_future(self.submit(system_prompt, prompt))
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = list(self._latencies)
+            calls, retries, errors = self.calls, self.retries, self.errors
+        return {
+            "planner/calls": calls,
+            "planner/retries": retries,
+            "planner/errors": errors,
+            "planner/latency_p50": percentile(latencies, 50),
+            "planner/latency_p90": percentile(latencies, 90),
+            "planner/latency_p99": percentile(latencies, 99),
+        }
+
+
+_CLIENT = None
+
+
+def get_planner_client() -> PlannerClient:
+    global _CLIENT
+    if _CLIENT is None:
+        _CLIENT = PlannerClient()
+    return _CLIENT
@@ -0,0 +1,257 @@
+import json
+import os
+import socket
+import threading
+import time
+
+import redis
+from celery import current_app
+from celery.signals import worker_init, worker_process_init
+from PIL import Image
+
+from .redis_client import get_redis
+from .routing import HEAVY_QUEUE, LIGHT_QUEUE, EVAL_QUEUE
+from .tools.model_client import MODEL_SERVER_SOCKET, get_model_client
+from .tools.flux_batcher import FLUX_MAX_BATCH
+
+# 워커 부팅 시 큐에 필요한 모델을 미리 올리고, 준비 상태를 Redis에 공개합니다.
+WORKER_PRELOAD = os.environ.get("WORKER_PRELOAD", "1") == "1"
+PRELOAD_WARMUP = os.environ.get("PRELOAD_WARMUP", "1") == "1"
+PRELOAD_WARMUP_STEPS = int(os.environ.get("PRELOAD_WARMUP_STEPS", "1"))
+READINESS_TTL_SEC = int(os.environ.get("READINESS_TTL_SEC", "60"))
+# 워커별 준비 상태를 한 해시에 모아 둠 (API는 HGETALL 한 번으로 조회, keyspace 스캔 없음)
+READINESS_KEY = "worker_ready"
+
+# 큐별로 필요한 모델 (heavy는 생성 + 동기 평가, light는 VQA만, eval은 비동기 평가)
+QUEUE_MODELS = {
+    HEAVY_QUEUE: ["flux", "clip", "vqa"],
+    LIGHT_QUEUE: ["vqa"],
+    EVAL_QUEUE: ["clip", "vqa"],
+}
+
+# 모델 서버(app/model_server.py)가 대신 들고 있는 모델
+SERVED_MODELS = {"clip", "vqa"} if MODEL_SERVER_SOCKET else set()
+
+PRELOAD_METRICS = {}
+_state = {"state": "idle", "queues": [], "models": []}
+_heartbeat = None
+
+
+def _load_flux():
+    from .tools.sd_tool import load_pipeline
+    load_pipeline()
+
+
+def _load_clip():
+    from .tools.evaluation_tool import load_clip_model
+    if not load_clip_model():
+        raise RuntimeError("CLIP 모델 로딩 실패")
+
+
+def _load_vqa():
+    from .tools.vqa_tool import load_vqa_pipeline
+    load_vqa_pipeline()
+
+
+def _warmup_flux(image):
+    from .tools.sd_tool import load_pipeline
+    load_pipeline()(
+        prompt="warm-up",
+        image=image,
+        height=image.height,
+        width=image.width,
+        guidance_scale=4.0,
+        num_inference_steps=PRELOAD_WARMUP_STEPS,
+    )
+
+
+def _warmup_clip(image):
+    from .tools.evaluation_tool import calculate_clip_score
+    calculate_clip_score(image, "warm-up")
+
+
+def _warmup_vqa(image):
+    from .tools.vqa_tool import run_vqa
+    run_vqa(image, "what is this?")
+
+
+MODEL_LOADERS = {"flux": _load_flux, "clip": _load_clip, "vqa": _load_vqa}
+WARMUP_RUNNERS = {"flux": _warmup_flux, "clip": _warmup_clip, "vqa": _warmup_vqa}
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _cuda():
+    """이미 CUDA를 쓰고 있는 프로세스의 torch (아니면 None, 여기서 CUDA 컨텍스트를 만들지 않음)"""
+    try:
+        import torch
+    except ImportError:
+        return None
+    if not (torch.cuda.is_available() and torch.cuda.is_initialized()):
+        return None
+    return torch
+
+
+def _gpu_memory() -> dict:
+    """이미 CUDA를 쓰고 있는 워커만 여유/전체 VRAM을 보고합니다. (admission 슬롯 계산용)"""
+    torch = _cuda()
+    if torch is None:
+        return {}
+    free, total = torch.cuda.mem_get_info()
+    return {"gpu_free_mb": free / 1024 ** 2, "gpu_total_mb": total / 1024 ** 2}
+
+
+def publish_readiness(state: str, **fields):
+    _state.update(state=state, updated=time.time(), **fields)
+    _state.update(_gpu_memory())
+    record = {"worker": worker_id(), **_state, "metrics": PRELOAD_METRICS}
+    try:
+        get_redis().hset(READINESS_KEY, worker_id(), json.dumps(record))
+    except redis.RedisError as e:
+        print(f"워커 준비 상태 발행 실패: {e}")
+
+
+def publishes_readiness() -> bool:
+    """이 프로세스가 준비 상태를 공개하는지 (prefork 부모처럼 preload를 하지 않는 프로세스는 아님)"""
+    return _state["state"] != "idle"
+
+
+def update_readiness(**fields):
+    """현재 상태를 유지한 채 필드만 바꿔 다시 공개합니다. (실행 중 태스크 수, VRAM 추정치 등)"""
+    if publishes_readiness():
+        publish_readiness(_state["state"], **fields)
+
+
+def observe_job_vram(peak_mb: float):
+    """
+    태스크의 GPU peak 메모리에서 상주 모델 몫을 뺀 값으로 작업당 VRAM 추정치를 갱신합니다.
+    (warm-up 값은 작은 입력 기준이라, 실제 작업에서 더 크게 관측되면 그 값을 따름)
+    """
+    job_mb = peak_mb - _state.get("model_vram_mb", 0)
+    if job_mb > _state.get("job_vram_mb", 0):
+        update_readiness(job_vram_mb=job_mb)
+
+
+def _start_heartbeat():
+    """워커가 살아 있는 동안 준비 상태의 updated를 갱신합니다. (갱신이 끊긴 워커는 조회 시 정리)"""
+    global _heartbeat
+    if _heartbeat is not None:
+        return
+
+    def beat():
+        while True:
+            time.sleep(READINESS_TTL_SEC / 3)
+            publish_readiness(_state["state"])
+
+    _heartbeat = threading.Thread(target=beat, name="readiness-heartbeat", daemon=True)
+    _heartbeat.start()
+
+
+def models_for_queues(queues) -> list:
+    models = []
+    for queue in queues:
+        for model in QUEUE_MODELS.get(queue, []):
+            if model not in models and model not in SERVED_MODELS:
+                models.append(model)
+    return models
+
+
+def preload_worker(queues, concurrency: int = 1):
+    """큐에 필요한 모델을 로드하고 warm-up 추론까지 마친 뒤 ready 상태를 발행합니다."""
+    models = models_for_queues(queues)
+    if HEAVY_QUEUE in queues and FLUX_MAX_BATCH > 1:
+        # 배칭용 threads 풀: 태스크는 FLUX_MAX_BATCH개를 받지만 GPU에서는 스케줄러 스레드가
+        # 배치를 하나씩 실행하므로 처리 슬롯은 1 (admission이 N개의 독립 슬롯으로 보지 않도록)
+        concurrency = 1
+    publish_readiness("loading", queues=list(queues), models=models, concurrency=concurrency)
+    _start_heartbeat()
+
+    total_start = time.time()
+    try:
+        if any(m in SERVED_MODELS for q in queues for m in QUEUE_MODELS.get(q, [])):
+            # 모델 서버가 떠 있어야 이 워커도 VQA/CLIP 단계를 처리할 수 있음
+            start = time.time()
+            get_model_client().stats()
+            PRELOAD_METRICS["preload/model_server_ping_sec"] = time.time() - start
+
+        for model in models:
+            start = time.time()
+            MODEL_LOADERS[model]()
+            PRELOAD_METRICS[f"preload/{model}_load_sec"] = time.time() - start
+            print(f"[Preload] {model} 로드 완료 ({PRELOAD_METRICS[f'preload/{model}_load_sec']:.2f}s)")
+
+        # 상주 모델 VRAM (admission이 남은 VRAM으로 heavy 슬롯을 계산할 때 뺌)
+        torch = _cuda()
+        if torch is not None:
+            _state["model_vram_mb"] = torch.cuda.memory_allocated() / 1024 ** 2
+            torch.cuda.reset_peak_memory_stats()
+
+        if PRELOAD_WARMUP:
+            dummy = Image.new("RGB", (256, 256), (127, 127, 127))
+            for model in models:
+                start = time.time()
+                WARMUP_RUNNERS[model](dummy)
+                PRELOAD_METRICS[f"preload/{model}_warmup_sec"] = time.time() - start
+                print(f"[Preload] {model} warm-up 완료 ({PRELOAD_METRICS[f'preload/{model}_warmup_sec']:.2f}s)")
+            # warm-up의 peak - 상주분을 작업당 VRAM 초기 추정치로 (실제 작업에서 관측되면 갱신)
+            if torch is not None:
+                _state["job_vram_mb"] = torch.cuda.max_memory_allocated() / 1024 ** 2 - _state["model_vram_mb"]
+
+    except Exception as e:
+        PRELOAD_METRICS["preload/total_sec"] = time.time() - total_start
+        print(f"[Preload] 실패: {e}")
+        publish_readiness("failed", error=str(e))
+        return
+
+    PRELOAD_METRICS["preload/total_sec"] = time.time() - total_start
+    publish_readiness("ready")
+
+
+def _consumed_queues(app) -> list:
+    return sorted(app.amqp.queues.consume_from.keys())
+
+
+@worker_init.connect
+def preload_on_worker_init(sender=None, **kwargs):
+    # solo / threads / gevent 풀은 자식 프로세스가 없으므로 메인 프로세스에서 로드합니다.
+    # (consumer 시작 전에 실행되므로 로딩 중에는 작업을 가져가지 않습니다)
+    pool_cls = getattr(sender, "pool_cls", None)
+    pool_name = getattr(pool_cls, "__module__", str(pool_cls))
+    if not WORKER_PRELOAD or "prefork" in pool_name:
+        return
+    preload_worker(_consumed_queues(sender.app), concurrency=getattr(sender, "concurrency", 1) or 1)
+
+
+@worker_process_init.connect
+def preload_on_worker_process_init(**kwargs):
+    # prefork 자식 프로세스: 초기화가 끝나야 부모가 작업을 배분합니다.
+    if not WORKER_PRELOAD:
+        return
+    preload_worker(_consumed_queues(current_app))
+
+
+def readiness_snapshot() -> dict:
+    """API에서 호출: 살아 있는 워커들의 준비 상태와 큐별 ready 워커 수"""
+    client = get_redis()
+    workers = []
+    stale = []
+    now = time.time()
+    for field, raw in client.hgetall(READINESS_KEY).items():
+        record = json.loads(raw)
+        # READINESS_TTL_SEC 동안 heartbeat가 없으면 죽은 워커로 보고 제거
+        if now - record.get("updated", 0) > READINESS_TTL_SEC:
+            stale.append(field)
+        else:
+            workers.append(record)
+    if stale:
+        client.hdel(READINESS_KEY, *stale)
+
+    ready_by_queue = {}
+    for worker in workers:
+        for queue in worker.get("queues", []):
+            ready_by_queue.setdefault(queue, 0)
+            if worker.get("state") == "ready":
+                ready_by_queue[queue] += 1
+    return {"workers": workers, "ready_by_queue": ready_by_queue}
@@ -0,0 +1,80 @@
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+import torch
+
+# 요청 단위 torch.profiler 캡처 (API 플래그/헤더 또는 샘플링 비율로 켬)
+# 꺼져 있으면 profiler를 import조차 하지 않고 nullcontext만 돌려줍니다.
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.environ.get(
+    "PROFILE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "profiles")
+)
+PROFILE_TOP_N = int(os.environ.get("PROFILE_TOP_N", "20"))
+PROFILE_RECORD_SHAPES = os.environ.get("PROFILE_RECORD_SHAPES", "1") == "1"
+PROFILE_MEMORY = os.environ.get("PROFILE_MEMORY", "1") == "1"
+PROFILE_HEADER = "X-Profile"
+
+_active = threading.local()
+
+
+def should_profile(requested: bool = False) -> bool:
+    """요청에서 명시했거나 샘플링에 걸리면 이 job을 프로파일링합니다. (job마다 한 번 결정)"""
+    return bool(requested) or (PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE)
+
+
+def region(name: str):
+    """프로파일링 중일 때만 record_function 구간을 남깁니다. (아니면 nullcontext)"""
+    if not getattr(_active, "on", False):
+        return nullcontext()
+    return torch.profiler.record_function(name)
+
+
+def profile_tools(job_id: str, enabled: bool, metrics: dict, label: str = "tools"):
+    if not enabled:
+        return nullcontext()
+    return _capture(job_id, metrics, label)
+
+
+@contextmanager
+def _capture(job_id: str, metrics: dict, label: str):
+    from torch.profiler import profile, ProfilerActivity
+
+    activities = [ProfilerActivity.CPU]
+    cuda = torch.cuda.is_available()
+    if cuda:
+        activities.append(ProfilerActivity.CUDA)
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, f"{job_id}_{label}")
+    prefix = "profile/" if label == "tools" else f"profile/{label}/"
+
+    with profile(activities=activities, record_shapes=PROFILE_RECORD_SHAPES,
+                 profile_memory=PROFILE_MEMORY, with_stack=False) as prof:
+        _active.on = True
+        try:
+            yield prof
+        finally:
+            _active.on = False
+
+    # 내보내기 비용은 결과 지표에 따로 남김 (캡처한 구간의 측정값에는 포함되지 않음)
+    export_start = time.time()
+    trace_path = f"{base}.json"
+    table_path = f"{base}.txt"
+    try:
+        prof.export_chrome_trace(trace_path)
+        sort_by = "cuda_time_total" if cuda else "cpu_time_total"
+        with open(table_path, "w") as f:
+            f.write(prof.key_averages(group_by_input_shape=False).table(sort_by=sort_by, row_limit=PROFILE_TOP_N))
+    except Exception as e:
+        print(f"[Profiler] 결과 저장 실패: {e}")
+        metrics[f"{prefix}error"] = str(e)
+        return
+
+    metrics[f"{prefix}trace_path"] = trace_path
+    metrics[f"{prefix}table_path"] = table_path
+    metrics[f"{prefix}export_sec"] = time.time() - export_start
+    print(f"[Profiler] Chrome trace: {trace_path}, Top-{PROFILE_TOP_N}: {table_path}")
@@ -0,0 +1,137 @@
+import asyncio
+import json
+import os
+import time
+from collections import defaultdict
+
+import redis
+
+from .redis_client import get_redis, get_async_redis
+
+# 작업 진행 이벤트는 job 단위 채널(progress:{job_id})로 발행됩니다.
+PROGRESS_CHANNEL_PREFIX = "progress:"
+
+# 이벤트 유실(워커 강제 종료 등)에 대비한 보조 상태 확인 주기 (초)
+PROGRESS_FALLBACK_POLL_SEC = float(os.environ.get("PROGRESS_FALLBACK_POLL_SEC", "15"))
+
+# 소켓 하나가 느릴 때 메모리가 무한히 늘어나지 않도록 큐 길이를 제한
+PROGRESS_QUEUE_SIZE = int(os.environ.get("PROGRESS_QUEUE_SIZE", "256"))
+
+# 작업 종료를 알리는 이벤트 (task_postrun 시그널에서 발행)
+FINISHED_EVENT = "finished"
+
+
+def progress_channel(job_id: str) -> str:
+    return f"{PROGRESS_CHANNEL_PREFIX}{job_id}"
+
+
+def publish_progress(job_id: str, event: str, **fields) -> dict:
+    """
+    워커에서 진행 이벤트를 발행합니다.
+    Redis 장애가 작업 자체를 실패시키지 않도록 예외는 로그만 남깁니다.
+    """
+    message = {
+        "status": "PROGRESS",
+        "event": event,
+        "job_id": job_id,
+        "ts": time.time(),
+        **fields,
+    }
+    if not job_id:
+        return message
+
+    try:
+        get_redis().publish(progress_channel(job_id), json.dumps(message, default=str))
+    except redis.RedisError as e:
+        print(f"진행 이벤트 발행 실패 ({event}): {e}")
+    return message
+
+
+class ProgressHub:
+    """
+    API 프로세스에 하나만 존재하는 공유 구독자.
+    Redis 구독은 패턴 하나(progress:*)로 고정되고, 수신한 이벤트를 job_id별로
+    연결된 WebSocket 큐에 나눠 줍니다. 소켓 수와 무관하게 Redis 부하는 일정합니다.
+    """
+
+    def __init__(self):
+        self._queues = defaultdict(set)
+        self._listener = None
+        self._redis = None
+
+    async def start(self):
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=PROGRESS_QUEUE_SIZE)
+        self._queues[job_id].add(queue)
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue):
+        queues = self._queues.get(job_id)
+        if not queues:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._queues[job_id]
+
+    def watcher_count(self, job_id: str) -> int:
+        return len(self._queues.get(job_id, ()))
+
+    def dispatch(self, job_id: str, message: dict):
+        """수신한 이벤트를 해당 job을 보고 있는 모든 소켓 큐에 전달합니다."""
+        for queue in list(self._queues.get(job_id, ())):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # 느린 소켓은 가장 오래된 이벤트를 버리고 최신 상태를 유지
+                queue.get_nowait()
+                queue.put_nowait(message)
+
+    async def _listen(self):
+        backoff = 0.5
+        while True:
+            try:
+                self._redis = get_async_redis()
+                pubsub = self._redis.pubsub()
+                await pubsub.psubscribe(f"{PROGRESS_CHANNEL_PREFIX}*")
+                print("진행 이벤트 구독 시작")
+                backoff = 0.5
+
+                async for raw in pubsub.listen():
+                    if raw.get("type") != "pmessage":
+                        continue
+                    channel = raw["channel"]
+                    if isinstance(channel, bytes):
+                        channel = channel.decode()
+                    job_id = channel[len(PROGRESS_CHANNEL_PREFIX):]
+                    if job_id not in self._queues:
+                        continue
+                    try:
+                        message = json.loads(raw["data"])
+                    except (TypeError, ValueError):
+                        continue
+                    self.dispatch(job_id, message)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"진행 이벤트 구독 끊김, {backoff:.1f}초 후 재연결: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 10)
+
+
+progress_hub = ProgressHub()
@@ -0,0 +1,24 @@
+import os
+import redis
+import redis.asyncio as aioredis
+
+# 브로커와 같은 Redis를 기본으로 사용 (별도 인스턴스가 필요하면 REDIS_URL로 분리)
+REDIS_URL = os.environ.get(
+    "REDIS_URL",
+    os.environ.get("CELERY_BROKER_URL", "redis://localhost:6379/0")
+)
+
+_CLIENT = None
+
+
+def get_redis() -> redis.Redis:
+    """프로세스 단위로 공유되는 동기 Redis 클라이언트 (커넥션 풀 재사용)"""
+    global _CLIENT
+    if _CLIENT is None:
+        _CLIENT = redis.Redis.from_url(REDIS_URL)
+    return _CLIENT
+
+
+def get_async_redis() -> aioredis.Redis:
+    """API(asyncio) 쪽에서 사용할 비동기 Redis 클라이언트를 생성합니다."""
+    return aioredis.Redis.from_url(REDIS_URL)
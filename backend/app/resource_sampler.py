@@ -0,0 +1,323 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import psutil
+import redis
+from celery.signals import worker_init, worker_process_init, task_prerun, task_postrun
+
+from .redis_client import get_redis
+from .preload import worker_id
+
+# 워커 프로세스 안에서 GPU/CPU/메모리를 주기적으로 샘플링하고,
+# 각 샘플에 그 시점에 실행 중이던 task id와 단계(stage)를 붙여 고정 크기 링 버퍼에 보관합니다.
+RESOURCE_SAMPLER_ENABLED = os.environ.get("RESOURCE_SAMPLER_ENABLED", "1") == "1"
+RESOURCE_SAMPLE_INTERVAL_SEC = float(os.environ.get("RESOURCE_SAMPLE_INTERVAL_SEC", "0.5"))
+# 0.5초 간격 기준 약 1시간 분량
+RESOURCE_RING_SIZE = int(os.environ.get("RESOURCE_RING_SIZE", "7200"))
+RESOURCE_GPU_INDEX = int(os.environ.get("RESOURCE_GPU_INDEX", "0"))
+# 집계 요약을 Redis에 공개하는 주기와 집계 구간
+RESOURCE_PUBLISH_SEC = float(os.environ.get("RESOURCE_PUBLISH_SEC", "5"))
+RESOURCE_WINDOW_SEC = float(os.environ.get("RESOURCE_WINDOW_SEC", "60"))
+# 워커별 집계를 한 해시에 모아 둠 (API는 HGETALL 한 번으로 조회, keyspace 스캔 없음)
+RESOURCE_KEY = "worker_resources"
+# 발행이 이 시간 동안 끊긴 워커는 조회 시 정리
+RESOURCE_STALE_SEC = RESOURCE_PUBLISH_SEC * 3
+# 원본 샘플도 발행 주기마다 워커 프로세스별 Redis 리스트(링)에 밀어 넣음
+# (prefork 풀에서는 샘플러가 자식 프로세스에 있어서 부모의 control 명령으로는 조회할 수 없음)
+RESOURCE_SAMPLES_KEY_PREFIX = "resource_samples:"
+RESOURCE_REDIS_RING_SIZE = int(os.environ.get("RESOURCE_REDIS_RING_SIZE", str(RESOURCE_RING_SIZE)))
+RESOURCE_SAMPLES_TTL_SEC = int(os.environ.get("RESOURCE_SAMPLES_TTL_SEC", "3600"))
+
+FIELDS = ("time", "tags", "cpu_util", "ram_util", "rss_mb",
+          "gpu_mem_mb", "gpu_util", "gpu_power_w", "gpu_temp_c", "torch_alloc_mb")
+NUMERIC_FIELDS = FIELDS[2:]
+
+
+class ResourceSampler:
+    def __init__(self, interval: float = RESOURCE_SAMPLE_INTERVAL_SEC, size: int = RESOURCE_RING_SIZE):
+        self.interval = interval
+        self.samples = deque(maxlen=size)
+        self.process = psutil.Process()
+        # task_id -> 현재 단계. 스레드 풀에서는 여러 task가 동시에 활성일 수 있음
+        self.active = {}
+        self.lock = threading.Lock()
+        self.nvml = None
+        self.gpu = None
+        self.thread = None
+        self.started_at = None
+        self.sample_sec = 0.0
+        self.last_publish = 0.0
+        # Redis 링에 이미 밀어 넣은 마지막 샘플 시각
+        self.published_until = 0.0
+
+    def _init_nvml(self):
+        # NVML 초기화는 한 번만 (예전 profile_monitor는 샘플마다 nvmlInit을 호출했음)
+        try:
+            import pynvml
+            pynvml.nvmlInit()
+            self.gpu = pynvml.nvmlDeviceGetHandleByIndex(RESOURCE_GPU_INDEX)
+            self.nvml = pynvml
+        except Exception as e:
+            print(f"[ResourceSampler] NVML 사용 불가, CPU/RSS만 수집합니다: {e}")
+            self.nvml = None
+            self.gpu = None
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self._init_nvml()
+        self.process.cpu_percent(None)
+        psutil.cpu_percent(None)
+        self.started_at = time.time()
+        self.thread = threading.Thread(target=self._loop, name="resource-sampler", daemon=True)
+        self.thread.start()
+
+    def _gpu_stats(self) -> tuple:
+        if self.gpu is None:
+            return None, None, None, None
+        try:
+            mem = self.nvml.nvmlDeviceGetMemoryInfo(self.gpu)
+            util = self.nvml.nvmlDeviceGetUtilizationRates(self.gpu)
+            power = self.nvml.nvmlDeviceGetPowerUsage(self.gpu) / 1000.0  # mW -> W
+            temp = self.nvml.nvmlDeviceGetTemperature(self.gpu, self.nvml.NVML_TEMPERATURE_GPU)
+            return mem.used / 1024 ** 2, util.gpu, power, temp
+        except Exception:
+            return None, None, None, None
+
+    def _torch_allocated(self):
+        # 이미 CUDA를 쓰고 있는 프로세스에서만 조회 (샘플러가 CUDA 컨텍스트를 만들지 않도록)
+        torch = sys.modules.get("torch")
+        if torch is None or not torch.cuda.is_initialized():
+            return None
+        return torch.cuda.memory_allocated() / 1024 ** 2
+
+    def sample(self) -> tuple:
+        start = time.perf_counter()
+        with self.lock:
+            tags = tuple(self.active.items())
+        record = (
+            time.time(), tags,
+            psutil.cpu_percent(None), psutil.virtual_memory().percent,
+            self.process.memory_info().rss / 1024 ** 2,
+            *self._gpu_stats(), self._torch_allocated(),
+        )
+        self.samples.append(record)
+        self.sample_sec += time.perf_counter() - start
+        return record
+
+    def _loop(self):
+        while True:
+            self.sample()
+            if time.time() - self.last_publish >= RESOURCE_PUBLISH_SEC:
+                self.publish()
+            time.sleep(self.interval)
+
+    # ------------------------------------------------
+    # task / stage 태깅
+    # ------------------------------------------------
+
+    def set_stage(self, task_id: str, stage: str):
+        with self.lock:
+            self.active[task_id] = stage
+
+    def clear(self, task_id: str):
+        with self.lock:
+            self.active.pop(task_id, None)
+
+    # ------------------------------------------------
+    # 조회 / 집계
+    # ------------------------------------------------
+
+    def snapshot(self, task_id: str = None, last_sec: float = None) -> list:
+        since = time.time() - last_sec if last_sec else 0
+        return [
+            s for s in list(self.samples)
+            if s[0] >= since and (task_id is None or any(t == task_id for t, _ in s[1]))
+        ]
+
+    def aggregate(self, window_sec: float = RESOURCE_WINDOW_SEC) -> dict:
+        samples = self.snapshot(last_sec=window_sec)
+        elapsed = time.time() - self.started_at if self.started_at else 0
+        result = {
+            "worker": worker_id(),
+            "nvml": self.gpu is not None,
+            "window_sec": window_sec,
+            "samples": len(samples),
+            "buffered": len(self.samples),
+            "active_tasks": dict(self.active),
+            "overhead_pct": round(self.sample_sec / elapsed * 100, 4) if elapsed else 0,
+            "updated": time.time(),
+        }
+        for i, field in enumerate(FIELDS):
+            if field not in NUMERIC_FIELDS:
+                continue
+            values = [s[i] for s in samples if s[i] is not None]
+            if values:
+                result[f"{field}_mean"] = sum(values) / len(values)
+                result[f"{field}_max"] = max(values)
+        return result
+
+    def task_summary(self, task_id: str, prefix: str = "resource/") -> dict:
+        """해당 task가 실행되는 동안의 샘플을 요약합니다. (task의 metrics dict에 합쳐짐)"""
+        samples = self.snapshot(task_id=task_id)
+        if not samples:
+            return {f"{prefix}samples": 0}
+
+        column = {field: [s[i] for s in samples if s[i] is not None] for i, field in enumerate(FIELDS)}
+        summary = {f"{prefix}samples": len(samples)}
+        if column["gpu_mem_mb"]:
+            summary[f"{prefix}gpu_mem_peak_mb"] = max(column["gpu_mem_mb"])
+            summary[f"{prefix}gpu_util_mean"] = sum(column["gpu_util"]) / len(column["gpu_util"])
+            summary[f"{prefix}gpu_power_mean_w"] = sum(column["gpu_power_w"]) / len(column["gpu_power_w"])
+            summary[f"{prefix}gpu_energy_j"] = sum(column["gpu_power_w"]) * self.interval
+        if column["torch_alloc_mb"]:
+            summary[f"{prefix}torch_alloc_peak_mb"] = max(column["torch_alloc_mb"])
+        summary[f"{prefix}cpu_util_mean"] = sum(column["cpu_util"]) / len(column["cpu_util"])
+        summary[f"{prefix}rss_peak_mb"] = max(column["rss_mb"])
+
+        # 단계별 샘플 수(≈ 시간)와 GPU 사용률
+        by_stage = {}
+        for s in samples:
+            stage = dict(s[1]).get(task_id)
+            by_stage.setdefault(stage, []).append(s)
+        for stage, group in by_stage.items():
+            summary[f"{prefix}stage/{stage}/sec"] = len(group) * self.interval
+            utils = [s[FIELDS.index("gpu_util")] for s in group if s[FIELDS.index("gpu_util")] is not None]
+            if utils:
+                summary[f"{prefix}stage/{stage}/gpu_util_mean"] = sum(utils) / len(utils)
+        return summary
+
+    def publish(self):
+        self.last_publish = time.time()
+        fresh = [s for s in list(self.samples) if s[0] > self.published_until]
+        samples_key = f"{RESOURCE_SAMPLES_KEY_PREFIX}{worker_id()}"
+        try:
+            pipe = get_redis().pipeline()
+            pipe.hset(RESOURCE_KEY, worker_id(), json.dumps(self.aggregate()))
+            if fresh:
+                pipe.rpush(samples_key, *[json.dumps(sample_to_row(s)) for s in fresh])
+                pipe.ltrim(samples_key, -RESOURCE_REDIS_RING_SIZE, -1)
+                pipe.expire(samples_key, RESOURCE_SAMPLES_TTL_SEC)
+            pipe.execute()
+            if fresh:
+                self.published_until = fresh[-1][0]
+        except redis.RedisError as e:
+            print(f"[ResourceSampler] 집계 발행 실패: {e}")
+
+
+def sample_to_row(sample: tuple) -> dict:
+    row = dict(zip(FIELDS, sample))
+    tags = row.pop("tags")
+    row["task_id"] = ";".join(t for t, _ in tags)
+    row["stage"] = ";".join(str(s) for _, s in tags)
+    return row
+
+
+_SAMPLER = None
+_current_task = threading.local()
+
+
+def get_sampler() -> ResourceSampler:
+    global _SAMPLER
+    if _SAMPLER is None:
+        _SAMPLER = ResourceSampler()
+    return _SAMPLER
+
+
+def start_sampler():
+    if RESOURCE_SAMPLER_ENABLED:
+        get_sampler().start()
+
+
+@contextmanager
+def stage(name: str):
+    """현재 스레드에서 실행 중인 task의 단계를 표시합니다. (샘플 태그로 사용)"""
+    task_id = getattr(_current_task, "id", None)
+    if _SAMPLER is None or task_id is None:
+        yield
+        return
+    previous = _SAMPLER.active.get(task_id)
+    _SAMPLER.set_stage(task_id, name)
+    try:
+        yield
+    finally:
+        if previous is not None:
+            _SAMPLER.set_stage(task_id, previous)
+
+
+def task_resource_summary(task_id: str, prefix: str = "resource/") -> dict:
+    if _SAMPLER is None:
+        return {}
+    return _SAMPLER.task_summary(task_id, prefix)
+
+
+def _live_workers(client) -> list:
+    """최근에 집계를 발행한 워커들의 집계 (RESOURCE_STALE_SEC 동안 발행이 없으면 해시에서 제거)"""
+    workers = []
+    stale = []
+    now = time.time()
+    for field, raw in client.hgetall(RESOURCE_KEY).items():
+        record = json.loads(raw)
+        if now - record.get("updated", 0) > RESOURCE_STALE_SEC:
+            stale.append(field)
+        else:
+            workers.append(record)
+    if stale:
+        client.hdel(RESOURCE_KEY, *stale)
+    return workers
+
+
+def resource_snapshot() -> dict:
+    """API에서 호출: 워커들이 공개한 최근 자원 사용 집계"""
+    return {"workers": _live_workers(get_redis())}
+
+
+def resource_samples_snapshot(task_id: str = None, last_sec: float = None) -> dict:
+    """API에서 호출: 살아 있는 워커 프로세스별 Redis 링에 쌓인 원본 샘플 (profile_monitor 그래프용)"""
+    client = get_redis()
+    since = time.time() - last_sec if last_sec else 0
+    names = [w["worker"] for w in _live_workers(client)]
+    pipe = client.pipeline()
+    for name in names:
+        pipe.lrange(f"{RESOURCE_SAMPLES_KEY_PREFIX}{name}", 0, -1)
+    workers = {}
+    for name, raws in zip(names, pipe.execute()):
+        rows = [json.loads(raw) for raw in raws]
+        workers[name] = {"samples": [
+            r for r in rows
+            if r["time"] >= since and (task_id is None or task_id in r["task_id"].split(";"))
+        ]}
+    return {"workers": workers}
+
+
+@task_prerun.connect
+def tag_task_start(task_id=None, **kwargs):
+    _current_task.id = task_id
+    if _SAMPLER is not None:
+        _SAMPLER.set_stage(task_id, "task")
+
+
+@task_postrun.connect
+def tag_task_end(task_id=None, **kwargs):
+    _current_task.id = None
+    if _SAMPLER is not None:
+        _SAMPLER.clear(task_id)
+
+
+@worker_init.connect
+def start_on_worker_init(sender=None, **kwargs):
+    # preload와 같은 기준: prefork는 task를 실행하는 자식 프로세스에서 시작
+    pool_cls = getattr(sender, "pool_cls", None)
+    if "prefork" not in getattr(pool_cls, "__module__", str(pool_cls)):
+        start_sampler()
+
+
+@worker_process_init.connect
+def start_on_worker_process_init(**kwargs):
+    start_sampler()
+
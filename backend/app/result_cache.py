@@ -0,0 +1,113 @@
+import hashlib
+import os
+import time
+
+import redis
+from celery import states
+
+from .redis_client import get_redis
+from .plan_cache import normalize_prompt
+from .blob_store import parse_ref
+from .planner_client import PLANNER_MODEL
+
+# (이미지, 프롬프트, 모델/설정 버전)이 같은 요청은 이미 실행 중이거나 끝난 job을 재사용합니다.
+RESULT_CACHE_ENABLED = os.environ.get("RESULT_CACHE_ENABLED", "1") == "1"
+# 모델 가중치/프롬프트 템플릿/기본 파라미터를 바꾸면 버전을 올려 이전 결과를 무효화합니다.
+RESULT_CACHE_VERSION = os.environ.get("RESULT_CACHE_VERSION", "v1")
+# Celery 결과 백엔드의 보관 기간(result_expires, 기본 1일)보다 짧아야 합니다.
+RESULT_CACHE_TTL_SEC = int(os.environ.get("RESULT_CACHE_TTL_SEC", str(60 * 60 * 6)))
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+
+JOB_KEY_PREFIX = "rc:job:"
+LRU_KEY = "rc:lru"
+SIZE_KEY = "rc:size"
+BYTES_KEY = "rc:bytes"
+
+# 실패/취소된 job은 재사용하지 않고 새로 실행합니다.
+_RETRYABLE_STATES = {states.FAILURE, states.REVOKED}
+
+
+def result_cache_key(image_ref: str, prompt: str, config: str = "") -> str:
+    """blob 참조의 digest가 곧 sha256(image bytes)이므로 이미지를 다시 해시하지 않습니다."""
+    raw = "\n".join([parse_ref(image_ref), normalize_prompt(prompt), RESULT_CACHE_VERSION, PLANNER_MODEL, config])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _job_key(key: str) -> str:
+    return f"{JOB_KEY_PREFIX}{key}"
+
+
+def _reusable(job_id: str, celery_app) -> bool:
+    result = celery_app.AsyncResult(job_id)
+    if result.state in _RETRYABLE_STATES:
+        return False
+    if result.state == states.SUCCESS:
+        payload = result.result
+        return isinstance(payload, dict) and payload.get("status") == "success"
+    # PENDING / STARTED / PROGRESS: 진행 중인 job에 합류
+    return True
+
+
+def lookup_or_reserve(key: str, new_job_id: str, celery_app):
+    """
+    같은 키로 실행 중이거나 완료된 job이 있으면 그 job_id를 반환합니다.
+    없으면 new_job_id를 이 키의 담당 job으로 등록하고 None을 반환합니다.
+    (SET NX로 등록하므로 동시에 들어온 중복 요청도 하나의 job으로 합쳐집니다)
+    """
+    client = get_redis()
+    job_key = _job_key(key)
+    try:
+        if client.set(job_key, new_job_id, nx=True, ex=RESULT_CACHE_TTL_SEC):
+            return None
+
+        existing = client.get(job_key)
+        if existing is not None:
+            existing = existing.decode("utf-8")
+            if _reusable(existing, celery_app):
+                if client.zscore(LRU_KEY, key) is not None:
+                    client.zadd(LRU_KEY, {key: time.time()})
+                return existing
+
+        client.set(job_key, new_job_id, ex=RESULT_CACHE_TTL_SEC)
+    except redis.RedisError as e:
+        print(f"결과 캐시 조회 실패 (캐시 없이 진행): {e}")
+    return None
+
+
+def record_result(key: str, job_id: str, size: int, forget):
+    """완료된 결과를 크기와 함께 기록하고, 용량을 넘으면 오래된 결과부터 제거합니다."""
+    client = get_redis()
+    try:
+        if client.get(_job_key(key)) != job_id.encode("utf-8"):
+            return
+        client.expire(_job_key(key), RESULT_CACHE_TTL_SEC)
+        client.zadd(LRU_KEY, {key: time.time()})
+        client.hset(SIZE_KEY, key, size)
+        total = client.incrby(BYTES_KEY, size)
+
+        # TTL로 이미 사라진 항목도 함께 정리됩니다.
+        while total > RESULT_CACHE_MAX_BYTES:
+            oldest = client.zrange(LRU_KEY, 0, 0)
+            if not oldest:
+                break
+            evict_key = oldest[0].decode("utf-8")
+            evicted_job = client.get(_job_key(evict_key))
+            evicted_size = int(client.hget(SIZE_KEY, evict_key) or 0)
+            client.delete(_job_key(evict_key))
+            client.zrem(LRU_KEY, evict_key)
+            client.hdel(SIZE_KEY, evict_key)
+            total = client.incrby(BYTES_KEY, -evicted_size)
+            if evicted_job is not None:
+                forget(evicted_job.decode("utf-8"))
+    except redis.RedisError as e:
+        print(f"결과 캐시 기록 실패: {e}")
+
+
+def invalidate(key: str, job_id: str):
+    """실패한 job이 키를 계속 점유하지 않도록 등록을 해제합니다."""
+    client = get_redis()
+    try:
+        if client.get(_job_key(key)) == job_id.encode("utf-8"):
+            client.delete(_job_key(key))
+    except redis.RedisError as e:
+        print(f"결과 캐시 해제 실패: {e}")
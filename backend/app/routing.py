@@ -0,0 +1,44 @@
+import os
+
+# 프롬프트/도구 -> 큐 라우팅 규칙 (API와 워커가 같은 규칙을 공유)
+
+HEAVY_QUEUE = "heavy_tasks"
+LIGHT_QUEUE = "light_tasks"
+# 결과 반환 뒤에 실행하는 평가(CLIP + VQA self-feedback) 전용의 낮은 우선순위 큐
+EVAL_QUEUE = "eval_tasks"
+
+# dag: 계획은 light 큐의 별도 태스크가 세우고, 각 단계는 도구에 맞는 큐로 보냄
+# inline: 키워드로 고른 큐의 워커 하나가 계획부터 모든 단계까지 실행 (이전 방식)
+AGENT_EXECUTION_MODE = os.environ.get("AGENT_EXECUTION_MODE", "dag")
+PLANNER_QUEUE = LIGHT_QUEUE
+
+# 생성/변환 등 GPU 부하가 큰 키워드
+HEAVY_KEYWORDS = ["draw", "transform", "make", "generate", "change", "create", "spaceship"]
+
+# 계획의 각 도구가 실행되어야 하는 큐
+TOOL_QUEUES = {
+    "run_img2img": HEAVY_QUEUE,
+    "run_vqa": LIGHT_QUEUE,
+}
+
+
+def get_target_queue(prompt: str) -> str:
+    if any(k in prompt.lower() for k in HEAVY_KEYWORDS):
+        return HEAVY_QUEUE
+    return LIGHT_QUEUE
+
+
+def tool_queue(tool: str) -> str:
+    return TOOL_QUEUES.get(tool, LIGHT_QUEUE)
+
+
+def entry_queue(prompt: str) -> str:
+    """API가 run_agent_task를 넣을 큐. dag 모드에서는 계획만 세우므로 항상 light 큐입니다."""
+    if AGENT_EXECUTION_MODE == "dag":
+        return PLANNER_QUEUE
+    return get_target_queue(prompt)
+
+
+def predict_tool(prompt: str) -> str:
+    """계획이 나오기 전에, 프롬프트만 보고 가장 먼저 쓰일 도구를 추정합니다."""
+    return "run_img2img" if get_target_queue(prompt) == HEAVY_QUEUE else "run_vqa"
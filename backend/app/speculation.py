@@ -0,0 +1,106 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+# auto: 워커가 받은 큐와 추정 도구의 큐가 같을 때만 / always / off
+SPECULATIVE_WARMUP = os.environ.get("SPECULATIVE_WARMUP", "auto")
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="speculation")
+
+
+def _load_flux(image):
+    from .tools.sd_tool import load_pipeline
+    load_pipeline()
+
+
+def _load_vqa(image):
+    from .preload import SERVED_MODELS
+    if "vqa" in SERVED_MODELS:
+        # 모델 서버가 VQA를 맡고 있으면 이 워커에는 ViLT를 올리지 않고 연결만 확인
+        from .tools.model_client import get_model_client
+        get_model_client().stats()
+        return
+    from .tools.vqa_tool import load_vqa_pipeline
+    load_vqa_pipeline()
+
+
+# 도구별 예열 단계 (이름, 함수). 테스트에서는 CPU용 대체 함수로 바꿔 끼울 수 있습니다.
+WARMUP_HOOKS = {
+    "run_img2img": [("load", _load_flux)],
+    "run_vqa": [("load", _load_vqa)],
+}
+
+
+def _plan_tools(plan) -> set:
+    return {step.get("tool_name") for step in plan}
+
+
+def _decode_full(image_source) -> Image.Image:
+    return Image.open(image_source).convert("RGB")
+
+
+def plan_with_speculation(plan_fn, image_source, predicted_tool: str, enabled: bool = True,
+                          decode=_decode_full):
+    """
+    계획(plan_fn)을 백그라운드로 요청해 두고, 기다리는 동안 이미지 디코딩과
+    추정 도구의 예열을 진행합니다. 각 예열 단계 전에 계획이 도착했는지 확인해서,
+    계획에 추정 도구가 없으면 남은 단계를 취소합니다.
+
+    반환값: (plan_fn 결과, 원본 이미지, 타임라인 지표)
+    """
+    start = time.time()
+    timeline = {}
+
+    def timed_plan():
+        try:
+            return plan_fn()
+        finally:
+            timeline["plan_end"] = time.time() - start
+
+    future = _executor.submit(timed_plan)
+
+    # 1. 이미지 디코딩 (계획과 무관하게 항상 필요)
+    decode_start = time.time() - start
+    original_image = decode(image_source)
+    decode_end = time.time() - start
+    timeline["decode_sec"] = decode_end - decode_start
+
+    # 2. 추정 도구 예열
+    outcome = "disabled"
+    warm_end = decode_end
+    stages = WARMUP_HOOKS.get(predicted_tool, []) if enabled else []
+    if stages:
+        outcome = "hit"
+        for stage_name, stage_fn in stages:
+            if future.done() and future.exception() is None:
+                plan = future.result()[0]
+                if predicted_tool not in _plan_tools(plan):
+                    outcome = "cancelled"
+                    print(f"추측 실행 취소: 계획에 {predicted_tool}이(가) 없습니다. ({stage_name} 단계 생략)")
+                    break
+            stage_start = time.time() - start
+            stage_fn(original_image)
+            warm_end = time.time() - start
+            timeline[f"warmup_{stage_name}_sec"] = warm_end - stage_start
+
+    result = future.result()
+    plan = result[0]
+    if outcome == "hit" and predicted_tool not in _plan_tools(plan):
+        # 예열은 끝났지만 계획이 다른 도구를 선택한 경우
+        outcome = "miss"
+
+    plan_end = timeline.pop("plan_end")
+    overlap = max(0.0, min(plan_end, warm_end) - decode_start)
+
+    metrics = {
+        "timeline/plan_sec": plan_end,
+        "timeline/speculative_work_sec": warm_end - decode_start,
+        "timeline/overlap_sec": overlap,
+        "timeline/wait_after_speculation_sec": max(0.0, plan_end - warm_end),
+        "speculation/predicted_tool": predicted_tool,
+        "speculation/outcome": outcome,
+    }
+    metrics.update({f"timeline/{k}": v for k, v in timeline.items()})
+    return result, original_image, metrics
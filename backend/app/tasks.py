@@ -11,10 +11,10 @@ import json
 import base64
 import io
 import os
-import requests
 from PIL import Image
-from celery import Celery
-import wandb
+from celery import Celery, states, chain, group
+from celery.utils import uuid
+from celery.signals import task_postrun
 import torch
 import gc
 
@@ -26,8 +26,31 @@ except ImportError:
     """
 
 from .tools.vqa_tool import run_vqa
-from .tools.sd_tool import run_inpainting as run_img2img
-from .tools.evaluation_tool import calculate_clip_score
+from .tools.sd_tool import run_inpainting as run_img2img, prompt_cache_stats
+from .tools.evaluation_tool import calculate_clip_score, clip_cache_stats
+from .tools.image_ingest import decode_image, fit_for_tool
+from .tools.latent_preview import LatentPreviewer
+from .tiers import STANDARD, get_tier, tier_metrics
+from .progress import publish_progress, FINISHED_EVENT
+from .blob_store import get_blob_store, open_blob, parse_ref
+from .plan_cache import PlanCache
+from .planner_client import get_planner_client, PLANNER_MODEL
+from .routing import (
+    predict_tool, get_target_queue, tool_queue, TOOL_QUEUES, HEAVY_QUEUE, LIGHT_QUEUE, EVAL_QUEUE,
+    AGENT_EXECUTION_MODE
+)
+from .speculation import plan_with_speculation, SPECULATIVE_WARMUP
+from .telemetry import get_telemetry
+from .tracing import span, queue_wait_sec  # 발행/수신 시 trace 전파 시그널 등록
+from .resource_sampler import stage, task_resource_summary  # 워커 내 자원 샘플러 시그널 등록
+from .profiling import should_profile, profile_tools, region
+from .cancellation import (
+    JobCancelled, cancel_reason, check_cancelled, record_saved, cancelled_result, register_workflow
+)
+from .evaluation import ASYNC, PENDING, evaluation_mode, attach_evaluation
+from . import result_cache
+from . import admission  # 큐별 서비스 시간(EWMA) 갱신 시그널 등록
+from .preload import PRELOAD_METRICS, observe_job_vram  # 워커 부팅 시 모델 preload 시그널 등록
 
 broker_url = os.environ.get("CELERY_BROKER_URL", "redis://localhost:6379/0")
 backend_url = os.environ.get("CELERY_RESULT_BACKEND", "redis://localhost:6379/0")
@@ -37,7 +60,425 @@ celery_app = Celery(
     broker=broker_url,
     backend=backend_url
 )
-OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
+plan_cache = PlanCache(AGENT_PROMPT, PLANNER_MODEL)
+
+def request_plan(prompt: str) -> list:
+    """LLM에 계획 수립을 요청합니다. (캐시 미스일 때만 호출)"""
+    return get_planner_client().plan(AGENT_PROMPT, prompt)
+
+@task_postrun.connect
+def publish_finished_event(task_id=None, state=None, **kwargs):
+    # 결과가 백엔드에 저장된 뒤 호출되므로, 구독자는 이 이벤트를 받고 결과를 한 번만 읽으면 됩니다.
+    # (재시도나 self.replace로 넘긴 경우에는 아직 결과가 없으므로 보내지 않음)
+    if state not in states.READY_STATES:
+        return
+    publish_progress(task_id, FINISHED_EVENT, state=state)
+
+@task_postrun.connect
+def update_result_cache(task_id=None, kwargs=None, retval=None, state=None, **extra):
+    cache_key = (kwargs or {}).get("cache_key")
+    if not cache_key or state not in (states.SUCCESS, states.FAILURE):
+        return  # 재시도(RETRY) 중에는 등록을 유지해서 중복 요청이 계속 이 job에 합류하도록 함
+
+    if state == states.SUCCESS and isinstance(retval, dict) and retval.get("status") == "success":
+        # 결과 메타데이터 + 결과 이미지 blob 크기를 캐시 용량으로 계산
+        size = len(json.dumps(retval, default=str))
+        if retval.get("type") == "image":
+            size += get_blob_store().size(retval["data"])
+        result_cache.record_result(cache_key, task_id, size, forget=lambda job: celery_app.AsyncResult(job).forget())
+    else:
+        result_cache.invalidate(cache_key, task_id)
+
+PREVIOUS_STEP_RESULT = "[PREVIOUS_STEP_RESULT]"
+ORIGINAL_IMAGE = "[ORIGINAL_IMAGE]"
+
+def display_name(prompt: str) -> str:
+    return f"[{'HEAVY' if get_target_queue(prompt) == HEAVY_QUEUE else 'LIGHT'}] {prompt[:15]}..."
+
+def resolve_params(params: dict, last_result, original_image) -> dict:
+    for k, v in params.items():
+        if v == PREVIOUS_STEP_RESULT: params[k] = last_result
+        elif v == ORIGINAL_IMAGE: params[k] = original_image
+    return params
+
+def make_previewer(job_id: str, idx: int, enabled: bool):
+    """요청에서 preview를 켠 경우에만, 미리보기를 진행 이벤트(preview)로 WebSocket에 흘려보냅니다."""
+    if not enabled:
+        return None
+    return LatentPreviewer(lambda **fields: publish_progress(job_id, "preview", step=idx + 1, **fields))
+
+def run_tool(tool: str, params: dict, original_image, last_result, metrics: dict,
+             preview: LatentPreviewer = None, tier: str = None):
+    """계획의 단계 하나를 실행합니다. (inline 루프와 DAG 단계 태스크가 공유)"""
+    if tool == "run_img2img":
+        # 서비스 등급에 따라 step 수 / 해상도 버킷 / guidance가 달라짐
+        settings = get_tier(tier)
+        print(f"FLUX.2 이미지 생성 중... (tier={tier or STANDARD}, steps={settings['steps']})")
+        with span(f"step {tool}", tier=tier or STANDARD), stage(tool), region(f"step {tool}"):
+            image = fit_for_tool(params['image'], tool, metrics, flux_pixels=settings["pixels"])
+            result = run_img2img(image, None, params['prompt'], num_inference_steps=settings["steps"],
+                                 guidance_scale=settings["guidance"], preview=preview)
+        metrics.update(prompt_cache_stats())
+        return result
+
+    if tool == "run_vqa":
+        with span(f"step {tool}"), stage(tool), region(f"step {tool}"):
+            result = run_vqa(fit_for_tool(original_image, tool, metrics), params['question'])
+        metrics["evaluation/self_success_rate"] = 1
+        return result
+
+    print(f"알 수 없는 도구 '{tool}' - 건너뜀")
+    return last_result
+
+def record_peak_gpu_memory(metrics: dict):
+    if torch.cuda.is_available():
+        peak_memory = torch.cuda.max_memory_allocated() / (1024 ** 2)
+        metrics["system/peak_gpu_memory_mb"] = max(peak_memory, metrics.get("system/peak_gpu_memory_mb", 0))
+        print(f"GPU Peak Memory: {peak_memory:.2f} MB")
+        observe_job_vram(peak_memory)
+
+def evaluate_result(job_id: str, prompt: str, final_data, target_prompt: str, metrics: dict):
+    """이미지 생성 작업이었을 경우 CLIP Score와 VQA Self-Feedback을 측정합니다."""
+    if not (isinstance(final_data, Image.Image) and target_prompt):
+        return
+    start = time.time()
+    with span("evaluation"), stage("evaluation"):
+        _evaluate_image(job_id, prompt, final_data, target_prompt, metrics)
+    metrics["timer/evaluation"] = time.time() - start
+
+def defer_evaluation(mode: str, final_data, target_prompt: str, metrics: dict) -> bool:
+    """
+    async 모드의 이미지 결과면 평가를 미루고 True를 돌려줍니다.
+    (결과를 저장한 뒤 submit_evaluation으로 eval 큐에 넘김)
+    """
+    mode = evaluation_mode(mode)
+    metrics["evaluation/mode"] = mode
+    deferred = mode == ASYNC and isinstance(final_data, Image.Image) and bool(target_prompt)
+    if deferred:
+        metrics["evaluation/status"] = PENDING
+    return deferred
+
+def submit_evaluation(job_id: str, prompt: str, result_payload: dict, target_prompt: str, metrics: dict):
+    evaluate_task.apply_async(
+        (job_id, prompt, result_payload["data"], target_prompt),
+        {"finished_at": time.time(), "tier": metrics.get("tier/name")},
+        queue=EVAL_QUEUE,
+    )
+
+def _evaluate_image(job_id: str, prompt: str, final_data, target_prompt: str, metrics: dict):
+    clip_score = calculate_clip_score(final_data, target_prompt)
+    metrics["evaluation/clip_score"] = clip_score
+    metrics["evaluation/target_prompt"] = target_prompt
+    metrics.update(clip_cache_stats())
+    print(f"CLIP Score: {clip_score} (Prompt: {target_prompt})")
+
+    print("Self-Feedback: 에이전트가 생성한 이미지를 스스로 검수 중...")
+    verification_question = f"Does this image accurately represent the request: '{prompt}'? Answer yes or no with a brief reason."
+
+    self_feedback_ans = run_vqa(fit_for_tool(final_data, "run_vqa", metrics), verification_question)
+    metrics["evaluation/self_feedback_ans"] = self_feedback_ans
+    is_success = 1 if "yes" in self_feedback_ans.lower() else 0
+    metrics["evaluation/self_success_rate"] = is_success
+
+    print(f"Self-Feedback 결과: {self_feedback_ans}")
+    print(f"최종 판단: {'PASS' if is_success else 'FAIL'}")
+    publish_progress(
+        job_id, "evaluation_done",
+        clip_score=clip_score, self_success_rate=is_success
+    )
+
+def build_result_payload(final_data, metrics: dict) -> dict:
+    with span("result.serialize"), stage("serialize"):
+        return _build_result_payload(final_data, metrics)
+
+def _build_result_payload(final_data, metrics: dict) -> dict:
+    result_payload = {
+        "status": "success",
+        "metrics": metrics
+    }
+
+    if isinstance(final_data, Image.Image):
+        buf = io.BytesIO()
+        final_data.save(buf, format="JPEG")
+        # 결과 백엔드에는 base64 대신 blob 참조만 저장
+        result_ref = get_blob_store().put(buf.getbuffer())
+        result_payload["type"] = "image"
+        result_payload["data"] = result_ref
+        result_payload["url"] = f"/blobs/{parse_ref(result_ref)}"
+    else:
+        result_payload["type"] = "text"
+        result_payload["data"] = str(final_data)
+
+    return result_payload
+
+# ----------------------------------------------------
+# DAG 실행: 단계 간 결과는 blob 참조로 주고받습니다.
+# ----------------------------------------------------
+
+def load_image(image_ref: str, metrics: dict = None) -> Image.Image:
+    # blob digest가 곧 내용 해시이므로 디코딩 캐시 키로 그대로 사용
+    with span("image.decode", image_ref=image_ref):
+        return decode_image(open_blob(image_ref), digest=parse_ref(image_ref), metrics=metrics)
+
+def encode_step_data(result) -> dict:
+    if isinstance(result, Image.Image):
+        # 중간 결과는 다음 단계 입력이므로 손실 없는 PNG로 저장
+        buf = io.BytesIO()
+        result.save(buf, format="PNG")
+        return {"type": "image", "data": get_blob_store().put(buf.getbuffer())}
+    return {"type": "text", "data": None if result is None else str(result)}
+
+def decode_step_data(step_result: dict, metrics: dict = None):
+    if step_result.get("type") == "image":
+        return load_image(step_result["data"], metrics)
+    return step_result.get("data")
+
+def collect_step_results(previous) -> dict:
+    """chain/group이 넘겨준 (중첩된) 이전 단계 결과들을 {단계 번호: 결과}로 모읍니다."""
+    results = {}
+    stack = [previous]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            results[item["step"]] = item
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
+    return results
+
+def plan_levels(plan: list) -> list:
+    """
+    [PREVIOUS_STEP_RESULT]를 쓰는 단계는 바로 앞 단계 다음 레벨에, 나머지는 첫 레벨에 둡니다.
+    같은 레벨의 단계들은 서로 독립이라 병렬로 실행됩니다.
+    """
+    levels = []
+    level_of = {}
+    for idx, step in enumerate(plan):
+        depends = idx > 0 and PREVIOUS_STEP_RESULT in step.get('parameters', {}).values()
+        level = level_of[idx - 1] + 1 if depends else 0
+        level_of[idx] = level
+        if level == len(levels):
+            levels.append([])
+        levels[level].append(idx)
+    return levels
+
+def build_workflow(job_id: str, prompt: str, image_ref: str, plan: list, metrics: dict,
+                   task_start_time: float, cache_key: str = None, profile: bool = False,
+                   preview: bool = False, tier: str = None, evaluation: str = None):
+    stages = []
+    # 취소 시 revoke할 단계 태스크 {task_id: 단계 번호}
+    # 단독 단계만: group 안의 단계를 revoke하면 chord가 다음 태스크(finalize일 수 있음)를 실패로 기록하므로
+    # 병렬 단계는 시작할 때 취소 플래그만 확인
+    revocable = {}
+    for level, indices in enumerate(plan_levels(plan)):
+        signatures = []
+        for idx in indices:
+            # 첫 레벨은 이전 결과가 없으므로 빈 리스트를 직접 넘김 (이후는 chain이 앞 결과를 넣어줌)
+            args = ([],) if level == 0 else ()
+            signatures.append(
+                run_step_task.s(*args, job_id, idx, plan[idx], image_ref, profile=profile, preview=preview,
+                               tier=tier)
+                .set(queue=tool_queue(plan[idx]['tool_name']))
+            )
+        if len(signatures) == 1:
+            step_id = uuid()
+            revocable[step_id] = indices[0]
+            stages.append(signatures[0].set(task_id=step_id))
+        else:
+            stages.append(group(signatures))
+
+    # 동기 평가(CLIP + VQA)는 모델이 올라가 있는 heavy 워커에서 수행
+    # (비동기 평가면 finalize는 결과 인코딩만 하므로 light 워커로 충분)
+    has_image_step = any(TOOL_QUEUES.get(step['tool_name']) == HEAVY_QUEUE for step in plan)
+    evaluate_on_heavy = has_image_step and evaluation_mode(evaluation) != ASYNC
+    args = () if stages else ([],)
+    finalize = finalize_agent_task.s(
+        *args, job_id, prompt, metrics, task_start_time, cache_key=cache_key, evaluation=evaluation
+    ).set(queue=HEAVY_QUEUE if evaluate_on_heavy else LIGHT_QUEUE)
+
+    register_workflow(job_id, revocable, [step['tool_name'] for step in plan], finalize)
+    return chain(*stages, finalize)
+
+def plan_and_dispatch(task, prompt: str, image_ref: str, cache_key: str = None, profile: bool = False,
+                      preview: bool = False, tier: dict = None, evaluation: str = None):
+    """계획만 세운 뒤, 각 단계를 도구별 큐의 태스크로 바꿔 실행합니다. (이 태스크 id가 최종 결과를 받음)"""
+    task_start_time = time.time()
+    job_id = task.request.id
+    publish_progress(job_id, "started")
+
+    # 큐에서 기다리는 동안 마감이 지났거나 취소된 job은 계획도 세우지 않음
+    reason = cancel_reason(job_id)
+    if reason is not None:
+        return cancelled_result(reason, record_saved(reason, [predict_tool(prompt)]))
+
+    try:
+        print(f"LLM: '{prompt}'에 대한 계획 수립 중...")
+        metrics = {"timer/queue_wait": queue_wait_sec(job_id)}
+
+        # inline 경로와 같이 계획을 기다리는 동안 디코딩(같은 프로세스의 단계가 재사용하는 디코딩 캐시)과
+        # 추정 도구 예열을 겹쳐서 진행 (auto: 추정 도구가 이 워커의 큐에서 실행될 때만 예열)
+        predicted_tool = predict_tool(prompt)
+        current_queue = (task.request.delivery_info or {}).get("routing_key")
+        speculate = SPECULATIVE_WARMUP == "always" or (
+            SPECULATIVE_WARMUP == "auto" and TOOL_QUEUES.get(predicted_tool) == current_queue
+        )
+        with span("plan", speculative=speculate) as plan_span, stage("plan"):
+            (plan, plan_cache_hit), _, timeline = plan_with_speculation(
+                lambda: plan_cache.get_or_plan(prompt, request_plan),
+                open_blob(image_ref), predicted_tool, enabled=speculate,
+                decode=lambda source: decode_image(source, digest=parse_ref(image_ref), metrics=metrics)
+            )
+            plan_span.set(cache_hit=plan_cache_hit, steps=len(plan), **timeline)
+
+        metrics.update(timeline)
+        metrics["plan_cache/hit"] = int(plan_cache_hit)
+        metrics.update(plan_cache.stats())
+        metrics.update(get_planner_client().stats())
+        metrics["timer/llm_planning"] = metrics["timeline/plan_sec"]
+        metrics.update(tier_metrics(**tier))
+
+        print(f"📋 계획: {json.dumps(plan, indent=2)}")
+        publish_progress(job_id, "plan_ready", steps=[step.get('tool_name') for step in plan])
+
+        reason = cancel_reason(job_id)
+        if reason is not None:
+            return cancelled_result(reason, record_saved(reason, [s['tool_name'] for s in plan]), metrics)
+
+        # 프로파일링 여부는 job 단위로 한 번만 정하고 모든 단계가 따름
+        workflow = build_workflow(job_id, prompt, image_ref, plan, metrics, task_start_time, cache_key,
+                                  profile=should_profile(profile), preview=preview, tier=tier["name"],
+                                  evaluation=evaluation)
+    except Exception as e:
+        print(f"에러 발생: {e}")
+        return {"status": "error", "error": str(e)}
+
+    raise task.replace(workflow)
+
+@celery_app.task(bind=True)
+def run_step_task(self, previous, job_id: str, idx: int, step: dict, image_ref: str, profile: bool = False,
+                  preview: bool = False, tier: str = None):
+    results = collect_step_results(previous)
+    done = [results[i] for i in sorted(results)]
+    tool = step['tool_name']
+
+    # 취소/마감된 job의 단계는 실행하지 않고 절약한 GPU 시간만 기록해서 finalize로 넘김
+    reason = cancel_reason(job_id)
+    if reason is not None:
+        saved = record_saved(reason, [tool])
+        return done + [{"step": idx, "tool": tool, "status": "cancelled", "reason": reason,
+                        "metrics": {f"cancel/gpu_sec_saved_step_{idx}": saved}}]
+    if any(r.get("status") in ("error", "cancelled") for r in done):
+        return done  # 앞 단계가 실패했으면 실행하지 않고 그대로 전달
+
+    # 단계별 브로커 대기 시간 (finalize에서 step_{idx} 접두어로 합쳐짐)
+    metrics = {f"timer/queue_wait_step_{idx}": queue_wait_sec(self.request.id)}
+    start_t = time.time()
+    print(f"[Step {idx+1}] {tool} 실행 중...")
+    publish_progress(job_id, "step_started", step=idx + 1, tool=tool)
+
+    if torch.cuda.is_available():
+        torch.cuda.reset_peak_memory_stats()
+
+    try:
+        original_image = load_image(image_ref, metrics)
+        last_result = decode_step_data(results[idx - 1], metrics) if idx - 1 in results else None
+        params = resolve_params(dict(step['parameters']), last_result, original_image)
+
+        previewer = make_previewer(job_id, idx, preview and tool == "run_img2img")
+        with profile_tools(job_id, profile, metrics, label=f"step_{idx}"):
+            result = run_tool(tool, params, original_image, last_result, metrics, previewer, tier)
+        if previewer is not None:
+            metrics.update(previewer.stats(prefix=f"preview/step_{idx}/"))
+        step_result = {"step": idx, "tool": tool, "status": "success", **encode_step_data(result)}
+        if tool == "run_img2img":
+            step_result["target_prompt"] = params['prompt']
+    except JobCancelled as e:
+        # diffusion 도중 취소: 남은 step 비율만큼만 절약으로 계산
+        metrics[f"cancel/gpu_sec_saved_step_{idx}"] = record_saved(e.reason, [tool], e.progress)
+        step_result = {"step": idx, "tool": tool, "status": "cancelled", "reason": e.reason}
+    except Exception as e:
+        print(f"에러 발생 (Step {idx+1}): {e}")
+        step_result = {"step": idx, "tool": tool, "status": "error", "error": str(e)}
+
+    step_duration = time.time() - start_t
+    metrics[f"timer/{tool}"] = step_duration
+    record_peak_gpu_memory(metrics)
+    metrics.update(task_resource_summary(self.request.id, prefix=f"resource/step_{idx}/"))
+    step_result["metrics"] = metrics
+    publish_progress(job_id, "step_finished", step=idx + 1, tool=tool, duration=step_duration)
+
+    return done + [step_result]
+
+@celery_app.task(bind=True)
+def finalize_agent_task(self, previous, job_id: str, prompt: str, metrics: dict,
+                        task_start_time: float, cache_key: str = None, evaluation: str = None):
+    # cache_key는 postrun 시그널(update_result_cache)에서 사용
+    telemetry = get_telemetry()
+    telemetry.start_run(job_id, display_name(prompt))
+
+    try:
+        results = collect_step_results(previous)
+        steps = [results[i] for i in sorted(results)]
+        cancelled = [r for r in steps if r.get("status") == "cancelled"]
+        if cancelled:
+            saved = sum(value for r in steps for key, value in r.get("metrics", {}).items()
+                        if key.startswith("cancel/gpu_sec_saved_step_"))
+            telemetry.finish(job_id)
+            return cancelled_result(cancelled[0]["reason"], saved, metrics)
+        errors = [r["error"] for r in steps if r.get("status") == "error"]
+        if errors:
+            # 단계 태스크가 이미 실패를 기록했으므로 그대로 job 결과로 전달
+            telemetry.finish(job_id)
+            return {"status": "error", "error": errors[0]}
+
+        target_prompt = ""
+        for r in steps:
+            for key, value in r["metrics"].items():
+                if key == "system/peak_gpu_memory_mb":
+                    value = max(value, metrics.get(key, 0))
+                metrics[key] = value
+            if r.get("target_prompt"):
+                target_prompt = r["target_prompt"]
+
+        # inline 경로와 같이 단계별 생성 이미지를 텔레메트리에 남김 (마지막 단계는 아래에서 재사용)
+        decoded = {}
+        for r in steps:
+            if r.get("tool") == "run_img2img" and r.get("type") == "image":
+                decoded[r["step"]] = decode_step_data(r)
+                telemetry.log(job_id, {f"step_{r['step']}_result": decoded[r["step"]]})
+
+        final_data = None
+        if steps:
+            final_data = decoded.get(steps[-1]["step"])
+            if final_data is None:
+                final_data = decode_step_data(steps[-1])
+
+        metrics["timer/queue_wait_finalize"] = queue_wait_sec(self.request.id)
+        metrics["timer/total_latency"] = time.time() - task_start_time
+        metrics.update(PRELOAD_METRICS)
+        check_cancelled(job_id)
+        deferred = defer_evaluation(evaluation, final_data, target_prompt, metrics)
+        if not deferred:
+            evaluate_result(job_id, prompt, final_data, target_prompt, metrics)
+        metrics.update(task_resource_summary(self.request.id, prefix="resource/finalize/"))
+
+        metrics["timer/telemetry"] = telemetry.hot_path_sec(job_id)
+        metrics.update(telemetry.stats())
+        telemetry.log(job_id, metrics)
+        telemetry.finish(job_id)
+
+        result_payload = build_result_payload(final_data, metrics)
+        if deferred:
+            submit_evaluation(job_id, prompt, result_payload, target_prompt, metrics)
+        return result_payload
+
+    except JobCancelled as e:
+        # 모든 단계가 끝난 뒤의 취소: 평가(CLIP/VQA)만 건너뜀
+        telemetry.finish(job_id)
+        return cancelled_result(e.reason, 0.0, metrics)
+    except Exception as e:
+        print(f"에러 발생: {e}")
+        telemetry.finish(job_id)
+        return {"status": "error", "error": str(e)}
 
 @celery_app.task(
     bind=True,
@@ -45,45 +486,70 @@ OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
     default_retry_delay=20,
     autoretry_for=(RuntimeError,)
 )
-def run_agent_task(self, prompt: str, image_data: str):
+def run_agent_task(self, prompt: str, image_data: str = None, image_ref: str = None, cache_key: str = None,
+                   profile: bool = False, preview: bool = False, tier: dict = None, evaluation: str = None):
+    # tier: API가 확정한 서비스 등급 {"name", "requested", "pressure"} (없으면 standard)
+    # evaluation: sync | async (없으면 EVALUATION_MODE)
+    tier = tier or {"name": STANDARD}
+    if AGENT_EXECUTION_MODE == "dag" and image_ref:
+        return plan_and_dispatch(self, prompt, image_ref, cache_key, profile, preview, tier, evaluation)
+
     task_start_time = time.time()
+    job_id = self.request.id
 
-    metrics = {}
+    metrics = {"timer/queue_wait": queue_wait_sec(job_id)}
+    metrics.update(tier_metrics(**tier))
+    publish_progress(job_id, "started")
 
     # GPU 메모리 측정 초기화 (이전 작업의 기록 삭제)
     if torch.cuda.is_available():
         torch.cuda.reset_peak_memory_stats()
 
-    display_name = f"[{'HEAVY' if 'draw' in prompt or 'transform' in prompt else 'LIGHT'}] {prompt[:15]}..."
-    wandb.init(
-        project="ai_agent_project", 
-        name=display_name, 
-        reinit=True)
+    telemetry = get_telemetry()
+    telemetry.start_run(job_id, display_name(prompt))
+    # 취소 시 GPU 절약량 계산용: 아직 실행하지 않은 도구 (계획 전에는 추정 도구)
+    remaining = [predict_tool(prompt)]
     
     try:
-        image_bytes = base64.b64decode(image_data)
-        original_image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+        check_cancelled(job_id)
+        image_digest = None
+        if image_ref:
+            # 같은 호스트의 파일 백엔드라면 경로에서 바로 디코딩 (메시지 경유 복사 없음)
+            image_source = open_blob(image_ref)
+            image_digest = parse_ref(image_ref)
+        else:
+            # 이전 클라이언트(base64 직접 전송) 호환 경로
+            image_source = io.BytesIO(base64.b64decode(image_data))
         
         print(f"LLM: '{prompt}'에 대한 계획 수립 중...")
 
-        llm_start = time.time()
-        headers = {"Authorization": f"Bearer {OPENAI_API_KEY}", "Content-Type": "application/json"}
-        payload = {
-            "model": "gpt-4o",
-            "messages": [
-                {"role": "system", "content": AGENT_PROMPT},
-                {"role": "user", "content": prompt}
-            ],
-            "response_format": {"type": "json_object"}
-        }
-
-        response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=payload)
-        plan = json.loads(response.json()['choices'][0]['message']['content']).get('plan', [])
+        # 계획을 기다리는 동안 이미지 디코딩과 추정 도구 예열을 겹쳐서 진행
+        predicted_tool = predict_tool(prompt)
+        current_queue = (self.request.delivery_info or {}).get("routing_key")
+        speculate = SPECULATIVE_WARMUP == "always" or (
+            SPECULATIVE_WARMUP == "auto" and TOOL_QUEUES.get(predicted_tool) == current_queue
+        )
+
+        # 계획/디코딩/예열은 별도 스레드에서 겹쳐 돌기 때문에 묶어서 하나의 span으로 기록
+        with span("plan", speculative=speculate) as plan_span, stage("plan"):
+            (plan, plan_cache_hit), original_image, timeline = plan_with_speculation(
+                lambda: plan_cache.get_or_plan(prompt, request_plan),
+                image_source, predicted_tool, enabled=speculate,
+                decode=lambda source: decode_image(source, digest=image_digest, metrics=metrics)
+            )
+            plan_span.set(cache_hit=plan_cache_hit, steps=len(plan), **timeline)
+        metrics.update(timeline)
+        metrics["plan_cache/hit"] = int(plan_cache_hit)
+        metrics.update(plan_cache.stats())
+        metrics.update(get_planner_client().stats())
         
-        llm_duration = time.time() - llm_start
-        wandb.log({"timer/llm_planning": llm_duration}) 
+        llm_duration = metrics["timeline/plan_sec"]
+        metrics["timer/llm_planning"] = llm_duration
+        telemetry.log(job_id, {"timer/llm_planning": llm_duration}) 
         
         print(f"📋 계획: {json.dumps(plan, indent=2)}")
+        publish_progress(job_id, "plan_ready", steps=[step.get('tool_name') for step in plan])
+        remaining = [step['tool_name'] for step in plan]
 
         last_result = None
         final_data = None
@@ -91,84 +557,90 @@ def run_agent_task(self, prompt: str, image_data: str):
         # CLIP 평가를 위해 목표 프롬프트를 저장할 변수
         target_prompt = "" 
         
-        for idx, step in enumerate(plan):
-            tool = step['tool_name']
-            params = step['parameters']
-            print(f"[Step {idx+1}] {tool} 실행 중...")
-
-            for k, v in params.items():
-                if v == "[PREVIOUS_STEP_RESULT]": params[k] = last_result
-                elif v == "[ORIGINAL_IMAGE]": params[k] = original_image
-
-            # --- 도구 분기 처리 ---
-            start_t = time.time()
+        # 도구 호출 구간만 프로파일링 (꺼져 있으면 nullcontext)
+        with profile_tools(job_id, should_profile(profile), metrics):
+            for idx, step in enumerate(plan):
+                check_cancelled(job_id)
+                tool = step['tool_name']
+                params = resolve_params(step['parameters'], last_result, original_image)
+                print(f"[Step {idx+1}] {tool} 실행 중...")
 
-            if tool == "run_img2img": 
-                print("FLUX.2 이미지 생성 중...")
-                target_prompt = params['prompt']
+                # --- 도구 분기 처리 ---
+                start_t = time.time()
+                publish_progress(job_id, "step_started", step=idx + 1, tool=tool)
 
-                last_result = run_img2img(params['image'], None, params['prompt']) 
-
-                final_data = last_result
-                if isinstance(last_result, Image.Image):
-                    wandb.log({f"step_{idx}_result": wandb.Image(last_result)})
-
-            elif tool == "run_vqa":
-                last_result = run_vqa(original_image, params['question'])
+                if tool == "run_img2img":
+                    target_prompt = params['prompt']
+                previewer = make_previewer(job_id, idx, preview and tool == "run_img2img")
+                last_result = run_tool(tool, params, original_image, last_result, metrics, previewer, tier["name"])
+                if previewer is not None:
+                    metrics.update(previewer.stats(prefix=f"preview/step_{idx}/"))
                 final_data = last_result
-                metrics["evaluation/self_success_rate"] = 1
+                if tool == "run_img2img" and isinstance(last_result, Image.Image):
+                    telemetry.log(job_id, {f"step_{idx}_result": last_result})
 
-            wandb.log({f"timer/{tool}": time.time() - start_t})
+                step_duration = time.time() - start_t
+                telemetry.log(job_id, {f"timer/{tool}": step_duration})
+                publish_progress(job_id, "step_finished", step=idx + 1, tool=tool, duration=step_duration)
+                remaining.pop(0)
 
         metrics["timer/total_latency"] = time.time() - task_start_time
+        metrics.update(PRELOAD_METRICS)
 
         # 1. GPU Peak Memory 측정 (MB)
-        if torch.cuda.is_available():
-            peak_memory = torch.cuda.max_memory_allocated() / (1024 ** 2)
-            metrics["system/peak_gpu_memory_mb"] = peak_memory
-            print(f"GPU Peak Memory: {peak_memory:.2f} MB")
-
-        # 2. CLIP Score 측정 (이미지 생성 작업이었을 경우)
-        if isinstance(final_data, Image.Image) and target_prompt:
-            clip_score = calculate_clip_score(final_data, target_prompt)
-            metrics["evaluation/clip_score"] = clip_score
-            metrics["evaluation/target_prompt"] = target_prompt
-            print(f"CLIP Score: {clip_score} (Prompt: {target_prompt})")
-
-            print("Self-Feedback: 에이전트가 생성한 이미지를 스스로 검수 중...")
-            verification_question = f"Does this image accurately represent the request: '{prompt}'? Answer yes or no with a brief reason."
-
-            self_feedback_ans = run_vqa(final_data, verification_question)
-            metrics["evaluation/self_feedback_ans"] = self_feedback_ans
-            is_success = 1 if "yes" in self_feedback_ans.lower() else 0
-            metrics["evaluation/self_success_rate"] = is_success
+        record_peak_gpu_memory(metrics)
 
-            print(f"Self-Feedback 결과: {self_feedback_ans}")
-            print(f"최종 판단: {'PASS' if is_success else 'FAIL'}")
+        # 2. CLIP Score 측정 (이미지 생성 작업이었을 경우, async 모드면 결과 반환 뒤 eval 큐에서)
+        check_cancelled(job_id)
+        deferred = defer_evaluation(evaluation, final_data, target_prompt, metrics)
+        if not deferred:
+            evaluate_result(job_id, prompt, final_data, target_prompt, metrics)
 
+        # 3. 작업 동안 워커 자원 사용 요약 (샘플러 링 버퍼 기준)
+        metrics.update(task_resource_summary(job_id))
         
         # 지표 전송
-        wandb.log(metrics)
-        wandb.finish()
+        metrics["timer/telemetry"] = telemetry.hot_path_sec(job_id)
+        metrics.update(telemetry.stats())
+        telemetry.log(job_id, metrics)
+        telemetry.finish(job_id)
         
         # 최종 결과 반환
-        result_payload = {
-            "status": "success",
-            "metrics": metrics 
-        }
-
-        if isinstance(final_data, Image.Image):
-            buf = io.BytesIO()
-            final_data.save(buf, format="JPEG")
-            result_payload["type"] = "image"
-            result_payload["data"] = base64.b64encode(buf.getvalue()).decode()
-        else:
-            result_payload["type"] = "text"
-            result_payload["data"] = str(final_data)
-            
+        result_payload = build_result_payload(final_data, metrics)
+        if deferred:
+            submit_evaluation(job_id, prompt, result_payload, target_prompt, metrics)
         return result_payload
 
+    except JobCancelled as e:
+        telemetry.finish(job_id)
+        return cancelled_result(e.reason, record_saved(e.reason, remaining, e.progress), metrics)
     except Exception as e:
         print(f"에러 발생: {e}")
-        wandb.finish()
-        return {"status": "error", "error": str(e)}
\ No newline at end of file
+        telemetry.finish(job_id)
+        return {"status": "error", "error": str(e)}
+
+@celery_app.task(bind=True, ignore_result=True)
+def evaluate_task(self, job_id: str, prompt: str, result_ref: str, target_prompt: str,
+                  finished_at: float = None, tier: str = None):
+    """
+    결과를 돌려준 뒤 eval 큐에서 실행하는 평가. 지표는 job 평가 기록에 붙고 WebSocket으로 전달됩니다.
+    같은 워커에서 동시에 실행되는 평가들은 VQA/CLIP 배처(또는 모델 서버)에서 함께 배치로 처리됩니다.
+    """
+    metrics = {"evaluation/mode": ASYNC, "evaluation/queue_wait_sec": queue_wait_sec(self.request.id)}
+    if tier:
+        metrics["tier/name"] = tier
+    start = time.time()
+    try:
+        image = load_image(result_ref, metrics)
+        evaluate_result(job_id, prompt, image, target_prompt, metrics)
+        metrics["evaluation/status"] = "done"
+    except Exception as e:
+        print(f"평가 실패 ({job_id}): {e}")
+        metrics["evaluation/status"] = "error"
+        metrics["evaluation/error"] = str(e)
+    # 동기 모드였다면 heavy 워커가 결과 반환 전에 썼을 시간 (디코딩 포함)
+    evaluation_sec = time.time() - start
+    metrics["evaluation/heavy_sec_freed"] = evaluation_sec
+    if finished_at is not None:
+        metrics["evaluation/delay_sec"] = time.time() - finished_at
+    attach_evaluation(job_id, metrics, evaluation_sec)
@@ -0,0 +1,221 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+
+from PIL import Image
+
+# 태스크 실행 경로에서는 기록을 큐에 넣기만 하고, 실제 전송은 백그라운드 스레드가 담당합니다.
+TELEMETRY_BACKEND = os.environ.get("TELEMETRY_BACKEND", "wandb")  # wandb | jsonl | parquet | off
+TELEMETRY_QUEUE_SIZE = int(os.environ.get("TELEMETRY_QUEUE_SIZE", "1024"))
+TELEMETRY_BATCH_SIZE = int(os.environ.get("TELEMETRY_BATCH_SIZE", "64"))
+TELEMETRY_FLUSH_SEC = float(os.environ.get("TELEMETRY_FLUSH_SEC", "2"))
+TELEMETRY_OVERFLOW = os.environ.get("TELEMETRY_OVERFLOW", "spill")  # spill | drop
+TELEMETRY_DIR = os.environ.get(
+    "TELEMETRY_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "telemetry")
+)
+WANDB_PROJECT = os.environ.get("WANDB_PROJECT", "ai_agent_project")
+
+
+def _scalars(data: dict) -> dict:
+    """이미지 등 직렬화할 수 없는 값은 제외합니다."""
+    return {k: v for k, v in data.items() if not isinstance(v, Image.Image)}
+
+
+class JsonlSink:
+    def __init__(self, directory: str = TELEMETRY_DIR):
+        self.directory = directory
+        os.makedirs(os.path.join(directory, "images"), exist_ok=True)
+        self.path = os.path.join(directory, f"telemetry_{os.getpid()}.jsonl")
+
+    def _prepare(self, record: dict) -> dict:
+        data = dict(record.get("data") or {})
+        for key, value in list(data.items()):
+            if isinstance(value, Image.Image):
+                image_path = os.path.join(self.directory, "images", f"{record['run']}_{key}.jpg")
+                value.save(image_path, format="JPEG")
+                data[key] = image_path
+        return {**record, "data": data}
+
+    def export(self, records: list):
+        with open(self.path, "a") as f:
+            for record in records:
+                f.write(json.dumps(self._prepare(record), default=str) + "\n")
+
+    def close(self):
+        pass
+
+
+class ParquetSink(JsonlSink):
+    def export(self, records: list):
+        import pandas as pd
+
+        rows = [{"kind": r["kind"], "run": r["run"], "ts": r["ts"], **_scalars(r.get("data") or {})}
+                for r in records]
+        path = os.path.join(self.directory, f"telemetry_{os.getpid()}_{time.time_ns()}.parquet")
+        pd.DataFrame(rows).to_parquet(path, index=False)
+
+
+class WandbSink:
+    """
+    프로세스당 wandb Run 하나를 길게 유지하고, job별 기록은 job_id 열을 붙인 행으로 남깁니다.
+    (job마다 wandb.init(reinit=True)를 하면 스레드 풀에서 동시에 도는 job들이 run을 서로 덮어씀)
+    """
+
+    def __init__(self, project: str = WANDB_PROJECT):
+        import wandb
+        self.wandb = wandb
+        self.project = project
+        self.run = None
+        self.names = {}
+
+    def _get_run(self):
+        if self.run is None:
+            self.run = self.wandb.init(project=self.project, name=f"worker-{os.getpid()}", job_type="worker")
+        return self.run
+
+    def export(self, records: list):
+        for record in records:
+            run_id = record["run"]
+            kind = record["kind"]
+            if kind == "start":
+                self.names[run_id] = record.get("name")
+            elif kind == "log":
+                data = {k: self.wandb.Image(v) if isinstance(v, Image.Image) else v
+                        for k, v in record["data"].items()}
+                self._get_run().log({"job_id": run_id, "job_name": self.names.get(run_id), **data})
+            elif kind == "finish":
+                self.names.pop(run_id, None)
+
+    def close(self):
+        if self.run is not None:
+            self.run.finish()
+            self.run = None
+        self.names.clear()
+
+
+class BackgroundExporter:
+    """
+    크기가 제한된 큐와 이를 비우는 백그라운드 스레드.
+    큐가 가득 차면 호출자를 막지 않고 디스크로 흘려보내거나(spill) 버립니다(drop).
+    """
+
+    def __init__(self, sink, maxsize: int = TELEMETRY_QUEUE_SIZE, batch_size: int = TELEMETRY_BATCH_SIZE,
+                 flush_sec: float = TELEMETRY_FLUSH_SEC, overflow: str = TELEMETRY_OVERFLOW,
+                 spill_dir: str = TELEMETRY_DIR):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_sec = flush_sec
+        self.overflow = overflow
+        self.spill_path = os.path.join(spill_dir, f"spill_{os.getpid()}.jsonl")
+        self.dropped = 0
+        self.spilled = 0
+        self.exported = 0
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="telemetry-exporter", daemon=True)
+        self._thread.start()
+
+    def emit(self, record: dict):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            if self.overflow == "spill":
+                os.makedirs(os.path.dirname(self.spill_path), exist_ok=True)
+                with open(self.spill_path, "a") as f:
+                    f.write(json.dumps({**record, "data": _scalars(record.get("data") or {})}, default=str) + "\n")
+                self.spilled += 1
+            else:
+                self.dropped += 1
+
+    def _drain(self, block: bool) -> list:
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=self.flush_sec) if block else self._queue.get_nowait())
+            while len(batch) < self.batch_size:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _export(self, batch: list):
+        if not batch:
+            return
+        try:
+            self.sink.export(batch)
+            self.exported += len(batch)
+        except Exception as e:
+            self.dropped += len(batch)
+            print(f"텔레메트리 전송 실패 ({len(batch)}건 유실): {e}")
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self._export(self._drain(block=True))
+
+    def close(self, timeout: float = 10):
+        self._stop.set()
+        self._thread.join(timeout)
+        deadline = time.time() + timeout
+        while not self._queue.empty() and time.time() < deadline:
+            self._export(self._drain(block=False))
+        self.sink.close()
+
+
+class Telemetry:
+    """태스크 코드가 사용하는 인터페이스. 각 호출은 큐에 넣는 비용만 듭니다."""
+
+    def __init__(self, backend: str = TELEMETRY_BACKEND):
+        self.backend = backend
+        self.exporter = None
+        self._hot_path = {}
+        if backend == "off":
+            return
+
+        sink = {"wandb": WandbSink, "jsonl": JsonlSink, "parquet": ParquetSink}[backend]()
+        self.exporter = BackgroundExporter(sink)
+        atexit.register(self.exporter.close)
+
+    def _emit(self, kind: str, run_id: str, **fields):
+        if self.exporter is None:
+            return
+        start = time.perf_counter()
+        self.exporter.emit({"kind": kind, "run": run_id, "ts": time.time(), **fields})
+        self._hot_path[run_id] = self._hot_path.get(run_id, 0.0) + time.perf_counter() - start
+
+    def start_run(self, run_id: str, name: str):
+        self._hot_path[run_id] = 0.0
+        self._emit("start", run_id, name=name)
+
+    def log(self, run_id: str, data: dict):
+        # 태스크가 이후에 dict를 계속 수정하므로 복사본을 넘깁니다.
+        self._emit("log", run_id, data=dict(data))
+
+    def finish(self, run_id: str):
+        self._emit("finish", run_id)
+        self._hot_path.pop(run_id, None)
+
+    def hot_path_sec(self, run_id: str) -> float:
+        """이 run에서 태스크 스레드가 텔레메트리에 쓴 시간"""
+        return self._hot_path.get(run_id, 0.0)
+
+    def stats(self) -> dict:
+        if self.exporter is None:
+            return {}
+        return {
+            "telemetry/queue_depth": self.exporter._queue.qsize(),
+            "telemetry/dropped": self.exporter.dropped,
+            "telemetry/spilled": self.exporter.spilled,
+        }
+
+
+_TELEMETRY = None
+
+
+def get_telemetry() -> Telemetry:
+    global _TELEMETRY
+    if _TELEMETRY is None:
+        _TELEMETRY = Telemetry()
+    return _TELEMETRY
@@ -0,0 +1,84 @@
+import os
+
+from .tools.image_ingest import INGEST_FLUX_PIXELS
+
+# 요청별 서비스 등급: 이미지 생성의 step 수 / 해상도 버킷(픽셀 수) / guidance를 묶어서 고름
+# - draft: 빠른 미리보기 품질, standard: 기존 기본값, high: step을 늘린 고품질
+# - adaptive: API가 요청을 받을 때 큐 압력(예상 대기 / SLO)을 보고 위 셋 중 하나로 확정
+#             (부하가 없을 때 TIER_ADAPTIVE_MAX, 압력이 올라가면 낮추기만 함)
+# 해상도는 업로드 디코딩 버킷(INGEST_FLUX_PIXELS)보다 키우지 않음 (확대는 하지 않음)
+DRAFT = "draft"
+STANDARD = "standard"
+HIGH = "high"
+ADAPTIVE = "adaptive"
+
+TIERS = {
+    DRAFT: {
+        "steps": int(os.environ.get("TIER_DRAFT_STEPS", "4")),
+        "pixels": int(os.environ.get("TIER_DRAFT_PIXELS", str(512 * 512))),
+        "guidance": float(os.environ.get("TIER_DRAFT_GUIDANCE", "3.5")),
+    },
+    STANDARD: {
+        "steps": int(os.environ.get("TIER_STANDARD_STEPS", "8")),
+        "pixels": int(os.environ.get("TIER_STANDARD_PIXELS", str(INGEST_FLUX_PIXELS))),
+        "guidance": float(os.environ.get("TIER_STANDARD_GUIDANCE", "4.0")),
+    },
+    HIGH: {
+        "steps": int(os.environ.get("TIER_HIGH_STEPS", "16")),
+        "pixels": int(os.environ.get("TIER_HIGH_PIXELS", str(INGEST_FLUX_PIXELS))),
+        "guidance": float(os.environ.get("TIER_HIGH_GUIDANCE", "4.0")),
+    },
+}
+
+# 요청에 등급이 없을 때 쓰는 값 (adaptive도 가능)
+DEFAULT_TIER = os.environ.get("SERVICE_TIER_DEFAULT", STANDARD)
+# adaptive의 상한. 기본은 standard라 한가할 때 GPU 비용이 늘지 않음 (high는 명시적으로 켤 때만)
+TIER_ADAPTIVE_MAX = os.environ.get("TIER_ADAPTIVE_MAX", STANDARD)
+# adaptive: 예상 대기 / SLO 비율이 이 값 이상이면 한 단계씩 낮춤
+TIER_ADAPTIVE_STANDARD_AT = float(os.environ.get("TIER_ADAPTIVE_STANDARD_AT", "0.25"))
+TIER_ADAPTIVE_DRAFT_AT = float(os.environ.get("TIER_ADAPTIVE_DRAFT_AT", "0.5"))
+
+
+def tier_names() -> list:
+    return list(TIERS) + [ADAPTIVE]
+
+
+def get_tier(name: str = None) -> dict:
+    """워커 쪽: 확정된 등급 이름의 설정. 알 수 없는 이름이면 standard"""
+    return TIERS.get(name or STANDARD, TIERS[STANDARD])
+
+
+_ORDER = [DRAFT, STANDARD, HIGH]
+
+
+def choose_tier(pressure: float, ceiling: str = TIER_ADAPTIVE_MAX) -> str:
+    """큐 압력(예상 대기 / SLO)에 따라 ceiling에서 draft 쪽으로만 낮춤 (ceiling보다 올리지 않음)"""
+    if ceiling not in _ORDER:
+        ceiling = STANDARD
+    if pressure >= TIER_ADAPTIVE_DRAFT_AT:
+        target = DRAFT
+    elif pressure >= TIER_ADAPTIVE_STANDARD_AT:
+        target = STANDARD
+    else:
+        target = HIGH
+    return _ORDER[min(_ORDER.index(target), _ORDER.index(ceiling))]
+
+
+def tier_config(name: str) -> str:
+    """결과 캐시 키에 넣는 문자열. 매핑 값이 바뀌면 이전 결과를 재사용하지 않음"""
+    tier = get_tier(name)
+    return f"tier={name};steps={tier['steps']};pixels={tier['pixels']};guidance={tier['guidance']}"
+
+
+def tier_metrics(name: str, requested: str = None, pressure: float = None) -> dict:
+    tier = get_tier(name)
+    metrics = {
+        "tier/name": name,
+        "tier/requested": requested or name,
+        "tier/steps": tier["steps"],
+        "tier/pixels": tier["pixels"],
+        "tier/guidance": tier["guidance"],
+    }
+    if pressure is not None:
+        metrics["tier/pressure"] = pressure
+    return metrics
@@ -0,0 +1,166 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+from safetensors.torch import load_file, save_file
+
+# FLUX 텍스트 인코더 출력(prompt_embeds) 캐시
+# - 메모리 계층: CPU 메모리에 LRU로 보관 (바이트 상한, VRAM은 차지하지 않음)
+#               사용할 때만 파이프라인 디바이스로 복사 (수 MB라 인코딩보다 훨씬 쌈)
+# - 디스크 계층: safetensors 파일 (mmap 로드), 워커 재시작 후에도 재사용
+#               쓰기는 백그라운드 스레드에서, 전체 크기 상한을 넘으면 오래 안 쓴 파일(mtime)부터 삭제
+PROMPT_CACHE_ENABLED = os.environ.get("PROMPT_CACHE_ENABLED", "1") == "1"
+PROMPT_CACHE_MAX_BYTES = int(os.environ.get("PROMPT_CACHE_MAX_BYTES", str(512 * 1024 ** 2)))
+PROMPT_CACHE_DISK_MAX_BYTES = int(os.environ.get("PROMPT_CACHE_DISK_MAX_BYTES", str(10 * 1024 ** 3)))
+PROMPT_CACHE_DIR = os.environ.get(
+    "PROMPT_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data", "prompt_embeds")
+)
+PROMPT_CACHE_DISK = os.environ.get("PROMPT_CACHE_DISK", "1") == "1"
+# 중단된 쓰기의 임시 파일은 이 시간이 지나면 GC가 삭제
+_TMP_MAX_AGE_SEC = 3600
+
+
+def _nbytes(tensor: torch.Tensor) -> int:
+    return tensor.numel() * tensor.element_size()
+
+
+class PromptEmbeddingCache:
+
+    def __init__(self, model_id: str, max_bytes: int = PROMPT_CACHE_MAX_BYTES,
+                 directory: str = PROMPT_CACHE_DIR, use_disk: bool = PROMPT_CACHE_DISK,
+                 disk_max_bytes: int = PROMPT_CACHE_DISK_MAX_BYTES):
+        self.model_id = model_id
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.use_disk = use_disk
+        self.disk_max_bytes = disk_max_bytes
+        # 디스크 쓰기 + GC는 태스크 스레드 밖에서 한 번에 하나씩
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prompt-cache-writer")
+        self.disk_evicted = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes_held = 0
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        if use_disk:
+            os.makedirs(directory, exist_ok=True)
+
+    def key(self, prompt: str) -> str:
+        # 프롬프트는 정규화하지 않고 정확히 같은 문자열만 같은 키로 취급합니다.
+        return hashlib.sha256(f"{self.model_id}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.safetensors")
+
+    def _remember(self, key: str, tensor: torch.Tensor):
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = tensor
+            self.bytes_held += _nbytes(tensor)
+            while self.bytes_held > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes_held -= _nbytes(evicted)
+
+    def _save(self, key: str, prompt: str, tensor: torch.Tensor):
+        """백그라운드 쓰기 스레드에서 실행됩니다. (tensor는 이미 CPU 사본)"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        os.close(fd)
+        try:
+            save_file(
+                {"prompt_embeds": tensor.contiguous()},
+                tmp_path,
+                metadata={"model_id": self.model_id, "prompt": prompt},
+            )
+            os.replace(tmp_path, self._path(key))
+        except Exception as e:
+            print(f"프롬프트 임베딩 디스크 저장 실패: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self.collect_garbage()
+
+    def collect_garbage(self) -> int:
+        """디스크 계층이 상한을 넘으면 오래 안 쓴(mtime) 파일부터 삭제하고 삭제한 개수를 반환합니다."""
+        files = []
+        total = 0
+        now = time.time()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+                if name.endswith(".tmp"):
+                    if now - st.st_mtime > _TMP_MAX_AGE_SEC:
+                        os.remove(path)
+                    continue
+            except FileNotFoundError:
+                continue  # 다른 워커의 GC가 먼저 삭제
+            files.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+
+        removed = 0
+        for _, size, path in sorted(files):
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+        if removed:
+            self.disk_evicted += removed
+            print(f"[Prompt cache GC] 디스크 상한 초과로 임베딩 {removed}개 삭제")
+        return removed
+
+    def get_or_encode(self, prompt: str, encode_fn, device=None) -> torch.Tensor:
+        """캐시에 있으면 임베딩을 돌려주고, 없으면 encode_fn(prompt)로 만들어 두 계층에 저장합니다."""
+        key = self.key(prompt)
+        device = device or "cpu"
+
+        with self._lock:
+            tensor = self._entries.get(key)
+            if tensor is not None:
+                self._entries.move_to_end(key)
+                self.hits_memory += 1
+        if tensor is not None:
+            return tensor.to(device)
+
+        path = self._path(key)
+        if self.use_disk and os.path.exists(path):
+            try:
+                # 디스크 GC의 LRU 기준
+                os.utime(path)
+                tensor = load_file(path, device="cpu")["prompt_embeds"]
+                self.hits_disk += 1
+                self._remember(key, tensor)
+                return tensor.to(device)
+            except Exception as e:
+                print(f"프롬프트 임베딩 디스크 로드 실패 (다시 인코딩): {e}")
+
+        self.misses += 1
+        tensor = encode_fn(prompt)
+        cpu_tensor = tensor.detach().to("cpu")
+        self._remember(key, cpu_tensor)
+        if self.use_disk:
+            self._writer.submit(self._save, key, prompt, cpu_tensor)
+        return tensor
+
+    def stats(self) -> dict:
+        lookups = self.hits_memory + self.hits_disk + self.misses
+        return {
+            "prompt_cache/hits_memory": self.hits_memory,
+            "prompt_cache/hits_disk": self.hits_disk,
+            "prompt_cache/misses": self.misses,
+            "prompt_cache/hit_rate": (self.hits_memory + self.hits_disk) / lookups if lookups else 0.0,
+            "prompt_cache/bytes_held": self.bytes_held,
+            "prompt_cache/entries": len(self._entries),
+            "prompt_cache/disk_evicted": self.disk_evicted,
+        }
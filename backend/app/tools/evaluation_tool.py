@@ -1,15 +1,32 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
 import torch
 from transformers import CLIPProcessor, CLIPModel
 from PIL import Image
 
+from ..tracing import span
+from .model_client import MODEL_SERVER_SOCKET, get_model_client
+
 MODEL = None
 PROCESSOR = None
 DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+MODEL_ID = "openai/clip-vit-base-patch32"
+
+# 임베딩 캐시 크기 (텍스트는 model id + 문자열, 이미지는 픽셀 해시 기준)
+CLIP_TEXT_CACHE_SIZE = int(os.environ.get("CLIP_TEXT_CACHE_SIZE", "4096"))
+CLIP_IMAGE_CACHE_SIZE = int(os.environ.get("CLIP_IMAGE_CACHE_SIZE", "512"))
+
+_TEXT_CACHE = OrderedDict()
+_IMAGE_CACHE = OrderedDict()
+_CACHE_LOCK = threading.Lock()
 
 def load_clip_model():
     global MODEL, PROCESSOR
     if MODEL is None:
-        model_id = "openai/clip-vit-base-patch32"
+        model_id = MODEL_ID
         print(f"평가용 CLIP 모델 로딩 중: {model_id}...")
         try:
             PROCESSOR = CLIPProcessor.from_pretrained(model_id)
@@ -20,27 +37,85 @@ def load_clip_model():
             return False
     return True
 
+def image_digest(image: Image.Image) -> str:
+    """디코딩된 픽셀 기준의 content hash (같은 이미지는 포맷과 무관하게 같은 키)"""
+    hasher = hashlib.sha256(f"{image.mode}:{image.size}".encode())
+    hasher.update(image.tobytes())
+    return hasher.hexdigest()
+
+def _cached_embeddings(cache, keys, max_size, encode_missing):
+    """LRU 캐시에서 임베딩을 찾고, 없는 항목만 한 번에 인코딩해서 채웁니다."""
+    found = {}
+    missing = {}
+    with _CACHE_LOCK:
+        for key, item in keys:
+            if key in cache:
+                cache.move_to_end(key)
+                found[key] = cache[key]
+            else:
+                missing.setdefault(key, item)
+
+    if missing:
+        embeds = encode_missing(list(missing.values()))
+        with _CACHE_LOCK:
+            for key, embed in zip(missing, embeds):
+                found[key] = cache[key] = embed
+            while len(cache) > max_size:
+                cache.popitem(last=False)
+
+    return torch.stack([found[key] for key, _ in keys])
+
+def _encode_texts(texts):
+    inputs = PROCESSOR(text=texts, return_tensors="pt", padding=True, truncation=True).to(DEVICE)
+    with torch.no_grad():
+        embeds = MODEL.get_text_features(**inputs)
+    return embeds / embeds.norm(dim=-1, keepdim=True)
+
+def _encode_images(images):
+    inputs = PROCESSOR(images=images, return_tensors="pt").to(DEVICE)
+    with torch.no_grad():
+        embeds = MODEL.get_image_features(**inputs)
+    return embeds / embeds.norm(dim=-1, keepdim=True)
+
+def calculate_clip_scores(images, texts) -> list:
+    """
+    N개의 이미지와 M개의 텍스트를 한 번에 비교해 N x M 점수 행렬을 반환합니다.
+    정규화된 임베딩을 캐시하므로 반복되는 프롬프트/이미지는 다시 인코딩하지 않습니다.
+    """
+    if not load_clip_model():
+        return [[0.0] * len(texts) for _ in images]
+
+    text_embeds = _cached_embeddings(
+        _TEXT_CACHE, [((MODEL_ID, t), t) for t in texts], CLIP_TEXT_CACHE_SIZE, _encode_texts
+    )
+    image_embeds = _cached_embeddings(
+        _IMAGE_CACHE, [((MODEL_ID, image_digest(img)), img) for img in images],
+        CLIP_IMAGE_CACHE_SIZE, _encode_images
+    )
+
+    # CLIPModel의 logits_per_image와 동일: logit_scale * cos(image, text)
+    with torch.no_grad():
+        logits = MODEL.logit_scale.exp() * image_embeds @ text_embeds.t()
+
+    return [[round(score, 4) for score in row] for row in logits.tolist()]
+
+def clip_cache_stats() -> dict:
+    return {
+        "clip_cache/text_entries": len(_TEXT_CACHE),
+        "clip_cache/image_entries": len(_IMAGE_CACHE),
+    }
+
 def calculate_clip_score(image: Image.Image, text: str) -> float:
     """
     이미지와 텍스트 사이의 유사도(CLIP Score)를 계산합니다.
     점수가 높을수록 이미지가 텍스트를 잘 묘사한 것입니다.
     """
+    if MODEL_SERVER_SOCKET:
+        with span("clip.score", remote=True):
+            return get_model_client().clip_score(image, text)
+
     if not load_clip_model():
         return 0.0
 
-    # 입력 처리
-    inputs = PROCESSOR(
-        text=[text], 
-        images=image, 
-        return_tensors="pt", 
-        padding=True
-    ).to(DEVICE)
-
-    with torch.no_grad():
-        outputs = MODEL(**inputs)
-    
-    # image-text similarity score (Logits)
-    logits_per_image = outputs.logits_per_image 
-    score = logits_per_image.item() # 실수값으로 변환
-    
-    return round(score, 4)
\ No newline at end of file
+    with span("clip.score"):
+        return calculate_clip_scores([image], [text])[0][0]
@@ -0,0 +1,134 @@
+import hashlib
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from PIL import Image
+
+# 여러 heavy 작업을 모아 한 번의 파이프라인 호출로 실행하는 스케줄러 설정
+# (FLUX_MAX_BATCH=1이면 기존처럼 요청마다 바로 실행)
+FLUX_MAX_BATCH = int(os.environ.get("FLUX_MAX_BATCH", "1"))
+FLUX_MAX_WAIT_MS = float(os.environ.get("FLUX_MAX_WAIT_MS", "200"))
+
+
+def resolution_bucket(image: Image.Image) -> tuple:
+    """출력 해상도가 같아야 한 배치로 묶을 수 있습니다. (FLUX는 16의 배수)"""
+    width, height = image.size
+    return (width // 16 * 16, height // 16 * 16)
+
+
+def image_identity(image: Image.Image) -> str:
+    """픽셀 기준 해시. Flux2Pipeline은 image 리스트를 한 샘플의 다중 참조로 해석하므로
+    한 번의 호출로 묶을 수 있는 건 같은 입력 이미지를 쓰는 요청뿐입니다."""
+    hasher = hashlib.sha256(f"{image.mode}:{image.size}".encode())
+    hasher.update(image.tobytes())
+    return hasher.hexdigest()
+
+
+class FluxRequest:
+    def __init__(self, image: Image.Image, prompt: str, num_inference_steps: int, guidance_scale: float,
+                 preview=None, job: tuple = (None, None)):
+        self.image = image
+        self.prompt = prompt
+        self.num_inference_steps = num_inference_steps
+        self.guidance_scale = guidance_scale
+        # 스케줄러 스레드에는 태스크의 job 정보가 없으므로 제출한 쪽에서 넘김 (step별 취소/미리보기용)
+        self.preview = preview
+        self.job = job
+        self.future = Future()
+        self.enqueued_at = time.time()
+        self.compat_key = (
+            image_identity(image), resolution_bucket(image), num_inference_steps, guidance_scale
+        )
+
+
+class FluxBatchScheduler:
+    """
+    동시에 실행 중인 heavy 태스크들의 요청을 모아서, 호환되는 요청
+    (같은 입력 이미지 + 해상도 버킷 + step 수 + guidance)끼리 run_batch로 한 번에 처리하고
+    결과를 각 태스크에 돌려줍니다.
+    같은 키의 요청이 최근 대기 창 안에 들어온 적이 없으면 기다리지 않고 바로 실행합니다.
+    (서로 다른 사진을 편집하는 일반적인 경우에는 묶일 상대가 없으므로)
+    """
+
+    def __init__(self, run_batch, max_batch: int = FLUX_MAX_BATCH, max_wait_ms: float = FLUX_MAX_WAIT_MS):
+        self.run_batch = run_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.batch_sizes = deque(maxlen=1024)
+        # 키별 마지막 제출 시각 (같은 이미지 요청이 연달아 오는 경우에만 배치 대기)
+        self._last_seen = {}
+        self._seen_lock = threading.Lock()
+        self._queue = queue.Queue()
+        # 다른 키 때문에 이번 배치에 못 들어간 요청 (다음 배치에서 먼저 처리)
+        self._pending = deque()
+        self._thread = threading.Thread(target=self._loop, name="flux-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, image: Image.Image, prompt: str, num_inference_steps: int = 8,
+               guidance_scale: float = 4.0, preview=None, job: tuple = (None, None)) -> Future:
+        request = FluxRequest(image, prompt, num_inference_steps, guidance_scale, preview, job)
+        with self._seen_lock:
+            previous = self._last_seen.get(request.compat_key)
+            self._last_seen[request.compat_key] = request.enqueued_at
+            # 오래된 키 정리
+            for key in [k for k, t in self._last_seen.items() if request.enqueued_at - t > 10 * self.max_wait]:
+                del self._last_seen[key]
+        request.wait = previous is not None and request.enqueued_at - previous <= self.max_wait
+        self._queue.put(request)
+        return request.future
+
+    def _next(self, timeout=None):
+        if self._pending:
+            return self._pending.popleft()
+        return self._queue.get(timeout=timeout)
+
+    def _collect(self) -> list:
+        first = self._next()
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait
+
+        # 대기 중이던 요청 중 같은 키를 먼저 흡수
+        skipped = deque()
+        while self._pending and len(batch) < self.max_batch:
+            request = self._pending.popleft()
+            (batch if request.compat_key == first.compat_key else skipped).append(request)
+
+        # 이미 큐에 와 있는 요청은 기다리지 않고 흡수
+        while len(batch) < self.max_batch:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            (batch if request.compat_key == first.compat_key else skipped).append(request)
+
+        # 같은 이미지 요청이 연달아 들어오는 중일 때만 대기 창을 기다림
+        waiting = any(r.wait for r in batch)
+        while waiting and len(batch) < self.max_batch:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            (batch if request.compat_key == first.compat_key else skipped).append(request)
+
+        skipped.extend(self._pending)
+        self._pending = skipped
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            self.batch_sizes.append(len(batch))
+            try:
+                images = self.run_batch(batch)
+                for request, image in zip(batch, images):
+                    request.future.set_result(image)
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
@@ -0,0 +1,98 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from PIL import Image
+
+# 업로드 이미지를 모델 작업 해상도로만 디코딩/축소하는 입력 단계
+# (12MP 사진을 그대로 디코딩해서 FLUX/ViLT에 넘기지 않도록)
+INGEST_ENABLED = os.environ.get("INGEST_ENABLED", "1") == "1"
+# FLUX 작업 해상도: 비율을 유지하면서 이 픽셀 수 근처의 16의 배수로 맞춤
+INGEST_FLUX_PIXELS = int(os.environ.get("INGEST_FLUX_PIXELS", str(1024 * 1024)))
+# ViLT 이미지 프로세서의 짧은 변 길이 (더 크게 넘겨도 어차피 여기로 줄어듦)
+INGEST_VQA_SIZE = int(os.environ.get("INGEST_VQA_SIZE", "384"))
+INGEST_CACHE_SIZE = int(os.environ.get("INGEST_CACHE_SIZE", "16"))
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _add_metric(metrics, key: str, value: float):
+    if metrics is not None:
+        metrics[key] = metrics.get(key, 0) + value
+
+
+def flux_bucket_size(width: int, height: int, target_pixels: int = INGEST_FLUX_PIXELS) -> tuple:
+    """비율을 유지한 채 target_pixels 이하로 줄이고 16의 배수로 내림합니다. (확대는 하지 않음)"""
+    scale = min(1.0, math.sqrt(target_pixels / (width * height)))
+    return (max(16, int(width * scale) // 16 * 16), max(16, int(height * scale) // 16 * 16))
+
+
+def vqa_size(width: int, height: int, shortest_edge: int = INGEST_VQA_SIZE) -> tuple:
+    scale = min(1.0, shortest_edge / min(width, height))
+    return (max(1, round(width * scale)), max(1, round(height * scale)))
+
+
+def _resize(image: Image.Image, size: tuple, metrics=None) -> Image.Image:
+    if image.size == size:
+        return image
+    start = time.time()
+    # reducing_gap: 큰 축소는 정수배 reduce로 먼저 줄인 뒤 리샘플링 (품질 차이 거의 없이 빠름)
+    resized = image.resize(size, Image.BICUBIC, reducing_gap=3.0)
+    _add_metric(metrics, "ingest/resize_sec", time.time() - start)
+    return resized
+
+
+def decode_image(source, digest: str = None, metrics=None) -> Image.Image:
+    """
+    이미지를 FLUX 작업 해상도(버킷)로 디코딩합니다. JPEG은 draft 모드로 DCT 단계에서
+    1/2, 1/4, 1/8로 줄여 읽으므로 큰 사진일수록 디코딩 시간이 크게 줄어듭니다.
+    digest(내용 해시)가 있으면 디코딩 결과를 LRU에 보관해서 단계/요청 간에 재사용합니다.
+    반환된 이미지는 공유되므로 제자리에서 수정하면 안 됩니다.
+    """
+    if digest is not None:
+        with _cache_lock:
+            if digest in _cache:
+                _cache.move_to_end(digest)
+                _add_metric(metrics, "ingest/cache_hit", 1)
+                return _cache[digest]
+
+    start = time.time()
+    image = Image.open(source)
+    if not INGEST_ENABLED:
+        image = image.convert("RGB")
+        _add_metric(metrics, "ingest/decode_sec", time.time() - start)
+        return image
+
+    target = flux_bucket_size(*image.size)
+    if image.format == "JPEG":
+        # 요청한 크기 이상을 유지하는 가장 큰 축소 배율로 디코딩
+        image.draft("RGB", target)
+    image = image.convert("RGB")
+    _add_metric(metrics, "ingest/decode_sec", time.time() - start)
+
+    # draft 결과는 target 이상이므로 원본 비율 기준의 버킷 크기로 마무리
+    image = _resize(image, target, metrics)
+
+    if digest is not None:
+        with _cache_lock:
+            _cache[digest] = image
+            while len(_cache) > INGEST_CACHE_SIZE:
+                _cache.popitem(last=False)
+    return image
+
+
+def fit_for_tool(image: Image.Image, tool: str, metrics=None, flux_pixels: int = INGEST_FLUX_PIXELS) -> Image.Image:
+    """
+    도구별 입력 해상도로 맞춥니다. (img2img: FLUX 버킷, vqa: ViLT 입력 크기)
+    flux_pixels로 서비스 등급별 해상도 버킷을 고를 수 있습니다. (디코딩 버킷보다 커지지는 않음)
+    """
+    if not INGEST_ENABLED or image is None:
+        return image
+    if tool == "run_img2img":
+        return _resize(image, flux_bucket_size(*image.size, target_pixels=flux_pixels), metrics)
+    if tool == "run_vqa":
+        return _resize(image, vqa_size(*image.size), metrics)
+    return image
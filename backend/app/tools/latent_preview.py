@@ -0,0 +1,144 @@
+import base64
+import io
+import math
+import os
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+
+# diffusion 도중의 latent를 전체 VAE 대신 선형 투영으로 근사 디코딩한 작은 미리보기
+# (요청에서 preview를 켠 경우에만 생성, 비용은 step 간격/횟수/시간 비율로 제한)
+PREVIEW_EVERY_N_STEPS = int(os.environ.get("PREVIEW_EVERY_N_STEPS", "2"))
+PREVIEW_MAX_COUNT = int(os.environ.get("PREVIEW_MAX_COUNT", "4"))
+PREVIEW_MAX_SIZE = int(os.environ.get("PREVIEW_MAX_SIZE", "256"))
+PREVIEW_JPEG_QUALITY = int(os.environ.get("PREVIEW_JPEG_QUALITY", "60"))
+# 미리보기에 쓴 누적 시간이 diffusion 경과 시간의 이 비율을 넘으면 건너뜀
+PREVIEW_MAX_OVERHEAD = float(os.environ.get("PREVIEW_MAX_OVERHEAD", "0.05"))
+# scripts/benchmark_latent_preview.py --calibrate 로 만든 (C x 3) 투영 행렬 + bias
+PREVIEW_FACTORS_PATH = os.environ.get(
+    "PREVIEW_FACTORS_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                 "data", "latent_preview_factors.pt")
+)
+
+_FACTORS = None
+
+
+def load_factors():
+    global _FACTORS
+    if _FACTORS is None and os.path.exists(PREVIEW_FACTORS_PATH):
+        _FACTORS = torch.load(PREVIEW_FACTORS_PATH, map_location="cpu")
+    return _FACTORS
+
+
+def token_grid(seq_len: int, width: int, height: int) -> tuple:
+    """packed latent의 토큰 수로부터 (h, w) 격자를 구합니다. (FLUX 계열: 토큰 하나 = 16x16 픽셀)"""
+    h, w = height // 16, width // 16
+    if h * w == seq_len:
+        return h, w
+    # 패치 크기가 다르면 원본 비율로 추정
+    w = round(math.sqrt(seq_len * width / height))
+    h = seq_len // w if w else 0
+    return (h, w) if h * w == seq_len else (None, None)
+
+
+def project_latents(latents: torch.Tensor, width: int, height: int) -> Image.Image:
+    """
+    [B, seq, C] packed latent의 첫 샘플을 RGB로 근사합니다.
+    보정된 투영 행렬이 있으면 사용하고, 없으면 채널을 3묶음으로 평균낸 뒤 정규화합니다.
+    """
+    tokens = latents[0].detach().float().cpu()
+    if tokens.dim() != 2:
+        return None
+    h, w = token_grid(tokens.shape[0], width, height)
+    if h is None:
+        return None
+
+    factors = load_factors()
+    if factors is not None and factors["weight"].shape[0] == tokens.shape[1]:
+        rgb = tokens @ factors["weight"] + factors["bias"]
+    else:
+        group = tokens.shape[1] // 3
+        rgb = tokens[:, :group * 3].reshape(-1, 3, group).mean(-1)
+        low, high = rgb.min(0).values, rgb.max(0).values
+        rgb = (rgb - low) / (high - low).clamp(min=1e-6)
+
+    pixels = (rgb.clamp(0, 1) * 255).to(torch.uint8).reshape(h, w, 3).numpy()
+    preview = Image.fromarray(pixels, "RGB")
+    scale = PREVIEW_MAX_SIZE / max(width, height)
+    size = (max(1, round(width * min(1.0, scale))), max(1, round(height * min(1.0, scale))))
+    return preview.resize(size, Image.BILINEAR)
+
+
+class LatentPreviewer:
+    """
+    파이프라인의 callback_on_step_end에서 호출되어 N step마다 미리보기를 만들고 publish로 넘깁니다.
+    publish(diffusion_step=, total_steps=, image=, width=, height=)는 호출자가 정함 (예: 진행 이벤트 발행)
+    """
+
+    def __init__(self, publish, every_n: int = PREVIEW_EVERY_N_STEPS, max_count: int = PREVIEW_MAX_COUNT):
+        self.publish = publish
+        self.every_n = max(1, every_n)
+        self.max_count = max_count
+        self.size = None
+        self.total_steps = None
+        self.started = None
+        self.count = 0
+        self.skipped = 0
+        self.sec = 0.0
+        self.bytes = 0
+
+    def begin(self, size: tuple, total_steps: int):
+        self.size = size
+        self.total_steps = total_steps
+        self.started = time.time()
+
+    def callback(self, pipe, step: int, timestep, callback_kwargs: dict) -> dict:
+        # 마지막 step은 곧 최종 이미지가 나오므로 생략
+        if (step + 1) % self.every_n or step + 1 >= (self.total_steps or 0) or self.count >= self.max_count:
+            return callback_kwargs
+        if self.sec > PREVIEW_MAX_OVERHEAD * (time.time() - self.started):
+            self.skipped += 1
+            return callback_kwargs
+
+        start = time.time()
+        latents = callback_kwargs.get("latents")
+        preview = project_latents(latents, *self.size) if latents is not None else None
+        if preview is not None:
+            buf = io.BytesIO()
+            preview.save(buf, format="JPEG", quality=PREVIEW_JPEG_QUALITY)
+            self.bytes += buf.tell()
+            self.count += 1
+            self.publish(
+                diffusion_step=step + 1, total_steps=self.total_steps,
+                image="data:image/jpeg;base64," + base64.b64encode(buf.getvalue()).decode(),
+                width=preview.width, height=preview.height,
+            )
+        self.sec += time.time() - start
+        return callback_kwargs
+
+    def stats(self, prefix: str = "preview/") -> dict:
+        return {
+            f"{prefix}count": self.count,
+            f"{prefix}skipped": self.skipped,
+            f"{prefix}sec": self.sec,
+            f"{prefix}bytes": self.bytes,
+        }
+
+
+def fit_projection(latents: torch.Tensor, image: Image.Image) -> dict:
+    """
+    최종 latent [1, seq, C]와 VAE로 디코딩된 결과 이미지로 (C x 3) 최소제곱 투영을 맞춥니다.
+    결과를 torch.save로 PREVIEW_FACTORS_PATH에 저장하면 이후 미리보기에 사용됩니다.
+    """
+    tokens = latents[0].detach().float().cpu()
+    h, w = token_grid(tokens.shape[0], image.width, image.height)
+    if h is None:
+        raise ValueError(f"latent 토큰 수({tokens.shape[0]})가 이미지 크기와 맞지 않습니다.")
+    target = torch.from_numpy(np.asarray(image.convert("RGB").resize((w, h), Image.BOX)))
+    target = target.reshape(-1, 3).float() / 255
+    ones = torch.ones(tokens.shape[0], 1)
+    solution = torch.linalg.lstsq(torch.cat([tokens, ones], dim=1), target).solution
+    return {"weight": solution[:-1], "bias": solution[-1]}
@@ -0,0 +1,136 @@
+import json
+import os
+import socket
+import struct
+import threading
+
+from PIL import Image
+
+# 같은 호스트의 모델 서버(app/model_server.py)에 VQA/CLIP 추론을 맡기는 클라이언트
+# 설정되어 있으면 워커는 ViLT/CLIP을 직접 로드하지 않습니다.
+MODEL_SERVER_SOCKET = os.environ.get("MODEL_SERVER_SOCKET", "")
+MODEL_SERVER_TIMEOUT_SEC = float(os.environ.get("MODEL_SERVER_TIMEOUT_SEC", "60"))
+
+# 프레임: [4바이트 헤더 길이][JSON 헤더][원시 픽셀 바이트...]
+# 이미지는 pickle 없이 (mode, size, nbytes) 메타데이터 + Image.tobytes() 그대로 전송
+_LENGTH = struct.Struct("!I")
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytearray:
+    buf = bytearray(size)
+    view = memoryview(buf)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:], size - received)
+        if n == 0:
+            raise ConnectionError("model server connection closed")
+        received += n
+    return buf
+
+
+def send_frame(sock: socket.socket, header: dict, images=()):
+    payloads = []
+    header = dict(header)
+    header["images"] = []
+    for image in images:
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        raw = image.tobytes()
+        header["images"].append({"mode": image.mode, "size": list(image.size), "nbytes": len(raw)})
+        payloads.append(raw)
+    encoded = json.dumps(header).encode("utf-8")
+    sock.sendall(_LENGTH.pack(len(encoded)) + encoded)
+    for raw in payloads:
+        sock.sendall(raw)
+
+
+def recv_frame(sock: socket.socket) -> tuple:
+    (length,) = _LENGTH.unpack(_recv_exact(sock, _LENGTH.size))
+    header = json.loads(_recv_exact(sock, length))
+    images = [
+        Image.frombytes(meta["mode"], tuple(meta["size"]), _recv_exact(sock, meta["nbytes"]))
+        for meta in header.pop("images", [])
+    ]
+    return header, images
+
+
+class ModelServerError(RuntimeError):
+    pass
+
+
+class ModelClient:
+    """스레드마다 연결 하나를 유지합니다. (threads/gevent 풀에서도 요청이 섞이지 않도록)"""
+
+    def __init__(self, path: str = MODEL_SERVER_SOCKET, timeout: float = MODEL_SERVER_TIMEOUT_SEC):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.path)
+        return sock
+
+    @staticmethod
+    def _peer_closed(sock: socket.socket) -> bool:
+        """쉬는 동안 서버가 닫은 연결인지 (보내기 전에 확인, 읽을 데이터가 없으면 열린 것)"""
+        try:
+            return sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) == b""
+        except BlockingIOError:
+            return False
+        except OSError:
+            return True
+
+    def _request(self, op: str, images=(), **fields) -> dict:
+        # 연결/전송 단계에서 끊긴 경우(서버 재시작 등)만 한 번 다시 연결해서 재시도
+        # 요청을 다 보낸 뒤의 오류(응답 대기 timeout 포함)는 재시도하지 않음:
+        # 서버는 이미 추론 중이라 다시 보내면 같은 요청을 두 번 실행함
+        for attempt in range(2):
+            sock = getattr(self._local, "sock", None)
+            if sock is not None and self._peer_closed(sock):
+                self.close()
+                sock = None
+            sent = False
+            try:
+                if sock is None:
+                    sock = self._local.sock = self._connect()
+                send_frame(sock, {"op": op, **fields}, images)
+                sent = True
+                reply, _ = recv_frame(sock)
+                break
+            except socket.timeout:
+                self.close()
+                raise
+            except (ConnectionError, FileNotFoundError):
+                self.close()
+                if attempt or sent:
+                    raise
+        if not reply.get("ok"):
+            raise ModelServerError(reply.get("error", "unknown model server error"))
+        return reply
+
+    def vqa(self, image: Image.Image, question: str) -> str:
+        return self._request("vqa", [image], question=question)["answer"]
+
+    def clip_score(self, image: Image.Image, text: str) -> float:
+        return self._request("clip", [image], text=text)["score"]
+
+    def stats(self) -> dict:
+        return self._request("stats")["stats"]
+
+    def close(self):
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            sock.close()
+
+
+_CLIENT = None
+
+
+def get_model_client() -> ModelClient:
+    global _CLIENT
+    if _CLIENT is None:
+        _CLIENT = ModelClient()
+    return _CLIENT
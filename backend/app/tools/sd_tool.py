@@ -4,14 +4,17 @@ import torch
 import logging
 from PIL import Image
 from diffusers import Flux2Pipeline, DiffusionPipeline
-# from torch.profiler import profile, record_function, ProfilerActivity
 import requests
 import io
 import time
+import threading
 
-
-# PROFILE_OUTPUT_DIR = "profiler_output" 
-# os.makedirs(PROFILE_OUTPUT_DIR, exist_ok=True)
+from .embedding_cache import PromptEmbeddingCache, PROMPT_CACHE_ENABLED
+from .flux_batcher import FluxBatchScheduler, FLUX_MAX_BATCH
+from ..tracing import span
+from ..profiling import region
+from ..cancellation import current_job, check_cancelled, diffusion_callback, job_cancel_reason, JobCancelled
+from .latent_preview import LatentPreviewer
 
 import torch.nn.functional as F
 
@@ -35,6 +38,7 @@ except RuntimeError:
     pass
 
 MY_HF_TOKEN = os.environ.get("HUGGING_FACE_TOKEN")
+FLUX_MODEL_ID = "diffusers/FLUX.2-dev-bnb-4bit"
 
 class Flux2ImageGenerator:
     _instance = None
@@ -49,6 +53,9 @@ class Flux2ImageGenerator:
         if self._is_loaded:
             return
         self.pipeline = None
+        self.scheduler = None
+        self._load_lock = threading.Lock()
+        self.embedding_cache = PromptEmbeddingCache(FLUX_MODEL_ID)
         self._is_loaded = True
 
     def _remote_text_encoder(self, prompt: str):
@@ -94,11 +101,18 @@ class Flux2ImageGenerator:
         if self.pipeline is not None:
             return self.pipeline
 
+        # threads 풀에서 여러 태스크가 동시에 로드하지 않도록 (VRAM 중복 점유 방지)
+        with self._load_lock:
+            if self.pipeline is None:
+                self._load_pipeline_locked()
+        return self.pipeline
+
+    def _load_pipeline_locked(self):
         logger.info("⚡ FLUX.2 Img2Img 모델 로드 중 (Text Encoder는 Remote 사용)...")
 
         # FLUX.2 모델 로드 (Text Encoder는 원격으로 대체하므로 None)
         self.pipeline = Flux2Pipeline.from_pretrained(
-            "diffusers/FLUX.2-dev-bnb-4bit",
+            FLUX_MODEL_ID,
             # text_encoder=None,
             torch_dtype=torch.bfloat16 
         ).to("cuda")
@@ -115,61 +129,152 @@ class Flux2ImageGenerator:
         #     logger.warning(f"모델 컴파일 실패 (속도 저하 가능성): {e}")
 
         logger.info("FLUX.2 파이프라인 로드 완료.")
-        return self.pipeline
 
-    def run_img2img(self, image: Image.Image, prompt: str) -> Image.Image:
+    def _encode_prompt(self, prompt: str) -> torch.Tensor:
+        """파이프라인의 텍스트 인코더로 prompt_embeds만 계산합니다."""
+        pipe = self.load_pipeline()
+        with torch.no_grad():
+            prompt_embeds, _ = pipe.encode_prompt(prompt=prompt, device=pipe._execution_device)
+        return prompt_embeds
+
+    def get_prompt_embeds(self, prompt: str) -> torch.Tensor:
+        """캐시된 prompt_embeds를 반환합니다. (반복/템플릿 프롬프트는 텍스트 인코딩 생략)"""
+        pipe = self.load_pipeline()
+        return self.embedding_cache.get_or_encode(prompt, self._encode_prompt, device=pipe._execution_device)
+
+    def _prompt_inputs(self, prompts: list) -> dict:
+        if PROMPT_CACHE_ENABLED:
+            return {"prompt_embeds": torch.cat([self.get_prompt_embeds(p) for p in prompts])}
+        return {"prompt": prompts if len(prompts) > 1 else prompts[0]}
+
+    def get_scheduler(self) -> FluxBatchScheduler:
+        if self.scheduler is None:
+            with self._load_lock:
+                if self.scheduler is None:
+                    self.scheduler = FluxBatchScheduler(self.run_batch)
+        return self.scheduler
+
+    def run_batch(self, requests: list) -> list:
+        """
+        호환되는 요청 묶음(FluxRequest 리스트)을 실행하고 요청 순서대로 이미지를 반환합니다.
+        스케줄러가 같은 입력 이미지를 쓰는 요청끼리만 묶으므로(compat_key),
+        prompt_embeds를 쌓아 파이프라인을 한 번만 호출합니다.
+        """
+        pipe = self.load_pipeline()
+        batch_start = time.time()
+
+        first = requests[0]
+        for request in requests:
+            if request.preview is not None:
+                request.preview.begin(request.image.size, request.num_inference_steps)
+        images = pipe(
+            **self._prompt_inputs([request.prompt for request in requests]),
+            image=first.image,
+            guidance_scale=first.guidance_scale,
+            num_inference_steps=first.num_inference_steps,
+            callback_on_step_end=_batch_callback(requests),
+        ).images
+
+        logger.info(f"⏱️ Batched Img2Img: {len(requests)} requests in {time.time() - batch_start:.2f}s")
+        return images
+
+    def run_img2img(self, image: Image.Image, prompt: str,
+                    num_inference_steps: int = 8, guidance_scale: float = 4.0,
+                    preview: LatentPreviewer = None) -> Image.Image:
         """
         FLUX.2를 사용하여 Image-to-Image 변환을 수행합니다.
+        preview가 있으면 diffusion 도중 근사 미리보기를 만듭니다. (배치 경로에서도 요청별로)
         """
+        if FLUX_MAX_BATCH > 1:
+            check_cancelled()
+            # 다른 heavy 태스크와 함께 배치로 실행되도록 스케줄러에 맡김
+            # 배치 대기 + 실행 시간 전체 (배치 내부는 스케줄러 스레드에서 돌아 trace에 이어지지 않음)
+            with span("flux.batch", steps=num_inference_steps, size=f"{image.width}x{image.height}"):
+                result_image = self.get_scheduler().submit(
+                    image, prompt, num_inference_steps, guidance_scale, preview=preview, job=current_job()
+                ).result()
+            # 배치 도중 이 요청만 취소된 경우 (다른 요청 때문에 끝까지 돌았음) 결과를 쓰지 않음
+            check_cancelled()
+            return result_image
+
         pipe = self.load_pipeline()
 
         full_inference_start = time.time()
 
-        # 1. 프롬프트 인코딩 (원격 API 사용)
+        # 1. 프롬프트 인코딩 (캐시 히트 시 텍스트 인코더를 건너뜀)
         # prompt_embeds = self._remote_text_encoder(prompt)
         # if prompt_embeds is None:
         #     raise ValueError("Remote Text Encoder failed to generate embeddings.")
+        encode_start_time = time.time()
+        with span("flux.encode_prompt"):
+            prompt_inputs = self._prompt_inputs([prompt])
+        encode_duration = time.time() - encode_start_time
+
+        # step 콜백: 태스크 안에서는 취소/마감 확인, 요청한 경우에만 미리보기
+        callbacks = []
+        if current_job()[0]:
+            callbacks.append(diffusion_callback)
+        if preview is not None:
+            preview.begin(image.size, num_inference_steps)
+            callbacks.append(preview.callback)
 
         diffusion_start_time = time.time()
 
-        # with profile(
-        #     activities=[ProfilerActivity.CPU, ProfilerActivity.CUDA],
-        #     record_shapes=True, profile_memory=True, with_stack=False
-        # ) as prof:
-        #     with record_function("FLUX_INFERENCE"):
-        #         result_image = pipe(
-        #             prompt=prompt,
-        #             image=image, 
-        #             guidance_scale=4.0, 
-        #             num_inference_steps=20, 
-        #         ).images[0]
-
-        result_image = pipe(
-                    prompt=prompt,
-                    image=image, 
-                    guidance_scale=4.0, 
-                    num_inference_steps=8, 
-                ).images[0]
-
-        # 3. 프로파일링 결과 저장 (Chrome Trace Format)
-        # current_time_after_inference = time.time()
-
-        # logger.info("\n\n============ 📊 FLUX.2 GPU Profiling Results (Top 10) ============")
-        
-        # # 'cuda_time_total' 기준으로 정렬하여 가장 느린 CUDA 연산을 찾습니다.
-        # logger.info(prof.key_averages(group_by_input_shape=False).table(
-        #     sort_by="cuda_time_total", row_limit=10
-        # ))
-        # logger.info("==================================================================")
+        # 요청 단위 프로파일링(app/profiling.py)이 켜져 있을 때만 FLUX_INFERENCE 구간이 기록됨
+        with span("flux.diffusion", steps=num_inference_steps, size=f"{image.width}x{image.height}"), \
+                region("FLUX_INFERENCE"):
+            result_image = pipe(
+                        **prompt_inputs,
+                        image=image, 
+                        guidance_scale=guidance_scale, 
+                        num_inference_steps=num_inference_steps, 
+                        callback_on_step_end=_chain_callbacks(callbacks),
+                    ).images[0]
 
         diffusion_duration = time.time() - diffusion_start_time 
         full_inference_duration = time.time() - full_inference_start
 
+        logger.info(f"⏱️ Prompt Encoding (cache) Time: {encode_duration:.2f}s")
         logger.info(f"⏱️ Diffusion Model (UNet+VAE) Time: {diffusion_duration:.2f}s")
         logger.info(f"⏱️ Full Img2Img Time (Encoder+Diffusion): {full_inference_duration:.2f}s")
 
         return result_image
 
+def _batch_callback(requests: list):
+    """
+    배치 실행의 step 콜백: 요청마다 취소/마감을 확인하고, 미리보기를 켠 요청은 자기 latent로 미리보기를 만듭니다.
+    다른 요청은 멈출 수 없으므로 배치 안의 요청이 모두 취소되었을 때만 남은 step을 건너뜀
+    """
+    tracked = [r for r in requests if r.job[0]]
+    if not tracked and not any(r.preview is not None for r in requests):
+        return None
+
+    def callback(pipe, step: int, timestep, callback_kwargs: dict) -> dict:
+        reasons = {id(r): job_cancel_reason(*r.job) for r in tracked}
+        if len(tracked) == len(requests) and all(reasons.values()):
+            total = getattr(pipe, "num_timesteps", None) or 0
+            raise JobCancelled(next(iter(reasons.values())), progress=(step + 1) / total if total else 0.0)
+        latents = callback_kwargs.get("latents")
+        for i, request in enumerate(requests):
+            if request.preview is not None and not reasons.get(id(request)):
+                sample = latents[i:i + 1] if latents is not None else None
+                request.preview.callback(pipe, step, timestep, {"latents": sample})
+        return callback_kwargs
+
+    return callback
+
+def _chain_callbacks(callbacks: list):
+    if not callbacks:
+        return None
+    if len(callbacks) == 1:
+        return callbacks[0]
+
+    def chained(pipe, step, timestep, callback_kwargs):
+        for callback in callbacks:
+            callback_kwargs = callback(pipe, step, timestep, callback_kwargs)
+        return callback_kwargs
+    return chained
+
 # ----------------------------------------------------
 # [기존 코드 변경 후 호환성 유지를 위한 래퍼 함수]
 # ----------------------------------------------------
@@ -178,10 +283,14 @@ def load_pipeline():
     """외부 호환성을 위해 Flux2ImageGenerator 인스턴스를 로드합니다."""
     return Flux2ImageGenerator().load_pipeline()
 
-def run_inpainting(image: Image.Image, mask_image: Image.Image, prompt: str) -> Image.Image:
+def run_inpainting(image: Image.Image, mask_image: Image.Image, prompt: str, **kwargs) -> Image.Image:
     """
     외부 호환성 유지를 위해 함수명은 run_inpainting을 사용하지만, 
     내부적으로는 FLUX.2 Img2Img 변환을 수행합니다. (mask_image는 무시)
     """
     generator = Flux2ImageGenerator()
-    return generator.run_img2img(image, prompt)
\ No newline at end of file
+    return generator.run_img2img(image, prompt, **kwargs)
+
+def prompt_cache_stats() -> dict:
+    """프롬프트 임베딩 캐시 히트율/보유 바이트 (태스크 metrics용)"""
+    return Flux2ImageGenerator().embedding_cache.stats()
@@ -1,3 +1,10 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
 import torch
 from transformers import (
     pipeline, 
@@ -7,9 +14,21 @@ from transformers import (
 )
 from PIL import Image
 
+from ..tracing import span
+from .model_client import MODEL_SERVER_SOCKET, get_model_client
+
 VQA_PIPELINE = None
+VQA_BATCHER = None
+# run_vqa를 동시에 실행 중인 호출자 수 (혼자면 배처를 거치지 않음)
+_VQA_CALLERS = 0
+_VQA_CALLERS_LOCK = threading.Lock()
 
-def run_vqa(image: Image.Image, question: str) -> str:
+# 마이크로 배칭 설정 (window 0이면 기존처럼 한 건씩 실행)
+VQA_BATCH_WINDOW_MS = float(os.environ.get("VQA_BATCH_WINDOW_MS", "10"))
+VQA_MAX_BATCH = int(os.environ.get("VQA_MAX_BATCH", "8"))
+
+def load_vqa_pipeline():
+    """ViLT VQA 파이프라인을 (최초 1회) 로드합니다."""
     global VQA_PIPELINE
     
     if VQA_PIPELINE is None:
@@ -32,17 +51,130 @@ def run_vqa(image: Image.Image, question: str) -> str:
             image_processor=image_processor,
             device=device
         )
+    return VQA_PIPELINE
+
+def run_vqa_batch(images, questions) -> list:
+    """
+    여러 (이미지, 질문) 쌍을 한 번의 forward로 처리합니다.
+    ViLT 이미지 프로세서가 배치 내 이미지 크기를 pixel_mask와 함께 패딩해 줍니다.
+    """
+    pipe = load_vqa_pipeline()
+    model = pipe.model
+    
+    text_inputs = pipe.tokenizer(
+        questions,
+        padding=True,
+        truncation=True,
+        max_length=model.config.max_position_embeddings,
+        return_tensors="pt"
+    )
+    image_inputs = pipe.image_processor(images=images, return_tensors="pt")
+    inputs = {k: v.to(pipe.device) for k, v in {**text_inputs, **image_inputs}.items()}
+
+    with torch.no_grad():
+        logits = model(**inputs).logits
+
+    # top_k=1이면 sigmoid 이후 argmax와 logits argmax가 같습니다.
+    return [model.config.id2label[i] for i in logits.argmax(-1).tolist()]
+
+class VQABatcher:
+    """
+    동시에 들어온 VQA 요청을 짧은 시간 창(window_ms) 또는 최대 배치 크기까지 모아
+    한 번의 배치 추론으로 실행하고, 호출자마다 자기 답변을 돌려줍니다.
+    직전 요청이 시간 창 안에 들어온 적이 없으면 (요청이 띄엄띄엄 오는 경우) 기다리지 않고 바로 실행합니다.
+    """
+
+    def __init__(self, window_ms: float = VQA_BATCH_WINDOW_MS, max_batch: int = VQA_MAX_BATCH,
+                 infer_batch=run_vqa_batch):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.infer_batch = infer_batch
+        self.batch_sizes = deque(maxlen=1024)
+        self._last_submit = None
+        self._submit_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, name="vqa-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, image: Image.Image, question: str) -> Future:
+        future = Future()
+        now = time.time()
+        with self._submit_lock:
+            wait = self._last_submit is not None and now - self._last_submit <= self.window
+            self._last_submit = now
+        self._queue.put((image, question, future, wait))
+        return future
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.time() + self.window
+
+        # 이미 큐에 와 있는 요청은 기다리지 않고 흡수
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+        # 요청이 연달아 들어오는 중일 때만 대기 창을 기다림
+        waiting = any(b[3] for b in batch)
+        while waiting and len(batch) < self.max_batch:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            self.batch_sizes.append(len(batch))
+            try:
+                answers = self.infer_batch([b[0] for b in batch], [b[1] for b in batch])
+                for (_, _, future, _), answer in zip(batch, answers):
+                    future.set_result(answer)
+            except Exception as e:
+                for _, _, future, _ in batch:
+                    future.set_exception(e)
+
+def get_vqa_batcher() -> VQABatcher:
+    global VQA_BATCHER
+    if VQA_BATCHER is None:
+        VQA_BATCHER = VQABatcher()
+    return VQA_BATCHER
+
+def run_vqa(image: Image.Image, question: str) -> str:
+    global _VQA_CALLERS
+    # 모델 서버가 있으면 이 프로세스에는 ViLT를 올리지 않음
+    if not MODEL_SERVER_SOCKET:
+        load_vqa_pipeline()
     
     print(f"VQA 질문 분석: {question}")
 
+    with _VQA_CALLERS_LOCK:
+        _VQA_CALLERS += 1
+        # solo 풀이거나 지금 다른 호출자가 없으면 묶일 상대가 없으므로 배처 스레드를 거치지 않음
+        batched = VQA_BATCH_WINDOW_MS > 0 and _VQA_CALLERS > 1
     try:
-        result = VQA_PIPELINE(image=image, question=question, top_k=1)
-        
-        answer = result[0]['answer']
+        with span("vqa", batched=batched, remote=bool(MODEL_SERVER_SOCKET),
+                  size=f"{image.width}x{image.height}"):
+            if MODEL_SERVER_SOCKET:
+                answer = get_model_client().vqa(image, question)
+            elif batched:
+                answer = get_vqa_batcher().submit(image, question).result()
+            else:
+                result = VQA_PIPELINE(image=image, question=question, top_k=1)
+                answer = result[0]['answer']
         
         print(f"VQA 답변: {answer}")
         return answer
 
     except Exception as e:
         print(f"VQA 추론 중 에러: {e}")
-        return "Error in VQA"
\ No newline at end of file
+        return "Error in VQA"
+    finally:
+        with _VQA_CALLERS_LOCK:
+            _VQA_CALLERS -= 1
@@ -0,0 +1,297 @@
+import atexit
+import json
+import os
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import redis
+import requests
+from celery.signals import before_task_publish, task_prerun, task_postrun
+
+from .redis_client import get_redis
+from .telemetry import BackgroundExporter
+
+# API -> 브로커 -> 워커 -> 도구 호출까지 하나의 trace로 잇는 span 기반 추적
+# (W3C traceparent 헤더로 전파, OTLP/JSON 또는 로컬 JSONL 파일로 내보냄)
+TRACE_EXPORTER = os.environ.get("TRACE_EXPORTER", "file")  # file | otlp | off
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "0.1"))
+TRACE_DIR = os.environ.get(
+    "TRACE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "traces")
+)
+OTLP_ENDPOINT = os.environ.get("OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+TRACE_SERVICE_NAME = os.environ.get(
+    "TRACE_SERVICE_NAME", "agent-worker" if "celery" in os.path.basename(sys.argv[0]) else "agent-api"
+)
+# WebSocket 등 나중에 붙는 구간이 같은 trace에 이어지도록 job_id -> traceparent 보관
+TRACE_JOB_TTL_SEC = int(os.environ.get("TRACE_JOB_TTL_SEC", "3600"))
+
+TRACEPARENT_HEADER = "traceparent"
+ENQUEUED_AT_HEADER = "enqueued_at"
+
+_current = ContextVar("trace_span", default=None)
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "sampled", "attributes", "start_ns", "end_ns")
+
+    def __init__(self, name: str, trace_id: str, parent_id: str, sampled: bool,
+                 attributes: dict = None, start_ns: int = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.attributes = attributes or {}
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = None
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def end(self, end_ns: int = None):
+        self.end_ns = end_ns or time.time_ns()
+        if self.sampled:
+            _export(self)
+
+    def to_record(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "service": TRACE_SERVICE_NAME,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": (self.end_ns - self.start_ns) / 1e6,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    sampled = False
+
+    def set(self, **attributes):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+def parse_traceparent(header: str):
+    """'00-<trace_id>-<span_id>-<flags>' -> (trace_id, span_id, sampled). 형식이 틀리면 None"""
+    try:
+        version, trace_id, span_id, flags = header.split("-")
+        int(trace_id, 16), int(span_id, 16)
+    except (AttributeError, ValueError):
+        return None
+    if len(trace_id) != 32 or len(span_id) != 16:
+        return None
+    return trace_id, span_id, bool(int(flags, 16) & 1)
+
+
+def _begin(name: str, traceparent: str = None, start_ns: int = None, **attributes) -> Span:
+    parent = parse_traceparent(traceparent) if traceparent else None
+    if parent is None:
+        # 새 trace: 여기서 한 번 샘플링을 결정하고 이후 단계는 플래그를 따름
+        sampled = TRACE_EXPORTER != "off" and random.random() < TRACE_SAMPLE_RATE
+        return Span(name, os.urandom(16).hex(), None, sampled, attributes, start_ns)
+    trace_id, parent_id, sampled = parent
+    return Span(name, trace_id, parent_id, sampled and TRACE_EXPORTER != "off", attributes, start_ns)
+
+
+@contextmanager
+def start_trace(name: str, traceparent: str = None, **attributes):
+    """요청 진입점의 root span (traceparent가 있으면 그 trace를 이어감)"""
+    root = _begin(name, traceparent, **attributes)
+    token = _current.set(root)
+    try:
+        yield root
+    except Exception as e:
+        root.set(error=repr(e))
+        raise
+    finally:
+        _current.reset(token)
+        root.end()
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """현재 span의 자식 span. 샘플링되지 않은 trace에서는 아무것도 기록하지 않습니다."""
+    parent = _current.get()
+    if parent is None or not parent.sampled:
+        yield _NOOP
+        return
+
+    child = Span(name, parent.trace_id, parent.span_id, True, attributes)
+    token = _current.set(child)
+    try:
+        yield child
+    except Exception as e:
+        child.set(error=repr(e))
+        raise
+    finally:
+        _current.reset(token)
+        child.end()
+
+
+def current_traceparent():
+    current = _current.get()
+    return current.traceparent if current is not None else None
+
+
+def remember_trace(job_id: str):
+    traceparent = current_traceparent()
+    current = _current.get()
+    if traceparent is None or not current.sampled:
+        return
+    try:
+        get_redis().set(f"trace:{job_id}", traceparent, ex=TRACE_JOB_TTL_SEC)
+    except redis.RedisError:
+        pass
+
+
+def lookup_trace(job_id: str):
+    try:
+        raw = get_redis().get(f"trace:{job_id}")
+    except redis.RedisError:
+        return None
+    return raw.decode("utf-8") if raw else None
+
+
+# ----------------------------------------------------
+# Celery 전파: 발행 시 헤더에 싣고, 워커에서 task span을 엽니다.
+# ----------------------------------------------------
+
+_task_spans = {}
+
+
+@before_task_publish.connect
+def inject_trace_headers(headers=None, **kwargs):
+    if headers is None:
+        return
+    headers[ENQUEUED_AT_HEADER] = time.time()
+    traceparent = current_traceparent()
+    if traceparent is not None:
+        headers[TRACEPARENT_HEADER] = traceparent
+
+
+@task_prerun.connect
+def start_task_span(task_id=None, task=None, **kwargs):
+    request = task.request
+    traceparent = getattr(request, TRACEPARENT_HEADER, None)
+    enqueued_at = getattr(request, ENQUEUED_AT_HEADER, None)
+    queue = (request.delivery_info or {}).get("routing_key")
+    now = time.time()
+    queue_wait = max(0.0, now - float(enqueued_at)) if enqueued_at else None
+
+    task_span = _begin(f"task {task.name}", traceparent, task_id=task_id, queue=queue)
+    if queue_wait is not None:
+        task_span.set(**{"queue.wait_sec": queue_wait})
+        if task_span.sampled:
+            # 브로커 대기 구간을 독립된 span으로 기록 (발행 시각 ~ 워커 수신)
+            broker = Span("broker.queue", task_span.trace_id, task_span.parent_id, True,
+                          {"queue": queue, "task_id": task_id}, start_ns=int(float(enqueued_at) * 1e9))
+            broker.end(int(now * 1e9))
+
+    _task_spans[task_id] = (task_span, _current.set(task_span), queue_wait)
+
+
+@task_postrun.connect
+def end_task_span(task_id=None, state=None, **kwargs):
+    entry = _task_spans.pop(task_id, None)
+    if entry is None:
+        return
+    task_span, token, _ = entry
+    task_span.set(state=state)
+    try:
+        _current.reset(token)
+    except ValueError:
+        _current.set(None)
+    task_span.end()
+
+
+def queue_wait_sec(task_id: str):
+    """태스크가 발행된 뒤 워커가 받기까지 브로커 큐에서 기다린 시간 (초)"""
+    entry = _task_spans.get(task_id)
+    return entry[2] if entry else None
+
+
+# ----------------------------------------------------
+# 내보내기
+# ----------------------------------------------------
+
+class SpanFileSink:
+    def __init__(self, directory: str = TRACE_DIR):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"spans_{TRACE_SERVICE_NAME}_{os.getpid()}.jsonl")
+
+    def export(self, records: list):
+        with open(self.path, "a") as f:
+            for record in records:
+                f.write(json.dumps(record, default=str) + "\n")
+
+    def close(self):
+        pass
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OtlpHttpSink:
+    """OTLP/HTTP JSON 형식으로 collector(예: otel-collector, Jaeger, Tempo)에 전송"""
+
+    def __init__(self, endpoint: str = OTLP_ENDPOINT):
+        self.endpoint = endpoint
+        self.session = requests.Session()
+
+    def export(self, records: list):
+        spans = [{
+            "traceId": r["trace_id"],
+            "spanId": r["span_id"],
+            **({"parentSpanId": r["parent_id"]} if r["parent_id"] else {}),
+            "name": r["name"],
+            "kind": 1,
+            "startTimeUnixNano": str(r["start_ns"]),
+            "endTimeUnixNano": str(r["end_ns"]),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in r["attributes"].items()],
+        } for r in records]
+        payload = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": TRACE_SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "interactive-ai-agent"}, "spans": spans}],
+        }]}
+        response = self.session.post(self.endpoint, json=payload, timeout=5)
+        response.raise_for_status()
+
+    def close(self):
+        self.session.close()
+
+
+_EXPORTER = None
+_EXPORTER_LOCK = threading.Lock()
+
+
+def _export(finished: Span):
+    global _EXPORTER
+    if _EXPORTER is None:
+        with _EXPORTER_LOCK:
+            if _EXPORTER is None:
+                sink = {"file": SpanFileSink, "otlp": OtlpHttpSink}[TRACE_EXPORTER]()
+                _EXPORTER = BackgroundExporter(sink, spill_dir=TRACE_DIR)
+                atexit.register(_EXPORTER.close)
+    _EXPORTER.emit(finished.to_record())
@@ -2,13 +2,14 @@ import os, sys
 
 sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
 
-import base64
 import time
 import requests
 import pandas as pd
 from celery import Celery
 from tqdm import tqdm 
 
+from app.blob_store import get_blob_store
+
 IMAGE_SOURCES = {
     "test_cat.jpg": "http://images.cocodataset.org/val2017/000000039769.jpg", 
     "test_room.jpg": "http://images.cocodataset.org/val2017/000000000632.jpg",
@@ -52,6 +53,9 @@ broker_url = os.environ.get("CELERY_BROKER_URL", "redis://localhost:6379/0")
 backend_url = os.environ.get("CELERY_RESULT_BACKEND", "redis://localhost:6379/0")
 app = Celery('tasks', broker=broker_url, backend=backend_url)
 
+# 서비스 등급별 지연 시간/CLIP 비교용 (draft | standard | high, 결과 파일도 등급별로 저장)
+BENCHMARK_TIER = os.environ.get("BENCHMARK_TIER", "standard")
+
 def prepare_images():
     """이미지 폴더를 확인하고 없으면 공식 이미지를 다운로드합니다."""
     if not os.path.exists(IMAGE_DIR):
@@ -103,12 +107,15 @@ def run_benchmark():
             print(f"\n파일 없음: {filename} (Skip)")
             continue
 
-        # 이미지 로딩
+        # 이미지 로딩 (blob 저장소에 올리고 메시지에는 참조만 전달)
         with open(img_path, "rb") as f:
-            image_data = base64.b64encode(f.read()).decode("utf-8")
+            image_ref = get_blob_store().put(f.read())
 
         # Celery 태스크 전송
-        task = app.send_task('app.tasks.run_agent_task', args=[prompt, image_data])
+        task = app.send_task('app.tasks.run_agent_task', kwargs={
+            "prompt": prompt, "image_ref": image_ref, "tier": {"name": BENCHMARK_TIER},
+            "evaluation": "sync",  # CLIP/Self-Check를 결과와 함께 받기 위해 동기 평가
+        })
 
         try:
             result = task.get(timeout=300)
@@ -119,6 +126,7 @@ def run_benchmark():
                 summary = {
                     "ID": i + 1,
                     "Type": task_type,
+                    "Tier": metrics.get("tier/name", BENCHMARK_TIER),
                     "Image": filename,
                     "Prompt": prompt[:30] + "..." if len(prompt) > 30 else prompt, 
                     "Time(s)": round(metrics.get("timer/total_latency", 0), 2),
@@ -140,7 +148,7 @@ def run_benchmark():
                     save_name = f"{i+1}_{task_type}_{filename}"
                     save_path = os.path.join(RESULT_DIR, save_name)
                     with open(save_path, "wb") as f:
-                        f.write(base64.b64decode(result["data"]))
+                        f.write(get_blob_store().get(result["data"]))
                         
                 elif result["type"] == "text":
                     summary["CLIP"] = "-"
@@ -157,7 +165,7 @@ def run_benchmark():
     if results_summary:
         df = pd.DataFrame(results_summary)
         
-        cols = ["ID", "Type", "Prompt", "Time(s)", "CLIP", "Self-Check", "VQA/Feedback", "Mem(MB)"]
+        cols = ["ID", "Type", "Tier", "Prompt", "Time(s)", "CLIP", "Self-Check", "VQA/Feedback", "Mem(MB)"]
         df = df[cols]
 
         print("\n\n📊 [Benchmark Report]")
@@ -165,8 +173,9 @@ def run_benchmark():
         print(df.to_string(index=False))
         print("=" * 120)
 
-        df.to_csv(os.path.join(RESULT_DIR, "final_report.csv"), index=False)
-        print(f"\n리포트 저장 완료: {RESULT_DIR}/final_report.csv")
+        report_name = "final_report.csv" if BENCHMARK_TIER == "standard" else f"final_report_{BENCHMARK_TIER}.csv"
+        df.to_csv(os.path.join(RESULT_DIR, report_name), index=False)
+        print(f"\n리포트 저장 완료: {RESULT_DIR}/{report_name}")
     else:
         print("\n완료된 태스크가 없습니다.")
 
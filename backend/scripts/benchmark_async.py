@@ -1,11 +1,13 @@
 import os, sys, random
 sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
 
-import base64, time, requests, pandas as pd
+import pandas as pd
 from celery import Celery
 from tqdm import tqdm 
 
 from benchmark import IMAGE_SOURCES, TEST_CASES, prepare_images, IMAGE_DIR, RESULT_DIR
+from app.blob_store import get_blob_store
+from app.routing import entry_queue
 
 broker_url = os.environ.get("CELERY_BROKER_URL", "redis://localhost:6379/0")
 backend_url = os.environ.get("CELERY_RESULT_BACKEND", "redis://localhost:6379/0")
@@ -30,17 +32,15 @@ def run_async_benchmark():
         img_path = os.path.join(IMAGE_DIR, filename)
 
         with open(img_path, "rb") as f:
-            image_data = base64.b64encode(f.read()).decode("utf-8")
+            image_ref = get_blob_store().put(f.read())
 
-        # 2. 지능형 큐 라우팅 적용
-        target_queue = "light_tasks"
-        if "SD3" in task_type or any(k in prompt.lower() for k in ["draw", "transform", "make"]):
-            target_queue = "heavy_tasks"
+        # 2. API와 같은 라우팅 규칙 적용 (dag 모드에서는 계획 태스크가 각 단계를 도구별 큐로 보냄)
+        target_queue = entry_queue(prompt)
 
         # 3. apply_async를 사용하여 큐 지정 전송
         task = app.send_task(
             'app.tasks.run_agent_task', 
-            args=[prompt, image_data],
+            kwargs={"prompt": prompt, "image_ref": image_ref, "evaluation": "sync"},
             queue=target_queue
         )
 
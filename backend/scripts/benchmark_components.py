@@ -0,0 +1,344 @@
+import os, sys, tempfile
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
+
+# GPU / Redis 서버 / OpenAI / wandb 없이 CPU에서 돌리기 위한 설정 (app 모듈 import 전에 적용)
+_BENCH_DIR = tempfile.mkdtemp(prefix="component_bench_")
+for _key, _value in {
+    "CUDA_VISIBLE_DEVICES": "",
+    "CELERY_BROKER_URL": "memory://",
+    "CELERY_RESULT_BACKEND": "cache+memory://",
+    "REDIS_URL": "redis://localhost:6379/15",
+    "TELEMETRY_BACKEND": "off",
+    "PLAN_CACHE_REDIS": "0",
+    "PROMPT_CACHE_DISK": "0",
+    "WORKER_PRELOAD": "0",
+    "AGENT_EXECUTION_MODE": "inline",
+    "VQA_BATCH_WINDOW_MS": "0",
+    "BLOB_BACKEND": "fs",
+    "BLOB_DIR": os.path.join(_BENCH_DIR, "blobs"),
+}.items():
+    os.environ.setdefault(_key, _value)
+
+import argparse
+import base64
+import io
+import json
+import platform
+import resource
+import subprocess
+import time
+import pandas as pd
+from PIL import Image
+
+from standins import StubPlanner, make_test_image, jpeg_bytes, install_standin_models
+from benchmark import RESULT_DIR
+from app.planner_client import percentile
+
+DEFAULT_REPORT = os.path.join(RESULT_DIR, "component_bench.json")
+
+# 각 컴포넌트를 결정적인 대체 모델로 분리해서 측정하고, 저장된 baseline과 비교합니다.
+# (모델 품질이 아니라 우리 코드의 오버헤드/회귀를 보는 용도)
+
+GROUPS = ["codec", "fanout", "tools", "orchestration", "api"]
+REDIS_GROUPS = {"orchestration", "api"}
+
+
+def peak_rss_mb() -> float:
+    # 리눅스에서 ru_maxrss 단위는 KB (그룹별로 별도 프로세스에서 실행하므로 그룹 단위 최대치)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(name: str, fn, iterations: int, warmup: int = 3) -> dict:
+    for _ in range(warmup):
+        fn()
+
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - start
+
+    result = {
+        "name": name,
+        "iterations": iterations,
+        "ops_per_sec": round(iterations / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+    print(f"  {name:<32} {result['ops_per_sec']:>10.1f} ops/s  p95={result['p95_ms']:.2f}ms")
+    return result
+
+
+# ----------------------------------------------------
+# Redis / 대체 모델 설치
+# ----------------------------------------------------
+
+def install_redis() -> str:
+    """fakeredis가 있으면 프로세스 내 Redis로, 없으면 REDIS_URL의 실제 서버를 사용합니다."""
+    from app import redis_client, progress
+
+    try:
+        import fakeredis
+    except ImportError:
+        redis_client.get_redis().ping()
+        return "redis"
+
+    server = fakeredis.FakeServer()
+    redis_client._CLIENT = fakeredis.FakeRedis(server=server)
+    make_async = lambda: fakeredis.aioredis.FakeRedis(server=server)
+    redis_client.get_async_redis = make_async
+    progress.get_async_redis = make_async
+    return "fakeredis"
+
+
+def install_models():
+    # step 비용 0: 파이프라인 호출을 둘러싼 래퍼/캐시 오버헤드만 측정
+    install_standin_models(flux_step_base_ms=0, flux_step_per_sample_ms=0)
+
+
+# ----------------------------------------------------
+# 벤치마크 그룹
+# ----------------------------------------------------
+
+def bench_codec(args) -> list:
+    from app.tools import image_ingest
+
+    image = make_test_image(args.width, args.height)
+    data = jpeg_bytes(image)
+    encoded = base64.b64encode(data)
+    result_image = make_test_image(1024, 1024, seed=1)
+
+    def encode_result():
+        buf = io.BytesIO()
+        result_image.save(buf, format="JPEG")
+
+    return [
+        measure("codec/base64_encode", lambda: base64.b64encode(data), args.iterations * 10),
+        measure("codec/base64_decode", lambda: base64.b64decode(encoded), args.iterations * 10),
+        measure("codec/jpeg_decode_full", lambda: Image.open(io.BytesIO(data)).convert("RGB"), args.iterations),
+        measure("codec/ingest_decode", lambda: image_ingest.decode_image(io.BytesIO(data)), args.iterations),
+        measure("codec/jpeg_encode_result", encode_result, args.iterations),
+    ]
+
+
+def bench_fanout(args) -> list:
+    from app.progress import ProgressHub
+
+    results = []
+    for watchers in (1, 10, 100):
+        hub = ProgressHub()
+        queues = [hub.subscribe("job") for _ in range(watchers)]
+        message = {"status": "PROGRESS", "event": "step_finished", "job_id": "job", "step": 1}
+
+        def dispatch():
+            hub.dispatch("job", message)
+            for queue in queues:
+                queue.get_nowait()
+
+        results.append(measure(f"fanout/dispatch_{watchers}_watchers", dispatch, args.iterations * 10))
+    return results
+
+
+def bench_tools(args) -> list:
+    from app.tools import vqa_tool, evaluation_tool
+    from app.tools.sd_tool import run_inpainting as run_img2img
+
+    install_models()
+    image = make_test_image(512, 512)
+    variants = [make_test_image(256, 256, seed=i) for i in range(8)]
+    questions = ["what is the animal doing?", "is the person smiling?"] * 4
+
+    def clip_uncached():
+        evaluation_tool._IMAGE_CACHE.clear()
+        evaluation_tool.calculate_clip_scores(variants, ["a dog"])
+
+    return [
+        measure("tools/run_vqa", lambda: vqa_tool.run_vqa(image, questions[0]), args.iterations),
+        measure("tools/run_vqa_batch8", lambda: vqa_tool.run_vqa_batch(variants, questions), args.iterations),
+        measure("tools/clip_score_cached", lambda: evaluation_tool.calculate_clip_score(image, "a dog"), args.iterations),
+        measure("tools/clip_scores_uncached8", clip_uncached, args.iterations),
+        measure("tools/run_img2img_wrapper", lambda: run_img2img(image, None, "change the cat to a dog"), args.iterations),
+    ]
+
+
+def bench_orchestration(args) -> list:
+    from app import tasks
+    from app.blob_store import get_blob_store
+
+    install_models()
+    planner = StubPlanner()
+    tasks.get_planner_client = lambda: planner
+    image_ref = get_blob_store().put(jpeg_bytes(make_test_image(args.width, args.height)))
+
+    def run(prompt):
+        # 평가까지 태스크 안에서 끝나야 기존 측정과 비교 가능하므로 동기 평가
+        result = tasks.run_agent_task.apply(
+            kwargs={"prompt": prompt, "image_ref": image_ref, "evaluation": "sync"}
+        ).get()
+        assert result["status"] == "success", result
+
+    return [
+        measure("orchestration/vqa_task", lambda: run("what is the animal doing?"), args.iterations),
+        measure("orchestration/img2img_task", lambda: run("change the cat to a dog"), args.iterations),
+    ]
+
+
+def bench_api(args) -> list:
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.blob_store import get_blob_store, parse_ref
+
+    client = TestClient(app)
+    data = jpeg_bytes(make_test_image(args.width, args.height))
+    image_ref = get_blob_store().put(data)
+    image_b64 = base64.b64encode(data).decode()
+
+    def post(payload):
+        response = client.post("/run", json=payload)
+        assert response.status_code == 200, response.text
+
+    return [
+        measure("api/run_image_ref", lambda: post({"prompt": "what is this?", "image_ref": image_ref, "fresh": True}),
+                args.iterations),
+        measure("api/run_base64", lambda: post({"prompt": "what is this?", "image_data": image_b64, "fresh": True}),
+                args.iterations),
+        measure("api/get_blob", lambda: client.get(f"/blobs/{parse_ref(image_ref)}").content, args.iterations),
+        measure("api/admission_status", lambda: client.get("/admission/status").json(), args.iterations),
+    ]
+
+
+BENCHES = {
+    "codec": bench_codec,
+    "fanout": bench_fanout,
+    "tools": bench_tools,
+    "orchestration": bench_orchestration,
+    "api": bench_api,
+}
+
+
+def run_group(group: str, args) -> list:
+    print(f"[{group}]")
+    if group in REDIS_GROUPS:
+        try:
+            print(f"  redis: {install_redis()}")
+        except Exception as e:
+            print(f"  건너뜀: fakeredis가 없고 Redis({os.environ['REDIS_URL']})에도 연결할 수 없습니다. ({e})")
+            return []
+    return BENCHES[group](args)
+
+
+def run_isolated(group: str, args) -> list:
+    """그룹마다 별도 프로세스에서 실행해서 peak RSS와 캐시 상태가 서로 섞이지 않게 합니다."""
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+        output = f.name
+    command = [sys.executable, os.path.abspath(__file__), "--only", group, "--child-output", output,
+               "--iterations", str(args.iterations), "--width", str(args.width), "--height", str(args.height)]
+    completed = subprocess.run(command)
+    if completed.returncode != 0:
+        print(f"[{group}] 실패 (exit {completed.returncode})")
+        return []
+    with open(output) as f:
+        return json.load(f)
+
+
+# ----------------------------------------------------
+# baseline 비교
+# ----------------------------------------------------
+
+def compare(report: dict, baseline: dict, args) -> list:
+    rows = []
+    regressions = []
+    for name, current in report["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        changes = {
+            "ops_per_sec": (base["ops_per_sec"] - current["ops_per_sec"]) / base["ops_per_sec"],
+            "p95_ms": (current["p95_ms"] - base["p95_ms"]) / max(base["p95_ms"], 1e-9),
+            "peak_rss_mb": (current["peak_rss_mb"] - base["peak_rss_mb"]) / max(base["peak_rss_mb"], 1e-9),
+        }
+        limits = {
+            "ops_per_sec": args.max_throughput_drop,
+            "p95_ms": args.max_latency_increase,
+            "peak_rss_mb": args.max_rss_increase,
+        }
+        failed = [metric for metric, change in changes.items() if change > limits[metric]]
+        if failed:
+            regressions.append((name, failed))
+        rows.append({
+            "Benchmark": name,
+            "ops/s": f"{base['ops_per_sec']} -> {current['ops_per_sec']}",
+            "p95(ms)": f"{base['p95_ms']} -> {current['p95_ms']}",
+            "RSS(MB)": f"{base['peak_rss_mb']} -> {current['peak_rss_mb']}",
+            "Status": "REGRESSION(" + ",".join(failed) + ")" if failed else "ok",
+        })
+
+    if rows:
+        print("\n📊 [Baseline 비교]")
+        print(pd.DataFrame(rows).to_string(index=False))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--groups", default=",".join(GROUPS))
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--width", type=int, default=1600)
+    parser.add_argument("--height", type=int, default=1200)
+    parser.add_argument("--output", default=DEFAULT_REPORT)
+    parser.add_argument("--baseline", help="비교할 baseline JSON (회귀가 있으면 exit 1)")
+    parser.add_argument("--save-baseline", help="이번 결과를 baseline으로 저장할 경로")
+    parser.add_argument("--max-throughput-drop", type=float, default=0.15)
+    parser.add_argument("--max-latency-increase", type=float, default=0.20)
+    parser.add_argument("--max-rss-increase", type=float, default=0.20)
+    parser.add_argument("--no-isolate", action="store_true", help="모든 그룹을 한 프로세스에서 실행")
+    parser.add_argument("--only", help=argparse.SUPPRESS)
+    parser.add_argument("--child-output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.only:
+        with open(args.child_output, "w") as f:
+            json.dump(run_group(args.only, args), f)
+        return
+
+    results = []
+    for group in args.groups.split(","):
+        results += run_group(group, args) if args.no_isolate else run_isolated(group, args)
+
+    report = {
+        "meta": {
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "iterations": args.iterations,
+            "image_size": [args.width, args.height],
+        },
+        "results": {r["name"]: r for r in results},
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n리포트 저장 완료: {args.output}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"baseline 저장 완료: {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args)
+        if regressions:
+            print(f"\n❌ 성능 회귀 {len(regressions)}건: {regressions}")
+            sys.exit(1)
+        print("\n✅ baseline 대비 회귀 없음")
+
+
+if __name__ == "__main__":
+    main()
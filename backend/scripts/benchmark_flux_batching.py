@@ -0,0 +1,115 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
+
+os.environ.setdefault("PROMPT_CACHE_DISK", "0")
+
+import argparse
+import random
+import threading
+import time
+import pandas as pd
+import matplotlib.pyplot as plt
+from PIL import Image
+
+from benchmark import TEST_CASES, prepare_images, IMAGE_DIR, RESULT_DIR
+from standins import FakeFlux2Pipeline
+from app.planner_client import percentile
+from app.tools.flux_batcher import FluxBatchScheduler
+from app.tools.sd_tool import Flux2ImageGenerator
+
+# heavy 요청을 일정한 도착률(Poisson)로 넣으면서 최대 배치 크기/대기 시간별
+# 처리량과 지연 시간 곡선을 측정합니다. (CPU 대체 파이프라인 사용)
+
+
+def load_requests(n: int, size: int, seed: int) -> list:
+    prepare_images()
+    rng = random.Random(seed)
+    heavy_cases = [c for c in TEST_CASES if c["type"] != "VQA"]
+    images = {c["image"]: Image.open(os.path.join(IMAGE_DIR, c["image"])).convert("RGB").resize((size, size))
+              for c in heavy_cases}
+    cases = [rng.choice(heavy_cases) for _ in range(n)]
+    return [(images[c["image"]], c["prompt"]) for c in cases]
+
+
+def run_open_loop(scheduler: FluxBatchScheduler, requests: list, rate: float, seed: int) -> dict:
+    rng = random.Random(seed)
+    latencies = []
+    finished = []
+    lock = threading.Lock()
+
+    def client(image, prompt):
+        start = time.perf_counter()
+        scheduler.submit(image, prompt).result()
+        end = time.perf_counter()
+        with lock:
+            latencies.append(end - start)
+            finished.append(end)
+
+    threads = []
+    begin = time.perf_counter()
+    for image, prompt in requests:
+        thread = threading.Thread(target=client, args=(image, prompt))
+        thread.start()
+        threads.append(thread)
+        time.sleep(rng.expovariate(rate))
+    for thread in threads:
+        thread.join()
+
+    sizes = list(scheduler.batch_sizes)
+    return {
+        "Throughput(req/s)": round(len(requests) / (max(finished) - begin), 2),
+        "p50(s)": round(percentile(latencies, 50), 3),
+        "p99(s)": round(percentile(latencies, 99), 3),
+        "AvgBatch": round(sum(sizes) / len(sizes), 2),
+    }
+
+
+def run_flux_batching_benchmark(args):
+    generator = Flux2ImageGenerator()
+    generator.pipeline = FakeFlux2Pipeline(args.step_base_ms, args.step_per_sample_ms)
+    requests = load_requests(args.requests, args.size, args.seed)
+
+    rows = []
+    for max_batch in [int(b) for b in args.batch_sizes.split(",")]:
+        for max_wait in [float(w) for w in args.waits.split(",")]:
+            scheduler = FluxBatchScheduler(generator.run_batch, max_batch=max_batch, max_wait_ms=max_wait)
+            result = run_open_loop(scheduler, requests, args.rate, args.seed)
+            rows.append({"MaxBatch": max_batch, "MaxWait(ms)": max_wait, **result})
+            print(rows[-1])
+
+    df = pd.DataFrame(rows)
+    print(f"\n📊 [FLUX Batching Benchmark] requests={args.requests}, rate={args.rate}/s")
+    print(df.to_string(index=False))
+
+    if not os.path.exists(RESULT_DIR):
+        os.makedirs(RESULT_DIR)
+    df.to_csv(os.path.join(RESULT_DIR, "flux_batching_report.csv"), index=False)
+
+    # 처리량 vs 지연 시간 곡선
+    plt.figure(figsize=(8, 5))
+    for max_wait, group in df.groupby("MaxWait(ms)"):
+        plt.plot(group["Throughput(req/s)"], group["p99(s)"], marker="o", label=f"max_wait={max_wait}ms")
+        for _, row in group.iterrows():
+            plt.annotate(f"b={row['MaxBatch']}", (row["Throughput(req/s)"], row["p99(s)"]))
+    plt.xlabel("Throughput (req/s)")
+    plt.ylabel("p99 Latency (s)")
+    plt.title("FLUX Cross-Request Batching: Throughput vs Latency")
+    plt.grid(True, linestyle="--")
+    plt.legend()
+    plt.savefig(os.path.join(RESULT_DIR, "flux_batching_curve.png"))
+    print(f"\n리포트 저장 완료: {RESULT_DIR}/flux_batching_report.csv, flux_batching_curve.png")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--rate", type=float, default=4.0, help="초당 도착 요청 수 (Poisson)")
+    parser.add_argument("--batch-sizes", default="1,2,4,8")
+    parser.add_argument("--waits", default="50,200")
+    parser.add_argument("--size", type=int, default=256)
+    parser.add_argument("--step-base-ms", type=float, default=40)
+    parser.add_argument("--step-per-sample-ms", type=float, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    run_flux_batching_benchmark(args)
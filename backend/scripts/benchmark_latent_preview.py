@@ -0,0 +1,122 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
+
+# 배치 대기 시간이 섞이지 않도록 단일 요청 경로로 측정
+os.environ["FLUX_MAX_BATCH"] = "1"
+os.environ.setdefault("PROMPT_CACHE_DISK", "0")
+
+import argparse
+import time
+import pandas as pd
+import torch
+
+from benchmark import RESULT_DIR
+
+# diffusion 도중 latent 미리보기를 켰을 때의 생성 지연 시간 증가와 미리보기 수/크기를 측정합니다.
+#   python scripts/benchmark_latent_preview.py --sizes 512,1024 --steps 8,28
+#   python scripts/benchmark_latent_preview.py --calibrate   (실제 FLUX.2로 투영 행렬 보정 후 저장)
+# 기본은 CPU 대체 파이프라인(step 지연을 --step-ms로 모사)이므로, 여기서 나오는 오버헤드는
+# 투영 + JPEG 인코딩 비용만 반영합니다.
+
+
+def run_case(generator, image, steps: int, every_n: int, repeat: int) -> dict:
+    from app.tools.latent_preview import LatentPreviewer
+
+    latencies = []
+    previewer = None
+    for i in range(repeat):
+        previewer = LatentPreviewer(lambda **fields: None, every_n=every_n) if every_n else None
+        start = time.perf_counter()
+        generator.run_img2img(image, f"a watercolor painting {i}", num_inference_steps=steps, preview=previewer)
+        latencies.append(time.perf_counter() - start)
+
+    row = {"Latency(mean s)": round(sum(latencies) / len(latencies), 4)}
+    if previewer is not None:
+        stats = previewer.stats(prefix="")
+        row.update({
+            "Previews": stats["count"],
+            "Skipped": stats["skipped"],
+            "Preview sec": round(stats["sec"], 4),
+            "Preview KB": round(stats["bytes"] / 1024, 1),
+        })
+    return row
+
+
+def run_benchmark(args):
+    from standins import install_standin_models, make_test_image
+    from app.tools.sd_tool import Flux2ImageGenerator
+
+    install_standin_models(flux_step_base_ms=args.step_ms)
+    generator = Flux2ImageGenerator()
+
+    rows = []
+    for size in [int(s) for s in args.sizes.split(",")]:
+        image = make_test_image(size, size)
+        for steps in [int(s) for s in args.steps.split(",")]:
+            baseline = run_case(generator, image, steps, 0, args.repeat)["Latency(mean s)"]
+            for every_n in [int(n) for n in args.every_n.split(",")]:
+                row = {"Size": size, "Steps": steps, "Every N": every_n, "Baseline(s)": baseline}
+                row.update(run_case(generator, image, steps, every_n, args.repeat))
+                row["Overhead(%)"] = round(100 * (row["Latency(mean s)"] - baseline) / baseline, 2)
+                rows.append(row)
+                print(row)
+
+    df = pd.DataFrame(rows)
+    print("\n📊 [Latent Preview] 미리보기 간격별 지연 시간 오버헤드")
+    print(df.to_string(index=False))
+
+    os.makedirs(RESULT_DIR, exist_ok=True)
+    out_path = os.path.join(RESULT_DIR, "latent_preview_benchmark.csv")
+    df.to_csv(out_path, index=False)
+    print(f"\n리포트 저장 완료: {out_path}")
+
+
+def run_calibration(args):
+    """실제 파이프라인의 마지막 step latent와 VAE 디코딩 결과로 투영 행렬을 맞춰 저장합니다."""
+    from standins import make_test_image
+    from app.tools.latent_preview import fit_projection, PREVIEW_FACTORS_PATH
+    from app.tools.sd_tool import Flux2ImageGenerator
+
+    generator = Flux2ImageGenerator()
+    pipe = generator.load_pipeline()
+    captured = {}
+
+    def capture(pipe, step, timestep, callback_kwargs):
+        captured["latents"] = callback_kwargs["latents"]
+        return callback_kwargs
+
+    fits = []
+    for seed in range(args.calibration_images):
+        image = make_test_image(args.calibration_size, args.calibration_size, seed=seed)
+        result = pipe(
+            prompt="a detailed colorful photograph", image=image, num_inference_steps=args.calibration_steps,
+            height=image.height, width=image.width, callback_on_step_end=capture,
+        ).images[0]
+        fits.append(fit_projection(captured["latents"], result))
+
+    factors = {
+        "weight": torch.stack([f["weight"] for f in fits]).mean(0),
+        "bias": torch.stack([f["bias"] for f in fits]).mean(0),
+    }
+    os.makedirs(os.path.dirname(PREVIEW_FACTORS_PATH), exist_ok=True)
+    torch.save(factors, PREVIEW_FACTORS_PATH)
+    print(f"투영 행렬 저장 완료: {PREVIEW_FACTORS_PATH} ({tuple(factors['weight'].shape)})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="512,1024")
+    parser.add_argument("--steps", default="8,28")
+    parser.add_argument("--every-n", default="1,2,4", help="미리보기 간격 (step)")
+    parser.add_argument("--step-ms", type=float, default=40, help="대체 파이프라인의 step당 지연 (ms)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--calibrate", action="store_true")
+    parser.add_argument("--calibration-images", type=int, default=4)
+    parser.add_argument("--calibration-size", type=int, default=512)
+    parser.add_argument("--calibration-steps", type=int, default=8)
+    args = parser.parse_args()
+
+    if args.calibrate:
+        run_calibration(args)
+    else:
+        run_benchmark(args)
@@ -0,0 +1,166 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
+
+import argparse
+import json
+import subprocess
+import time
+import pandas as pd
+import psutil
+
+from benchmark import RESULT_DIR
+
+# 워커마다 VQA/CLIP을 직접 올리는 기존 구성(local) vs 모델 서버 하나를 공유하는 구성(shared)의
+# 워커별 RSS, 전체 RSS, 전체 처리량을 비교합니다.
+#   python scripts/benchmark_model_server.py --workers 1,2,4 --requests 50
+#   python scripts/benchmark_model_server.py --real-models   (실제 ViLT/CLIP 가중치 사용)
+# 각 워커는 solo 워커처럼 요청을 한 건씩 보냅니다. (VQA와 CLIP 점수를 번갈아 호출)
+
+SCRIPT = os.path.abspath(__file__)
+
+
+def _setup_models(args, served: bool):
+    # 모듈 상수(MODEL_SERVER_SOCKET)를 읽기 전에 환경 변수를 맞춰야 함
+    if served:
+        os.environ["MODEL_SERVER_SOCKET"] = args.socket
+    else:
+        os.environ.pop("MODEL_SERVER_SOCKET", None)
+    if not args.real_models and not served:
+        from standins import install_standin_models
+        install_standin_models()
+
+
+def run_server(args):
+    _setup_models(args, served=False)
+    from app import model_server
+    model_server.serve(args.socket)
+
+
+def run_worker(args):
+    _setup_models(args, served=args.layout == "shared")
+    from standins import make_test_image
+    from app.tools.vqa_tool import run_vqa
+    from app.tools.evaluation_tool import calculate_clip_score
+    from app.tools.image_ingest import vqa_size
+
+    image = make_test_image(seed=args.seed)
+    image = image.resize(vqa_size(*image.size))
+
+    # 첫 호출에서 (local이면) 모델 로드, (shared면) 연결 수립
+    load_start = time.time()
+    run_vqa(image, "what is in the picture?")
+    calculate_clip_score(image, "a photo")
+    load_sec = time.time() - load_start
+
+    # 모든 워커가 같은 시각에 부하를 시작하도록 대기
+    while time.time() < args.start_at:
+        time.sleep(0.01)
+
+    start = time.time()
+    for i in range(args.requests):
+        if i % 2 == 0:
+            run_vqa(image, f"what color is object {i}?")
+        else:
+            calculate_clip_score(image, f"a photo of thing {i}")
+    elapsed = time.time() - start
+
+    print(json.dumps({
+        "rss_mb": psutil.Process().memory_info().rss / 1024 ** 2,
+        "load_sec": load_sec,
+        "elapsed": elapsed,
+        "requests": args.requests,
+    }), flush=True)
+
+
+def _spawn(args, role: str, **extra) -> subprocess.Popen:
+    cmd = [sys.executable, SCRIPT, "--role", role, "--socket", args.socket,
+           "--requests", str(args.requests)]
+    if args.real_models:
+        cmd.append("--real-models")
+    for key, value in extra.items():
+        cmd += [f"--{key.replace('_', '-')}", str(value)]
+    stdout = subprocess.PIPE if role == "worker" else subprocess.DEVNULL
+    return subprocess.Popen(cmd, stdout=stdout, text=True)
+
+
+def _wait_for_socket(path: str, server: subprocess.Popen, timeout: float = 600):
+    deadline = time.time() + timeout
+    while not os.path.exists(path):
+        if server.poll() is not None or time.time() > deadline:
+            raise RuntimeError("모델 서버가 시작되지 않았습니다.")
+        time.sleep(0.2)
+
+
+def run_layout(args, layout: str, n_workers: int) -> dict:
+    server = None
+    if layout == "shared":
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+        server = _spawn(args, "server")
+        _wait_for_socket(args.socket, server)
+
+    try:
+        start_at = time.time() + args.startup_grace
+        workers = [_spawn(args, "worker", layout=layout, start_at=start_at, seed=i) for i in range(n_workers)]
+        reports = []
+        for proc in workers:
+            out, _ = proc.communicate()
+            reports.append(json.loads(out.strip().splitlines()[-1]))
+        server_rss = psutil.Process(server.pid).memory_info().rss / 1024 ** 2 if server else 0
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    wall = max(r["elapsed"] for r in reports)
+    worker_rss = [r["rss_mb"] for r in reports]
+    total = sum(r["requests"] for r in reports)
+    return {
+        "Layout": layout,
+        "Workers": n_workers,
+        "Worker RSS(mean MB)": round(sum(worker_rss) / len(worker_rss), 1),
+        "Server RSS(MB)": round(server_rss, 1),
+        "Total RSS(MB)": round(sum(worker_rss) + server_rss, 1),
+        "First call(mean s)": round(sum(r["load_sec"] for r in reports) / len(reports), 3),
+        "Throughput(req/s)": round(total / wall, 2),
+    }
+
+
+def run_benchmark(args):
+    rows = []
+    for n_workers in [int(n) for n in args.workers.split(",")]:
+        for layout in ("local", "shared"):
+            row = run_layout(args, layout, n_workers)
+            rows.append(row)
+            print(row)
+
+    df = pd.DataFrame(rows)
+    print("\n📊 [Model Server] 워커 수별 RSS / 처리량 비교")
+    print(df.to_string(index=False))
+
+    os.makedirs(RESULT_DIR, exist_ok=True)
+    out_path = os.path.join(RESULT_DIR, "model_server_benchmark.csv")
+    df.to_csv(out_path, index=False)
+    print(f"\n리포트 저장 완료: {out_path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--role", default="bench", choices=["bench", "server", "worker"])
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--requests", type=int, default=50, help="워커당 요청 수")
+    parser.add_argument("--socket", default="/tmp/agent-model-server-bench.sock")
+    parser.add_argument("--real-models", action="store_true")
+    parser.add_argument("--startup-grace", type=float, default=30, help="워커 모델 로드를 기다리는 시간 (초)")
+    # worker 전용
+    parser.add_argument("--layout", default="local", choices=["local", "shared"])
+    parser.add_argument("--start-at", type=float, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.role == "server":
+        run_server(args)
+    elif args.role == "worker":
+        run_worker(args)
+    else:
+        run_benchmark(args)
@@ -0,0 +1,86 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
+
+# 네트워크 없이 비교할 수 있도록 wandb는 offline 모드로 실행
+os.environ.setdefault("WANDB_MODE", "offline")
+
+import argparse
+import time
+import uuid
+import pandas as pd
+from PIL import Image
+
+from benchmark import RESULT_DIR
+from app.planner_client import percentile
+from app.telemetry import Telemetry
+
+# 태스크 한 건이 텔레메트리에 쓰는 시간(태스크 스레드 기준)을
+# 기존 동기 wandb 호출과 백그라운드 exporter 방식으로 비교합니다.
+# run_agent_task의 호출 패턴: init -> 계획 시간 -> 스텝 결과 이미지 + 스텝 시간 -> 최종 지표 -> finish
+
+
+def simulate_sync_wandb(image) -> float:
+    import wandb
+
+    start = time.perf_counter()
+    wandb.init(project="telemetry_benchmark", name="sync", reinit=True)
+    wandb.log({"timer/llm_planning": 1.0})
+    wandb.log({"step_0_result": wandb.Image(image)})
+    wandb.log({"timer/run_img2img": 17.0})
+    wandb.log({"timer/total_latency": 18.0, "evaluation/clip_score": 29.1})
+    wandb.finish()
+    return time.perf_counter() - start
+
+
+def simulate_exporter(telemetry: Telemetry, image) -> float:
+    run_id = uuid.uuid4().hex
+    start = time.perf_counter()
+    telemetry.start_run(run_id, "background")
+    telemetry.log(run_id, {"timer/llm_planning": 1.0})
+    telemetry.log(run_id, {"step_0_result": image})
+    telemetry.log(run_id, {"timer/run_img2img": 17.0})
+    telemetry.log(run_id, {"timer/total_latency": 18.0, "evaluation/clip_score": 29.1})
+    telemetry.finish(run_id)
+    return time.perf_counter() - start
+
+
+def summarize(mode: str, samples: list) -> dict:
+    return {
+        "Mode": mode,
+        "Mean(ms)": round(sum(samples) / len(samples) * 1000, 3),
+        "p50(ms)": round(percentile(samples, 50) * 1000, 3),
+        "p99(ms)": round(percentile(samples, 99) * 1000, 3),
+    }
+
+
+def run_telemetry_benchmark(tasks: int, modes: list):
+    image = Image.new("RGB", (1024, 1024), (80, 120, 160))
+    rows = []
+
+    for mode in modes:
+        if mode == "sync-wandb":
+            samples = [simulate_sync_wandb(image) for _ in range(tasks)]
+        else:
+            telemetry = Telemetry(backend=mode)
+            samples = [simulate_exporter(telemetry, image) for _ in range(tasks)]
+            if telemetry.exporter is not None:
+                telemetry.exporter.close()
+        rows.append(summarize(mode, samples))
+
+    df = pd.DataFrame(rows)
+    print(f"\n📊 [Telemetry Hot-Path Benchmark] tasks={tasks}")
+    print(df.to_string(index=False))
+
+    if not os.path.exists(RESULT_DIR):
+        os.makedirs(RESULT_DIR)
+    df.to_csv(os.path.join(RESULT_DIR, "telemetry_report.csv"), index=False)
+    print(f"\n리포트 저장 완료: {RESULT_DIR}/telemetry_report.csv")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=20)
+    parser.add_argument("--modes", default="sync-wandb,wandb,jsonl,off")
+    args = parser.parse_args()
+
+    run_telemetry_benchmark(args.tasks, args.modes.split(","))
@@ -0,0 +1,125 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
+
+import argparse
+import base64
+import time
+import pandas as pd
+from celery import Celery
+from kombu.utils.json import dumps
+
+from benchmark import IMAGE_SOURCES, prepare_images, IMAGE_DIR, RESULT_DIR
+from app.blob_store import get_blob_store
+
+# 이미지 전송 방식 비교 벤치마크
+# - before: base64 문자열을 Celery 메시지/결과 백엔드에 직접 싣는 방식
+# - after : blob 저장소에 raw bytes를 한 번 쓰고 메시지에는 참조만 싣는 방식
+# 기본 모드는 브로커 메시지 크기만 측정하고, --live 옵션을 주면 실행 중인 워커로
+# 두 방식을 번갈아 보내 end-to-end 지연 시간을 함께 측정합니다.
+# - 매 실행마다 프롬프트를 달리해서 계획 캐시가 어느 한쪽만 데우지 않도록 하고,
+#   API를 거치지 않으므로(cache_key 없음) 결과 캐시/중복 요청 합치기도 적용되지 않음
+# - 워커는 두 방식 모두 결과를 blob 참조로 돌려주므로, E2E 차이는 입력 전송 방식만의 차이입니다.
+#   결과 쪽은 실제 결과 이미지로 결과 백엔드 페이로드 크기(base64 vs 참조)를 따로 계산합니다.
+
+PROMPT = "what is the animal doing?"
+
+broker_url = os.environ.get("CELERY_BROKER_URL", "redis://localhost:6379/0")
+backend_url = os.environ.get("CELERY_RESULT_BACKEND", "redis://localhost:6379/0")
+app = Celery('tasks', broker=broker_url, backend=backend_url)
+
+
+def message_size(args, kwargs) -> int:
+    """Celery 프로토콜 2의 본문 (args, kwargs, embed)을 JSON 직렬화한 크기"""
+    body = (args, kwargs, {"callbacks": None, "errbacks": None, "chain": None, "chord": None})
+    return len(dumps(body).encode("utf-8"))
+
+
+def run_live(kwargs: dict, queue: str) -> tuple:
+    start = time.time()
+    task = app.send_task('app.tasks.run_agent_task', kwargs=kwargs, queue=queue)
+    result = task.get(timeout=600)
+    image = None
+    if result.get("type") == "image":
+        # 결과 이미지를 실제로 받아오는 비용까지 포함
+        image = get_blob_store().get(result["data"])
+    return time.time() - start, result, image
+
+
+def result_payload_sizes(result: dict, image: bytes) -> dict:
+    """같은 결과를 base64로 실었을 때와 참조로 실었을 때의 결과 백엔드 페이로드 크기"""
+    inline = {**result, "data": base64.b64encode(image).decode("utf-8")}
+    return {
+        "Result Before(KB)": round(len(dumps(inline).encode("utf-8")) / 1024, 1),
+        "Result After(KB)": round(len(dumps(result).encode("utf-8")) / 1024, 1),
+    }
+
+
+def run_transport_benchmark(live: bool, repeat: int, queue: str):
+    prepare_images()
+    store = get_blob_store()
+    rows = []
+
+    for filename in IMAGE_SOURCES:
+        img_path = os.path.join(IMAGE_DIR, filename)
+        if not os.path.exists(img_path):
+            print(f"파일 없음: {filename} (Skip)")
+            continue
+
+        with open(img_path, "rb") as f:
+            raw = f.read()
+
+        encode_start = time.perf_counter()
+        image_data = base64.b64encode(raw).decode("utf-8")
+        encode_sec = time.perf_counter() - encode_start
+
+        put_start = time.perf_counter()
+        image_ref = store.put(raw)
+        put_sec = time.perf_counter() - put_start
+
+        before_kwargs = {"prompt": PROMPT, "image_data": image_data}
+        after_kwargs = {"prompt": PROMPT, "image_ref": image_ref}
+        modes = {"Before": before_kwargs, "After": after_kwargs}
+
+        row = {
+            "Image": filename,
+            "Raw(KB)": round(len(raw) / 1024, 1),
+            "Msg Before(KB)": round(message_size([], before_kwargs) / 1024, 1),
+            "Msg After(B)": message_size([], after_kwargs),
+            "Encode Before(ms)": round(encode_sec * 1000, 2),
+            "Put After(ms)": round(put_sec * 1000, 2),
+        }
+
+        if live:
+            latencies = {mode: [] for mode in modes}
+            for i in range(repeat):
+                # 번갈아 실행하고 매번 순서를 바꿔서 워커 예열/캐시 상태가 한쪽에만 유리하지 않도록
+                order = list(modes) if i % 2 == 0 else list(modes)[::-1]
+                for mode in order:
+                    kwargs = {**modes[mode], "prompt": f"{PROMPT} (run {i} {mode.lower()} {time.time_ns()})"}
+                    latency, result, image = run_live(kwargs, queue)
+                    latencies[mode].append(latency)
+                    if image is not None:
+                        row.update(result_payload_sizes(result, image))
+            for mode, values in latencies.items():
+                row[f"E2E {mode}(s)"] = round(sum(values) / len(values), 3)
+
+        rows.append(row)
+
+    df = pd.DataFrame(rows)
+    print("\n📊 [Transport Benchmark]")
+    print(df.to_string(index=False))
+
+    if not os.path.exists(RESULT_DIR):
+        os.makedirs(RESULT_DIR)
+    df.to_csv(os.path.join(RESULT_DIR, "transport_report.csv"), index=False)
+    print(f"\n리포트 저장 완료: {RESULT_DIR}/transport_report.csv")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--live", action="store_true", help="실행 중인 워커로 end-to-end 지연 시간 측정")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--queue", default="light_tasks")
+    args = parser.parse_args()
+
+    run_transport_benchmark(args.live, args.repeat, args.queue)
@@ -0,0 +1,101 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
+
+# CPU 벤치마크: GPU가 있어도 사용하지 않음
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")
+
+import argparse
+import threading
+import time
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+from benchmark import TEST_CASES, prepare_images, IMAGE_DIR, RESULT_DIR
+from app.planner_client import percentile
+from app.tools.vqa_tool import load_vqa_pipeline, VQABatcher
+
+# 한 건씩 처리하는 기존 경로 vs 마이크로 배칭 경로의 처리량/지연 시간 비교
+
+
+def load_requests(n: int) -> list:
+    prepare_images()
+    vqa_cases = [c for c in TEST_CASES if c["type"] == "VQA"]
+    images = {c["image"]: Image.open(os.path.join(IMAGE_DIR, c["image"])).convert("RGB") for c in vqa_cases}
+    return [(images[vqa_cases[i % len(vqa_cases)]["image"]], vqa_cases[i % len(vqa_cases)]["prompt"])
+            for i in range(n)]
+
+
+def run_load(requests, concurrency: int, call) -> dict:
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(item):
+        start = time.perf_counter()
+        call(*item)
+        with lock:
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, requests))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "Throughput(req/s)": round(len(requests) / elapsed, 2),
+        "p50(ms)": round(percentile(latencies, 50) * 1000, 1),
+        "p99(ms)": round(percentile(latencies, 99) * 1000, 1),
+    }
+
+
+def run_vqa_batching_benchmark(n: int, concurrency: int, windows: list, batch_sizes: list):
+    pipe = load_vqa_pipeline()
+    requests = load_requests(n)
+
+    # warm-up
+    pipe(image=requests[0][0], question=requests[0][1], top_k=1)
+
+    rows = []
+
+    # 기존 경로: 모델 하나를 여러 요청이 번갈아 사용 (gevent/solo 워커와 동일하게 직렬 실행)
+    serial_lock = threading.Lock()
+
+    def single(image, question):
+        with serial_lock:
+            return pipe(image=image, question=question, top_k=1)[0]["answer"]
+
+    rows.append({"Mode": "one-at-a-time", "Window(ms)": "-", "MaxBatch": 1,
+                 **run_load(requests, concurrency, single)})
+
+    for window in windows:
+        for max_batch in batch_sizes:
+            batcher = VQABatcher(window_ms=window, max_batch=max_batch)
+            result = run_load(requests, concurrency, lambda img, q: batcher.submit(img, q).result())
+            sizes = list(batcher.batch_sizes)
+            rows.append({"Mode": "batched", "Window(ms)": window, "MaxBatch": max_batch, **result,
+                         "AvgBatch": round(sum(sizes) / len(sizes), 2) if sizes else 0})
+
+    df = pd.DataFrame(rows)
+    print(f"\n📊 [VQA Batching Benchmark] requests={n}, concurrency={concurrency}, device=CPU")
+    print(df.to_string(index=False))
+
+    if not os.path.exists(RESULT_DIR):
+        os.makedirs(RESULT_DIR)
+    df.to_csv(os.path.join(RESULT_DIR, "vqa_batching_report.csv"), index=False)
+    print(f"\n리포트 저장 완료: {RESULT_DIR}/vqa_batching_report.csv")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--windows", default="5,10,20", help="배칭 시간 창(ms), 쉼표 구분")
+    parser.add_argument("--batch-sizes", default="4,8", help="최대 배치 크기, 쉼표 구분")
+    args = parser.parse_args()
+
+    run_vqa_batching_benchmark(
+        args.requests,
+        args.concurrency,
+        [float(w) for w in args.windows.split(",")],
+        [int(b) for b in args.batch_sizes.split(",")],
+    )
@@ -0,0 +1,242 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
+
+import argparse
+import asyncio
+import base64
+import json
+import random
+import time
+import requests
+import pandas as pd
+import websockets
+
+from benchmark import prepare_images, IMAGE_DIR, RESULT_DIR
+from app.planner_client import percentile
+from app.routing import TOOL_QUEUES, LIGHT_QUEUE
+
+# API(/run 또는 /agent/invoke)로 정해진 도착률(open-loop)에 맞춰 요청을 넣고,
+# 각 job을 /ws/{job_id}로 추적해서 대기 시간 vs 처리 시간, 큐별 처리량/꼬리 지연을 측정합니다.
+# 로컬 Redis + scripts/standin_worker.py 워커만으로도 실행할 수 있습니다.
+#   python scripts/standin_worker.py --queues heavy_tasks
+#   python scripts/standin_worker.py --queues light_tasks
+#   uvicorn app.main:app --port 8000
+#   python scripts/load_generator.py --synthetic-images --rate 2 --requests 100
+
+SCENARIOS_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(os.path.dirname(__file__)))), "evaluation_data", "scenarios.json"
+)
+
+
+def load_scenarios(path: str, synthetic: bool) -> tuple:
+    with open(path) as f:
+        data = json.load(f)
+    scenarios = data["scenarios"]
+
+    images = {}
+    if synthetic:
+        from standins import make_test_image, jpeg_bytes
+        for i, name in enumerate(sorted({s["image"] for s in scenarios})):
+            images[name] = jpeg_bytes(make_test_image(seed=i))
+    else:
+        prepare_images()
+        for name in {s["image"] for s in scenarios}:
+            with open(os.path.join(IMAGE_DIR, name), "rb") as f:
+                images[name] = f.read()
+    return scenarios, images
+
+
+def parse_mix(mix: str) -> dict:
+    weights = {}
+    for item in mix.split(","):
+        name, weight = item.split("=")
+        weights[name.strip()] = float(weight)
+    return weights
+
+
+def submit(args, scenario: dict, image: bytes) -> requests.Response:
+    if args.endpoint == "invoke":
+        return requests.post(
+            f"{args.api}/agent/invoke",
+            data={"prompt": scenario["prompt"], "fresh": str(not args.allow_cache).lower()},
+            files={"image": (scenario["image"], image, "image/jpeg")},
+            timeout=args.timeout,
+        )
+    return requests.post(
+        f"{args.api}/run",
+        json={"prompt": scenario["prompt"], "image_data": base64.b64encode(image).decode(),
+              "fresh": not args.allow_cache},
+        timeout=args.timeout,
+    )
+
+
+async def track_job(args, idx: int, scenario: dict, image: bytes, jobs: list, steps: list):
+    record = {"ID": idx, "Type": scenario["type"], "Prompt": scenario["prompt"], "submitted": time.time()}
+    jobs.append(record)
+
+    try:
+        response = await asyncio.to_thread(submit, args, scenario, image)
+    except requests.RequestException as e:
+        record.update(status="submit_error", error=str(e))
+        return
+    record["accepted"] = time.time()
+
+    if response.status_code == 429:
+        record.update(status="rejected", retry_after=float(response.headers.get("Retry-After", 0)))
+        return
+    if response.status_code != 200:
+        record.update(status="submit_error", error=response.text[:200])
+        return
+
+    body = response.json()
+    job_id = body.get("job_id") or body.get("task_id")
+    record.update(job_id=job_id, entry_queue=body.get("queue"), cached=body.get("cached"),
+                  estimated_wait=body.get("estimated_wait_sec"))
+
+    job_steps = {}
+    plan_ready = None
+    ws_url = args.api.replace("http", "ws", 1) + f"/ws/{job_id}"
+    try:
+        async with websockets.connect(ws_url, max_size=None, open_timeout=args.timeout) as ws:
+            async for raw in ws:
+                message = json.loads(raw)
+                now = time.time()
+                if message.get("status") != "PROGRESS":
+                    record.update(finished=now, status=message.get("status"))
+                    break
+
+                event = message.get("event")
+                if event == "started":
+                    record.setdefault("started", now)
+                elif event == "plan_ready":
+                    plan_ready = now
+                elif event == "step_started":
+                    job_steps[message["step"]] = {"tool": message["tool"], "start": now}
+                elif event == "step_finished" and message["step"] in job_steps:
+                    job_steps[message["step"]]["end"] = now
+    except Exception as e:
+        record.update(status="ws_error", error=str(e))
+
+    # 단계별 대기 = 단계 시작 - (앞 단계 종료 또는 계획 완료), 처리 = 단계 종료 - 시작
+    for step, info in sorted(job_steps.items()):
+        if "end" not in info:
+            continue
+        ready_at = job_steps.get(step - 1, {}).get("end") or plan_ready or record.get("started")
+        steps.append({
+            "ID": idx, "Step": step, "Tool": info["tool"],
+            "Queue": TOOL_QUEUES.get(info["tool"], LIGHT_QUEUE),
+            "wait": info["start"] - ready_at if ready_at else None,
+            "service": info["end"] - info["start"],
+            "end": info["end"],
+        })
+
+
+async def generate_load(args, scenarios: list, images: dict) -> tuple:
+    rng = random.Random(args.seed)
+    weights = parse_mix(args.mix)
+    by_type = {t: [s for s in scenarios if s["type"] == t] for t in weights}
+    missing = [t for t, cases in by_type.items() if not cases]
+    if missing:
+        raise ValueError(f"scenarios.json에 없는 시나리오 타입: {missing}")
+
+    jobs, steps, pending = [], [], []
+    types = list(weights)
+    for idx in range(args.requests):
+        scenario = rng.choice(by_type[rng.choices(types, weights=[weights[t] for t in types])[0]])
+        pending.append(asyncio.create_task(track_job(args, idx, scenario, images[scenario["image"]], jobs, steps)))
+        gap = rng.expovariate(args.rate) if args.arrival == "poisson" else 1.0 / args.rate
+        await asyncio.sleep(gap)
+
+    await asyncio.gather(*pending)
+    return jobs, steps
+
+
+def tail(values) -> dict:
+    values = [v for v in values if v is not None and v == v]
+    if not values:
+        return {"p50": None, "p95": None, "p99": None}
+    return {f"p{q}": round(percentile(values, q), 2) for q in (50, 95, 99)}
+
+
+def summarize(jobs: pd.DataFrame, steps: pd.DataFrame, wall: float) -> tuple:
+    # started 이벤트는 WebSocket 연결 전에 지나가 버리면 누락될 수 있음 (NaN으로 남김)
+    for column in ("status", "accepted", "started", "finished"):
+        if column not in jobs:
+            jobs[column] = float("nan")
+
+    done = jobs[jobs["status"] == "success"].copy()
+    done["e2e"] = done["finished"] - done["submitted"]
+    done["queue_delay"] = done["started"] - done["accepted"]
+    done["service"] = done["finished"] - done["started"]
+
+    type_rows = []
+    for job_type, group in jobs.groupby("Type"):
+        ok = done[done["Type"] == job_type]
+        type_rows.append({
+            "Type": job_type,
+            "Submitted": len(group),
+            "Success": len(ok),
+            "Rejected": int((group["status"] == "rejected").sum()),
+            "QueueDelay(mean s)": round(ok["queue_delay"].mean(), 2) if len(ok) else None,
+            "Service(mean s)": round(ok["service"].mean(), 2) if len(ok) else None,
+            **{f"E2E {k}(s)": v for k, v in tail(ok["e2e"].tolist()).items()},
+        })
+
+    queue_rows = []
+    if len(steps):
+        for queue, group in steps.groupby("Queue"):
+            queue_rows.append({
+                "Queue": queue,
+                "Steps": len(group),
+                "Throughput(steps/s)": round(len(group) / wall, 3),
+                "Wait(mean s)": round(group["wait"].dropna().mean(), 2),
+                "Service(mean s)": round(group["service"].mean(), 2),
+                **{f"Wait {k}(s)": v for k, v in tail(group["wait"].tolist()).items()},
+                **{f"Service {k}(s)": v for k, v in tail(group["service"].tolist()).items()},
+            })
+    return pd.DataFrame(type_rows), pd.DataFrame(queue_rows), done
+
+
+def run_load_generator(args):
+    scenarios, images = load_scenarios(args.scenarios, args.synthetic_images)
+    print(f"\n부하 생성 시작: {args.requests}건, {args.arrival} {args.rate}/s, mix={args.mix}, endpoint={args.endpoint}\n")
+
+    start = time.time()
+    jobs, steps = asyncio.run(generate_load(args, scenarios, images))
+    wall = time.time() - start
+
+    jobs_df = pd.DataFrame(jobs)
+    steps_df = pd.DataFrame(steps)
+    type_df, queue_df, done = summarize(jobs_df, steps_df, wall)
+
+    print(f"\n📊 [Load Test] {len(done)}/{len(jobs_df)} 성공, {wall:.1f}s, "
+          f"처리량 {len(done) / wall:.2f} jobs/s")
+    print(type_df.to_string(index=False))
+    if len(queue_df):
+        print("\n[큐별 단계 대기/처리 시간]")
+        print(queue_df.to_string(index=False))
+
+    os.makedirs(RESULT_DIR, exist_ok=True)
+    jobs_df.to_csv(os.path.join(RESULT_DIR, "load_jobs.csv"), index=False)
+    steps_df.to_csv(os.path.join(RESULT_DIR, "load_steps.csv"), index=False)
+    type_df.to_csv(os.path.join(RESULT_DIR, "load_summary.csv"), index=False)
+    queue_df.to_csv(os.path.join(RESULT_DIR, "load_queues.csv"), index=False)
+    print(f"\n리포트 저장 완료: {RESULT_DIR}/load_jobs.csv, load_steps.csv, load_summary.csv, load_queues.csv")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--api", default="http://localhost:8000")
+    parser.add_argument("--endpoint", default="run", choices=["run", "invoke"])
+    parser.add_argument("--requests", type=int, default=60)
+    parser.add_argument("--rate", type=float, default=1.0, help="초당 도착 요청 수")
+    parser.add_argument("--arrival", default="poisson", choices=["poisson", "constant"])
+    parser.add_argument("--mix", default="SD3_Easy=0.4,SD3_Hard=0.2,VQA=0.4")
+    parser.add_argument("--scenarios", default=SCENARIOS_PATH)
+    parser.add_argument("--synthetic-images", action="store_true", help="다운로드 없이 합성 이미지 사용")
+    parser.add_argument("--allow-cache", action="store_true", help="결과 캐시/중복 합치기 허용 (기본은 fresh)")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    run_load_generator(args)
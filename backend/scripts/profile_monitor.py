@@ -1,13 +1,20 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
+
 import time
 import csv
-import psutil
-import torch
 import matplotlib.pyplot as plt
-import pynvml
 import argparse
-import os
+import requests
 from datetime import datetime
 
+from app.resource_sampler import ResourceSampler, sample_to_row
+
+# 워커 내 자원 샘플러(app/resource_sampler.py)의 링 버퍼를 가져와 CSV/그래프로 저장합니다.
+#   python scripts/profile_monitor.py --source workers --last-sec 600   (API의 /metrics/resources 경유)
+#   python scripts/profile_monitor.py --source local --duration 60      (이 프로세스에서 직접 샘플링)
+# 각 샘플에는 그 시점에 실행 중이던 task id와 단계가 함께 기록됩니다.
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 LOG_DIR = os.path.join(BASE_DIR, "data", "profiling_logs")
 
@@ -15,25 +22,33 @@ if not os.path.exists(LOG_DIR):
     os.makedirs(LOG_DIR, exist_ok=True)
     print(f"폴더 생성 완료: {LOG_DIR}")
 
-def get_gpu_stats():
-    """NVIDIA GPU 상태 조회 (메모리, 사용률, 전력, 온도)"""
-    try:
-        pynvml.nvmlInit()
-        handle = pynvml.nvmlDeviceGetHandleByIndex(0)
-        mem_info = pynvml.nvmlDeviceGetMemoryInfo(handle)
-        util = pynvml.nvmlDeviceGetUtilizationRates(handle)
-        power = pynvml.nvmlDeviceGetPowerUsage(handle) / 1000.0  # mW -> W
-        temp = pynvml.nvmlDeviceGetTemperature(handle, pynvml.NVML_TEMPERATURE_GPU)
-        
-        used_mem = mem_info.used / 1024**2
-        gpu_util = util.gpu
-        return used_mem, gpu_util, power, temp
-    except Exception:
-        return 0, 0, 0, 0
+CSV_HEADER = ['Time(s)', 'GPU_Mem(MB)', 'GPU_Util(%)', 'CPU_Util(%)', 'RAM_Util(%)',
+              'GPU_Power(W)', 'GPU_Temp(C)', 'RSS(MB)', 'Task', 'Stage']
+
+def write_csv(rows, csv_path):
+    """샘플러 행(dict)을 기존 profile CSV 형식(+ RSS/Task/Stage 열)으로 저장"""
+    start = rows[0]["time"] if rows else 0
+    with open(csv_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADER)
+        for row in rows:
+            writer.writerow([
+                f"{row['time'] - start:.2f}",
+                f"{row['gpu_mem_mb'] or 0:.2f}",
+                f"{row['gpu_util'] or 0}",
+                f"{row['cpu_util']}",
+                f"{row['ram_util']}",
+                f"{row['gpu_power_w'] or 0:.2f}",
+                f"{row['gpu_temp_c'] or 0}",
+                f"{row['rss_mb']:.2f}",
+                row['task_id'],
+                row['stage'],
+            ])
 
 def plot_results(csv_path, img_path):
     """CSV 데이터를 읽어서 3단 그래프로 저장"""
     times, gpu_mems, gpu_utils, cpu_utils, ram_utils, gpu_powers, gpu_temps = [], [], [], [], [], [], []
+    stages = []
     
     try:
         with open(csv_path, 'r') as f:
@@ -46,6 +61,7 @@ def plot_results(csv_path, img_path):
                 ram_utils.append(float(row['RAM_Util(%)']))
                 gpu_powers.append(float(row['GPU_Power(W)']))
                 gpu_temps.append(float(row['GPU_Temp(C)']))
+                stages.append(row.get('Stage') or "")
     except Exception as e:
         print(f"데이터 읽기 오류: {e}")
         return
@@ -71,6 +87,18 @@ def plot_results(csv_path, img_path):
     plt.plot(times, cpu_utils, label='CPU Util (%)', color='orange', alpha=0.7)
     plt.ylabel("Utilization (%)")
     plt.ylim(0, 105)
+    # 같은 단계가 이어진 구간을 음영으로 표시 (어떤 단계가 GPU를 쓰고 있었는지)
+    colors = {}
+    segment_start = 0
+    for i in range(1, len(times) + 1):
+        if i == len(times) or stages[i] != stages[segment_start]:
+            stage = stages[segment_start]
+            if stage:
+                first = stage not in colors
+                color = colors.setdefault(stage, plt.cm.tab10(len(colors) % 10))
+                plt.axvspan(times[segment_start], times[i - 1], color=color, alpha=0.15,
+                            label=stage if first else None)
+            segment_start = i
     plt.grid(True, linestyle='--')
     plt.legend(loc='upper left')
     
@@ -92,51 +120,53 @@ def plot_results(csv_path, img_path):
     plt.savefig(img_path)
     print(f"분석 리포트 그래프 저장 완료: {img_path}")
 
-def run_monitor(duration=60):
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    csv_path = os.path.join(LOG_DIR, f"profile_{timestamp}.csv")
-    img_path = os.path.join(LOG_DIR, f"profile_{timestamp}.png")
-    
+def fetch_worker_samples(api: str, last_sec: float, task_id: str = None) -> dict:
+    response = requests.get(
+        f"{api}/metrics/resources",
+        params={"samples": "true", "last_sec": last_sec, **({"task_id": task_id} if task_id else {})},
+        timeout=10,
+    )
+    response.raise_for_status()
+    return {
+        host: reply["samples"] for host, reply in response.json()["workers"].items()
+        if "samples" in reply
+    }
+
+def sample_locally(duration: float) -> list:
+    sampler = ResourceSampler()
+    sampler.start()
     print(f"프로파일링 시작... (최대 {duration}초)")
-    print(f"로그 저장 경로: {csv_path}")
-    
-    start_time = time.time()
-    
-    with open(csv_path, 'w', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow(['Time(s)', 'GPU_Mem(MB)', 'GPU_Util(%)', 'CPU_Util(%)', 'RAM_Util(%)', 'GPU_Power(W)', 'GPU_Temp(C)'])
-        
-        try:
-            while True:
-                current_time = time.time() - start_time
-                if current_time > duration:
-                    break
-                
-                gpu_mem, gpu_util, gpu_power, gpu_temp = get_gpu_stats()
-                cpu_util = psutil.cpu_percent()
-                ram_util = psutil.virtual_memory().percent
-                
-                writer.writerow([
-                    f"{current_time:.2f}", 
-                    f"{gpu_mem:.2f}", 
-                    f"{gpu_util}", 
-                    f"{cpu_util}", 
-                    f"{ram_util}", 
-                    f"{gpu_power:.2f}", 
-                    f"{gpu_temp}"
-                ])
-                f.flush()
-                
-                time.sleep(0.5) 
-                
-        except KeyboardInterrupt:
-            print("\n프로파일링 중단 (사용자 요청)")
-            
-    plot_results(csv_path, img_path)
+    try:
+        time.sleep(duration)
+    except KeyboardInterrupt:
+        print("\n프로파일링 중단 (사용자 요청)")
+    return [sample_to_row(s) for s in sampler.snapshot()]
+
+def run_monitor(args):
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    if args.source == "local":
+        by_worker = {"local": sample_locally(args.duration)}
+    else:
+        by_worker = fetch_worker_samples(args.api, args.last_sec, args.task_id)
+        if not by_worker:
+            print("샘플을 발행한 워커가 없습니다. (RESOURCE_SAMPLER_ENABLED / RESOURCE_PUBLISH_SEC 확인)")
+
+    for worker, rows in by_worker.items():
+        name = worker.replace("@", "_").replace(":", "_")
+        csv_path = os.path.join(LOG_DIR, f"profile_{timestamp}_{name}.csv")
+        img_path = os.path.join(LOG_DIR, f"profile_{timestamp}_{name}.png")
+        write_csv(rows, csv_path)
+        print(f"로그 저장 경로: {csv_path} ({len(rows)} samples)")
+        plot_results(csv_path, img_path)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument("--duration", type=int, default=3000, help="Monitoring duration in seconds")
+    parser.add_argument("--source", default="workers", choices=["workers", "local"])
+    parser.add_argument("--api", default="http://localhost:8000")
+    parser.add_argument("--last-sec", type=float, default=600, help="workers: 가져올 최근 구간 (초)")
+    parser.add_argument("--task-id", default=None, help="workers: 특정 task 샘플만")
+    parser.add_argument("--duration", type=int, default=3000, help="local: Monitoring duration in seconds")
     args = parser.parse_args()
         
-    run_monitor(args.duration)
\ No newline at end of file
+    run_monitor(args)
@@ -0,0 +1,61 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
+
+import argparse
+import time
+import pandas as pd
+from PIL import Image
+
+from benchmark import TEST_CASES, RESULT_DIR
+from app.tools.evaluation_tool import calculate_clip_scores, clip_cache_stats
+
+# benchmark_results의 생성 이미지를 배치 CLIP API로 다시 채점합니다.
+# 파일명 규칙: {ID}_{Type}_{원본파일명} (ID는 benchmark.py의 1-based 순번)
+
+
+def find_result_images() -> list:
+    items = []
+    for filename in os.listdir(RESULT_DIR):
+        head = filename.split("_")[0]
+        if not filename.endswith(".jpg") or not head.isdigit():
+            continue
+        case_id = int(head)
+        case = TEST_CASES[(case_id - 1) % len(TEST_CASES)]
+        items.append((case_id, filename, case["prompt"]))
+    return sorted(items)
+
+
+def rescore(batch_size: int):
+    items = find_result_images()
+    if not items:
+        print("채점할 결과 이미지가 없습니다.")
+        return
+
+    # 프롬프트는 중복이 많으므로 고유 텍스트만 한 번씩 인코딩
+    prompts = sorted({prompt for _, _, prompt in items})
+    prompt_index = {p: i for i, p in enumerate(prompts)}
+
+    rows = []
+    start = time.time()
+    for offset in range(0, len(items), batch_size):
+        chunk = items[offset:offset + batch_size]
+        images = [Image.open(os.path.join(RESULT_DIR, f)).convert("RGB") for _, f, _ in chunk]
+        scores = calculate_clip_scores(images, prompts)
+        for (case_id, filename, prompt), row in zip(chunk, scores):
+            rows.append({"ID": case_id, "Image": filename, "Prompt": prompt, "CLIP": row[prompt_index[prompt]]})
+    elapsed = time.time() - start
+
+    df = pd.DataFrame(rows)
+    print(df.to_string(index=False))
+    print(f"\n{len(rows)}개 이미지 x {len(prompts)}개 프롬프트 채점 완료: {elapsed:.2f}s ({clip_cache_stats()})")
+
+    df.to_csv(os.path.join(RESULT_DIR, "rescored_clip.csv"), index=False)
+    print(f"리포트 저장 완료: {RESULT_DIR}/rescored_clip.csv")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-size", type=int, default=16)
+    args = parser.parse_args()
+
+    rescore(args.batch_size)
@@ -0,0 +1,44 @@
+import os, sys
+sys.path.append(os.path.dirname(os.path.abspath(os.path.dirname(__file__))))
+
+# 실제 모델/GPU/OpenAI 없이 로컬 Redis에 붙는 Celery 워커 (부하 테스트용)
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")
+os.environ.setdefault("TELEMETRY_BACKEND", "off")
+os.environ.setdefault("PROMPT_CACHE_DISK", "0")
+# 실제 모델 preload 대신 아래에서 대체 모델을 설치한 뒤 ready를 발행
+os.environ["WORKER_PRELOAD"] = "0"
+
+import argparse
+
+from standins import StubPlanner, install_standin_models
+from app import tasks, preload
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queues", default="heavy_tasks,light_tasks,eval_tasks")
+    parser.add_argument("--pool", default="solo", choices=["solo", "threads"])
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--hostname", default=None)
+    parser.add_argument("--flux-step-ms", type=float, default=50, help="FLUX step 당 기본 비용")
+    parser.add_argument("--flux-step-per-sample-ms", type=float, default=10)
+    parser.add_argument("--planner-ms", type=float, default=300, help="LLM 계획 수립 지연 시간")
+    args = parser.parse_args()
+
+    install_standin_models(args.flux_step_ms, args.flux_step_per_sample_ms)
+    planner = StubPlanner(latency_ms=args.planner_ms)
+    tasks.get_planner_client = lambda: planner
+
+    queues = args.queues.split(",")
+    preload.publish_readiness("ready", queues=queues, models=["standin"], concurrency=args.concurrency)
+    preload._start_heartbeat()
+
+    hostname = args.hostname or f"standin-{'-'.join(q.split('_')[0] for q in queues)}@%h"
+    tasks.celery_app.worker_main([
+        "worker", "-Q", ",".join(queues), "--pool", args.pool,
+        "--concurrency", str(args.concurrency), "--hostname", hostname, "--loglevel", "info",
+    ])
+
+
+if __name__ == "__main__":
+    main()
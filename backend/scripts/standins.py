@@ -0,0 +1,209 @@
+import hashlib
+import io
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import torch
+from PIL import Image
+
+# GPU/대형 모델 없이 CPU에서 스케줄링, 캐시, 배칭 로직을 검증하기 위한 대체 모델들
+
+
+class FakeFlux2Pipeline:
+    """
+    Flux2Pipeline과 같은 호출 형태를 가진 대체 파이프라인.
+    step당 비용 = base + per_sample * batch 로 모사해서, GPU가 배치를 병렬로
+    처리할 여유가 있는 상황의 처리량/지연 시간 특성을 재현합니다.
+    """
+
+    def __init__(self, step_base_ms: float = 40, step_per_sample_ms: float = 10,
+                 seq_len: int = 16, embed_dim: int = 64):
+        self.step_base = step_base_ms / 1000
+        self.step_per_sample = step_per_sample_ms / 1000
+        self.seq_len = seq_len
+        self.embed_dim = embed_dim
+        self._execution_device = torch.device("cpu")
+        self.calls = 0
+        self.encode_calls = 0
+
+    def encode_prompt(self, prompt, device=None, **kwargs):
+        # 프롬프트 문자열로부터 결정적인 임베딩 생성
+        self.encode_calls += 1
+        seed = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8], 16)
+        generator = torch.Generator().manual_seed(seed)
+        prompt_embeds = torch.randn(1, self.seq_len, self.embed_dim, generator=generator)
+        text_ids = torch.zeros(1, self.seq_len, 4)
+        return prompt_embeds, text_ids
+
+    def __call__(self, prompt=None, prompt_embeds=None, image=None, guidance_scale=4.0,
+                 num_inference_steps=8, height=None, width=None,
+                 callback_on_step_end=None, callback_on_step_end_tensor_inputs=None, **kwargs):
+        self.calls += 1
+        if prompt_embeds is not None:
+            batch = prompt_embeds.shape[0]
+        else:
+            batch = len(prompt) if isinstance(prompt, list) else 1
+
+        width = width or image.width
+        height = height or image.height
+        # FLUX 계열과 같은 packed latent 형태: [B, (H/16)*(W/16), 128]
+        latents = torch.zeros(batch, (height // 16) * (width // 16), 128)
+
+        for i in range(num_inference_steps):
+            time.sleep(self.step_base + self.step_per_sample * batch)
+            latents = latents + 1.0 / num_inference_steps
+            if callback_on_step_end is not None:
+                timestep = torch.tensor(1000.0 * (1 - i / num_inference_steps))
+                callback_on_step_end(self, i, timestep, {"latents": latents})
+
+        base = image.resize((width, height)) if image is not None else Image.new("RGB", (width, height))
+        images = [Image.blend(base, Image.new("RGB", base.size, (20 * k % 255, 80, 160)), 0.3)
+                  for k in range(batch)]
+        return SimpleNamespace(images=images)
+
+
+def make_test_image(width: int = 1600, height: int = 1200, seed: int = 0) -> Image.Image:
+    """네트워크 없이 쓸 수 있는 결정적인 테스트 이미지 (그라디언트 + 노이즈, 사진과 비슷한 JPEG 크기)"""
+    generator = torch.Generator().manual_seed(seed)
+    ys = torch.linspace(0, 1, height).view(height, 1, 1)
+    xs = torch.linspace(0, 1, width).view(1, width, 1)
+    base = torch.cat([xs.expand(height, width, 1), ys.expand(height, width, 1),
+                      ((xs + ys) / 2).expand(height, width, 1)], dim=2)
+    noise = torch.rand(height, width, 3, generator=generator) * 0.25
+    pixels = ((base * 0.75 + noise).clamp(0, 1) * 255).to(torch.uint8)
+    return Image.fromarray(pixels.numpy(), "RGB")
+
+
+def jpeg_bytes(image: Image.Image, quality: int = 90) -> bytes:
+    buf = io.BytesIO()
+    image.save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def _hash_tokens(texts, vocab_size: int, max_length: int) -> tuple:
+    """단어 해시 기반의 결정적인 토크나이저 (input_ids, attention_mask)"""
+    rows = [[int(hashlib.md5(w.encode("utf-8")).hexdigest()[:6], 16) % vocab_size
+             for w in t.lower().split()][:max_length] or [0] for t in texts]
+    length = max(len(r) for r in rows)
+    input_ids = torch.zeros(len(rows), length, dtype=torch.long)
+    attention_mask = torch.zeros(len(rows), length, dtype=torch.long)
+    for i, r in enumerate(rows):
+        input_ids[i, :len(r)] = torch.tensor(r)
+        attention_mask[i, :len(r)] = 1
+    return input_ids, attention_mask
+
+
+def _pixels(images, size: int) -> torch.Tensor:
+    arrays = [np.asarray(img.convert("RGB").resize((size, size)), dtype=np.float32) / 255 for img in images]
+    return torch.from_numpy(np.stack(arrays)).permute(0, 3, 1, 2)
+
+
+class _Batch(dict):
+    def to(self, device):
+        return _Batch({k: v.to(device) for k, v in self.items()})
+
+
+class TinyVQAModel(torch.nn.Module):
+    """ViLT와 같은 입출력(input_ids, pixel_values -> logits)을 가진 작은 모델"""
+
+    def __init__(self, vocab_size: int = 1000, hidden: int = 64, num_labels: int = 32, image_size: int = 32):
+        super().__init__()
+        torch.manual_seed(0)
+        self.text = torch.nn.EmbeddingBag(vocab_size, hidden)
+        self.image = torch.nn.Linear(3 * image_size * image_size, hidden)
+        self.head = torch.nn.Linear(hidden, num_labels)
+        labels = ["yes", "no", "cat", "dog", "red", "white", "sitting", "sleeping", "2", "1"]
+        self.config = SimpleNamespace(
+            id2label={i: labels[i % len(labels)] for i in range(num_labels)},
+            max_position_embeddings=40,
+        )
+
+    def forward(self, input_ids=None, attention_mask=None, pixel_values=None, **kwargs):
+        hidden = self.text(input_ids * attention_mask) + self.image(pixel_values.flatten(1))
+        return SimpleNamespace(logits=self.head(torch.tanh(hidden)))
+
+
+class TinyVQAPipeline:
+    """vqa_tool이 사용하는 transformers VQA 파이프라인 인터페이스를 흉내 냅니다."""
+
+    def __init__(self, image_size: int = 32):
+        self.model = TinyVQAModel(image_size=image_size).eval()
+        self.image_size = image_size
+        self.device = torch.device("cpu")
+        self.tokenizer = self._tokenize
+        self.image_processor = self._process_images
+
+    def _tokenize(self, texts, padding=True, truncation=True, max_length=40, return_tensors="pt"):
+        input_ids, attention_mask = _hash_tokens(texts, 1000, max_length)
+        return _Batch(input_ids=input_ids, attention_mask=attention_mask)
+
+    def _process_images(self, images=None, return_tensors="pt"):
+        return _Batch(pixel_values=_pixels(images, self.image_size))
+
+    def __call__(self, image=None, question=None, top_k=1):
+        inputs = {**self._tokenize([question]), **self._process_images(images=[image])}
+        with torch.no_grad():
+            logits = self.model(**inputs).logits[0]
+        scores, ids = torch.sigmoid(logits).topk(top_k)
+        return [{"score": s, "answer": self.model.config.id2label[i]} for s, i in zip(scores.tolist(), ids.tolist())]
+
+
+class TinyCLIPModel(torch.nn.Module):
+    """CLIPModel의 get_text_features / get_image_features / logit_scale만 갖춘 작은 모델"""
+
+    def __init__(self, vocab_size: int = 1000, dim: int = 64, image_size: int = 32):
+        super().__init__()
+        torch.manual_seed(0)
+        self.text = torch.nn.EmbeddingBag(vocab_size, dim)
+        self.image = torch.nn.Linear(3 * image_size * image_size, dim)
+        self.logit_scale = torch.nn.Parameter(torch.tensor(4.6052))  # log(100)
+
+    def get_text_features(self, input_ids=None, attention_mask=None, **kwargs):
+        return self.text(input_ids * attention_mask)
+
+    def get_image_features(self, pixel_values=None, **kwargs):
+        return self.image(pixel_values.flatten(1))
+
+
+class TinyCLIPProcessor:
+    def __init__(self, image_size: int = 32):
+        self.image_size = image_size
+
+    def __call__(self, text=None, images=None, return_tensors="pt", padding=True, truncation=True):
+        if text is not None:
+            input_ids, attention_mask = _hash_tokens(text, 1000, 77)
+            return _Batch(input_ids=input_ids, attention_mask=attention_mask)
+        return _Batch(pixel_values=_pixels(images, self.image_size))
+
+
+class StubPlanner:
+    """PlannerClient 대신 LLM 호출 없이 프롬프트 키워드로 계획을 만들어 돌려줍니다."""
+
+    def __init__(self, latency_ms: float = 0):
+        self.latency = latency_ms / 1000
+        self.calls = 0
+
+    def plan(self, system_prompt: str, prompt: str) -> list:
+        from app.routing import predict_tool
+
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if predict_tool(prompt) == "run_img2img":
+            return [{"tool_name": "run_img2img", "parameters": {"image": "[ORIGINAL_IMAGE]", "prompt": prompt}}]
+        return [{"tool_name": "run_vqa", "parameters": {"image": "[ORIGINAL_IMAGE]", "question": prompt}}]
+
+    def stats(self) -> dict:
+        return {"planner/calls": self.calls}
+
+
+def install_standin_models(flux_step_base_ms: float = 0, flux_step_per_sample_ms: float = 0):
+    """app의 도구 모듈에 대체 모델을 끼워 넣습니다. (실제 가중치 로딩 없이 같은 코드 경로 실행)"""
+    from app.tools import vqa_tool, evaluation_tool
+    from app.tools.sd_tool import Flux2ImageGenerator
+
+    vqa_tool.VQA_PIPELINE = TinyVQAPipeline()
+    evaluation_tool.MODEL = TinyCLIPModel().eval()
+    evaluation_tool.PROCESSOR = TinyCLIPProcessor()
+    Flux2ImageGenerator().pipeline = FakeFlux2Pipeline(flux_step_base_ms, flux_step_per_sample_ms)
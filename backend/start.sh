@@ -2,6 +2,7 @@
 
 echo "기존 Celery 프로세스 종료 중..."
 kill -9 $(pgrep -f "celery")
+kill -9 $(pgrep -f "app.model_server")
 sleep 2
 
 echo "Redis 서버 상태 확인 중..."
@@ -39,13 +40,35 @@ export PYTORCH_CUDA_ALLOC_CONF=max_split_size_mb:128
 export CUDA_MODULE_LOADING=LAZY
 export PYTORCH_CUDA_ALLOC_CONF=expandable_segments:True
 
+# FLUX 배칭(FLUX_MAX_BATCH > 1)을 쓰려면 heavy 워커가 여러 태스크를 동시에 받아야 하므로
+# 한 프로세스(모델 1벌) 안에서 threads 풀로 실행합니다.
+# GPU 실행은 배치 스케줄러 스레드 하나가 맡으므로 준비 상태에는 처리 슬롯 1로 공개됩니다.
+# (같은 입력 이미지를 쓰는 요청끼리만 묶이며, 나머지는 순서대로 한 건씩 실행)
+FLUX_MAX_BATCH=${FLUX_MAX_BATCH:-1}
+if [ "$FLUX_MAX_BATCH" -gt 1 ]; then
+    HEAVY_POOL_ARGS="--pool=threads --concurrency=$FLUX_MAX_BATCH --prefetch-multiplier=1"
+else
+    HEAVY_POOL_ARGS="--pool=solo --concurrency=1"
+fi
+
+# 경량 모델(VQA/CLIP)은 모델 서버 한 곳에만 올리고 워커들은 Unix 소켓으로 요청합니다.
+# (MODEL_SERVER_SOCKET을 빈 값으로 두면 예전처럼 워커마다 직접 로드)
+export MODEL_SERVER_SOCKET=${MODEL_SERVER_SOCKET-/tmp/agent-model-server.sock}
+if [ -n "$MODEL_SERVER_SOCKET" ]; then
+    echo "모델 서버 시작 ($MODEL_SERVER_SOCKET)..."
+    nohup python -m app.model_server --socket "$MODEL_SERVER_SOCKET" > model_server.log 2>&1 &
+    for i in $(seq 1 120); do
+        [ -S "$MODEL_SERVER_SOCKET" ] && break
+        sleep 1
+    done
+fi
+
 echo "Celery 서버 시작 (Eventlet Pool, Concurrency=10)..."
 # 백그라운드 실행
 WANDB_API_KEY=$WANDB_API_KEY WANDB_PROJECT=$WANDB_PROJECT \
 nohup celery -A app.tasks worker \
     -Q heavy_tasks \
-    --concurrency=1 \
-    --pool=solo \
+    $HEAVY_POOL_ARGS \
     --hostname=heavy_worker@%h > heavy.log 2>&1 &
 
 nohup celery -A app.tasks worker \
@@ -59,6 +82,13 @@ nohup celery -A app.tasks worker \
     --pool=solo \
     --hostname=light2@%h > light2.log 2>&1 &
 
+# 결과 반환 뒤의 평가(EVALUATION_MODE=async). 동시에 받은 평가들이 VQA/CLIP 배치로 묶이도록 threads 풀
+nohup celery -A app.tasks worker \
+    -Q eval_tasks \
+    --concurrency=4 \
+    --pool=threads \
+    --hostname=eval@%h > eval.log 2>&1 &
+
 echo "FastAPI Server 시작..."
 uvicorn app.main:app --host 0.0.0.0 --port 8000 --reload
 